@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+HOLIDAY_FILE = 'holidays.json'
+AGGREGATES_FILE = 'docs/data/aggregates.json'
+
+DAY_TYPES = ('工作日', '周末', '节假日')
+WEEKDAY_NAMES = ('周一', '周二', '周三', '周四', '周五', '周六', '周日')
+
+
+class HolidayCalendar:
+    """
+    节假日日历（从本地JSON文件加载）
+
+    文件格式:
+        {"holidays": [{"name": "国庆节", "start": "2025-10-01", "end": "2025-10-08"}],
+         "workdays": ["2025-09-28"]}
+    workdays 为调休上班的周末
+    """
+
+    def __init__(self, holidays: Optional[Dict[str, str]] = None, workdays: Optional[List[str]] = None):
+        self.holidays = pd.Series(holidays or {}, dtype=object)
+        self.holidays.index = pd.to_datetime(self.holidays.index)
+        self.workdays = pd.DatetimeIndex(pd.to_datetime(workdays or []))
+
+    @classmethod
+    def load(cls, path: str = HOLIDAY_FILE) -> 'HolidayCalendar':
+        """从文件加载，文件不存在或格式错误时返回空日历"""
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 读取节假日文件 {path} 时出错: {e}")
+            return cls()
+
+        holidays = {}
+        for item in data.get('holidays', []):
+            for day in pd.date_range(item['start'], item.get('end', item['start']), freq='D'):
+                holidays[day.strftime('%Y-%m-%d')] = item.get('name', '节假日')
+        return cls(holidays, data.get('workdays', []))
+
+    def day_types(self, dates: pd.DatetimeIndex) -> np.ndarray:
+        """向量化判断日期类型：工作日 / 周末 / 节假日"""
+        weekend = (dates.dayofweek >= 5) & ~dates.isin(self.workdays)
+        holiday = dates.isin(self.holidays.index)
+        return np.select([holiday, weekend], [DAY_TYPES[2], DAY_TYPES[1]], DAY_TYPES[0])
+
+    def holiday_names(self, dates: pd.DatetimeIndex) -> np.ndarray:
+        """节假日名称，非节假日为空字符串"""
+        return self.holidays.reindex(dates).fillna('').to_numpy()
+
+
+class RidershipAggregator:
+    """按星期几、日期类型和周/年同比的分组聚合，结果按日期范围缓存"""
+
+    def __init__(self, df: pd.DataFrame, lines: List[str], calendar: Optional[HolidayCalendar] = None):
+        self.lines = list(lines)
+        self.columns = ['total'] + self.lines
+        self.calendar = calendar or HolidayCalendar()
+        self._cache = {}
+
+        frame = df.assign(date=pd.to_datetime(df['date'])).set_index('date')
+        frame = frame.reindex(columns=self.columns).astype(float).sort_index()
+        if not frame.empty:
+            # 对齐到完整日历，shift(7)/shift(364) 才能准确对应上周/去年同一星期几
+            frame = frame.reindex(pd.date_range(frame.index.min(), frame.index.max(), freq='D'))
+        self.frame = frame
+        self.weekday = frame.index.dayofweek
+        self.day_type = pd.Index(self.calendar.day_types(frame.index))
+
+    @classmethod
+    def from_config(cls, df: pd.DataFrame, lines: List[str], config: Dict) -> 'RidershipAggregator':
+        """根据 config.json 的 analytics.holidays_file 加载节假日日历"""
+        path = config.get('analytics', {}).get('holidays_file', HOLIDAY_FILE)
+        return cls(df, lines, HolidayCalendar.load(path))
+
+    def _cached(self, name: str, start: Optional[str], end: Optional[str], compute):
+        key = (name, start, end)
+        if key not in self._cache:
+            self._cache[key] = compute(self._window(start, end))
+        return self._cache[key]
+
+    def _window(self, start: Optional[str], end: Optional[str]) -> slice:
+        """日期范围对应的行位置（切片）"""
+        index = self.frame.index
+        lo = 0 if start is None else index.searchsorted(pd.Timestamp(start), side='left')
+        hi = len(index) if end is None else index.searchsorted(pd.Timestamp(end), side='right')
+        return slice(lo, hi)
+
+    def weekday_profile(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """各星期几的日均客流（行：周一~周日，列：total 与各线路）"""
+        def compute(window):
+            frame = self.frame.iloc[window]
+            profile = frame.groupby(self.weekday[window]).mean()
+            return profile.reindex(range(7)).set_axis(list(WEEKDAY_NAMES), axis=0)
+        return self._cached('weekday', start, end, compute)
+
+    def day_type_profile(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """工作日 / 周末 / 节假日的日均客流"""
+        def compute(window):
+            frame = self.frame.iloc[window]
+            profile = frame.groupby(self.day_type[window]).mean()
+            return profile.reindex(list(DAY_TYPES))
+        return self._cached('day_type', start, end, compute)
+
+    def daily_deltas(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """
+        逐日对比：较上周同一天（WoW）和去年同一星期几（YoY，间隔364天）的变化百分比
+
+        Returns:
+            pd.DataFrame: 列为 {列名}_wow 与 {列名}_yoy
+        """
+        def compute(window):
+            # 在完整历史上计算位移后再截取，范围开头也能取到上周/去年的值
+            wow = self.frame / self.frame.shift(7) - 1
+            yoy = self.frame / self.frame.shift(364) - 1
+            deltas = pd.concat([wow.add_suffix('_wow'), yoy.add_suffix('_yoy')], axis=1) * 100
+            return deltas.iloc[window]
+        return self._cached('daily_deltas', start, end, compute)
+
+    def weekly_totals(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """按自然周（周一开始）汇总的日均客流及周环比"""
+        def compute(window):
+            frame = self.frame.iloc[window]
+            weekly = frame.resample('W-SUN').mean()
+            weekly['days'] = frame['total'].resample('W-SUN').count()
+            weekly['total_wow'] = weekly['total'].pct_change(fill_method=None) * 100
+            return weekly
+        return self._cached('weekly', start, end, compute)
+
+    def same_weekday_comparison(self, date: Optional[str] = None, weeks: int = 4) -> Dict:
+        """
+        指定日期（默认最新一天）与上周同一天、以及前 weeks 周同一天均值的对比
+
+        Returns:
+            Dict: 各列的 value / last_week / last_week_pct / recent_mean / recent_mean_pct
+        """
+        if self.frame.empty:
+            return {}
+        ts = pd.Timestamp(date) if date else self.frame['total'].last_valid_index()
+        if ts is None or ts not in self.frame.index:
+            return {}
+
+        pos = self.frame.index.get_loc(ts)
+        current = self.frame.iloc[pos]
+        lags = [pos - 7 * k for k in range(1, weeks + 1) if pos - 7 * k >= 0]
+        last_week = self.frame.iloc[lags[0]] if lags else pd.Series(np.nan, index=self.columns)
+        recent_mean = self.frame.iloc[lags].mean() if lags else pd.Series(np.nan, index=self.columns)
+
+        def pct(a, b):
+            return ((a / b - 1) * 100).where(b != 0)
+
+        result = pd.DataFrame({
+            'value': current,
+            'last_week': last_week,
+            'last_week_pct': pct(current, last_week),
+            'recent_mean': recent_mean,
+            'recent_mean_pct': pct(current, recent_mean),
+        }).round(2)
+        return {
+            'date': ts.strftime('%Y-%m-%d'),
+            'weekday': WEEKDAY_NAMES[ts.dayofweek],
+            'day_type': self.day_type[pos],
+            'series': result.astype(object).where(result.notna(), None).to_dict('index')
+        }
+
+    def summary(self, recent_days: int = 28) -> Dict:
+        """导出用的聚合结果：星期几/日期类型画像、最新一天的同比环比、最近几周的周均值"""
+        if self.frame.empty:
+            return {}
+
+        def records(frame: pd.DataFrame) -> Dict:
+            frame = frame.round(2)
+            return frame.astype(object).where(frame.notna(), None).to_dict('index')
+
+        last = self.frame['total'].last_valid_index()
+        latest_deltas = self.daily_deltas().loc[last, ['total_wow', 'total_yoy']]
+        weekly = self.weekly_totals().tail(max(1, recent_days // 7))
+        weekly.index = weekly.index.strftime('%Y-%m-%d')
+        return {
+            'range': [self.frame.index[0].strftime('%Y-%m-%d'), self.frame.index[-1].strftime('%Y-%m-%d')],
+            'weekday_profile': records(self.weekday_profile()),
+            'day_type_profile': records(self.day_type_profile()),
+            'latest': self.same_weekday_comparison(),
+            'latest_total_wow_pct': None if pd.isna(latest_deltas['total_wow']) else round(float(latest_deltas['total_wow']), 2),
+            'latest_total_yoy_pct': None if pd.isna(latest_deltas['total_yoy']) else round(float(latest_deltas['total_yoy']), 2),
+            'weekly': records(weekly[['total', 'days', 'total_wow']])
+        }
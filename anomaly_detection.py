@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+ANOMALY_FILE = 'docs/data/anomalies.json'
+
+
+class RidershipAnomalyDetector:
+    """
+    客流异常检测
+
+    以同一星期几的前 window_weeks 周作为基线（均值/标准差），对所有线路和总客流
+    一次性向量化计算，标记三类异常：
+        zscore       偏离基线超过 z_threshold 个标准差
+        sudden_zero  基线正常但当天客流为0（停运）
+        missing_line 当天有总客流但该线路未解析到数据
+    """
+
+    def __init__(self, window_weeks: int = 8, z_threshold: float = 3.0,
+                 min_periods: int = 4, min_level: float = 0.5, export_days: int = 90):
+        self.window_weeks = window_weeks
+        self.z_threshold = z_threshold
+        self.min_periods = min_periods
+        self.min_level = min_level
+        self.export_days = export_days
+        # 最近一次 detect 的历史数据最后一天，导出最近 n 天时以它为截止日期
+        self.last_date: Optional[str] = None
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'RidershipAnomalyDetector':
+        """从 config.json 的 analytics.anomaly 段创建"""
+        params = config.get('analytics', {}).get('anomaly', {})
+        return cls(**{k: v for k, v in params.items()
+                      if k in ('window_weeks', 'z_threshold', 'min_periods', 'min_level', 'export_days')})
+
+    @staticmethod
+    def to_matrix(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+        """将历史数据整理为按完整日历对齐的 日期×序列 矩阵"""
+        frame = df.assign(date=pd.to_datetime(df['date'])).set_index('date')
+        frame = frame.reindex(columns=columns).astype(float)
+        if frame.empty:
+            return frame
+        calendar = pd.date_range(frame.index.min(), frame.index.max(), freq='D')
+        return frame.reindex(calendar)
+
+    def baseline(self, values: np.ndarray):
+        """
+        同星期几基线
+
+        Args:
+            values: 日期×序列 矩阵（完整日历）
+
+        Returns:
+            (均值, 标准差, 有效样本数)，形状均与 values 相同
+        """
+        n_days = values.shape[0]
+        # lags[k] 为 (k+1) 周前同一天的数据，形状 (window_weeks, 天数, 序列数)
+        lags = np.full((self.window_weeks,) + values.shape, np.nan)
+        for k in range(1, self.window_weeks + 1):
+            shift = 7 * k
+            if shift < n_days:
+                lags[k - 1, shift:] = values[:-shift]
+
+        count = np.sum(~np.isnan(lags), axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.nansum(lags, axis=0) / count
+            var = np.nansum((lags - mean) ** 2, axis=0) / np.maximum(count - 1, 1)
+        mean[count < self.min_periods] = np.nan
+        return mean, np.sqrt(var), count
+
+    def detect(self, df: pd.DataFrame, lines: List[str]) -> pd.DataFrame:
+        """
+        检测异常
+
+        Args:
+            df: 历史数据（date, total, 各线路），日期升序
+            lines: 线路列表
+
+        Returns:
+            pd.DataFrame: 异常列表，列为 date, line, type, value, baseline, zscore
+        """
+        columns = list(lines) + ['total']
+        matrix = self.to_matrix(df, columns)
+        self.last_date = matrix.index[-1].strftime('%Y-%m-%d') if not matrix.empty else None
+        if matrix.empty:
+            return pd.DataFrame(columns=['date', 'line', 'type', 'value', 'baseline', 'zscore'])
+
+        values = matrix.to_numpy()
+        mean, std, _ = self.baseline(values)
+        # 标准差下限，避免稳定线路因微小波动产生大量告警
+        std = np.fmax(std, np.fmax(0.05 * np.abs(mean), 0.1))
+        with np.errstate(invalid='ignore'):
+            z = (values - mean) / std
+
+        has_baseline = ~np.isnan(mean) & (mean >= self.min_level)
+        day_reported = ~np.isnan(values[:, -1])[:, None]
+
+        flags = {
+            'sudden_zero': has_baseline & (values == 0),
+            'missing_line': has_baseline & np.isnan(values) & day_reported,
+        }
+        flags['zscore'] = has_baseline & (np.abs(np.nan_to_num(z)) > self.z_threshold) & ~flags['sudden_zero']
+        # 总客流没有“线路缺失”的说法
+        flags['missing_line'][:, -1] = False
+
+        frames = []
+        for kind, mask in flags.items():
+            day_idx, col_idx = np.nonzero(mask)
+            frames.append(pd.DataFrame({
+                'date': matrix.index[day_idx].strftime('%Y-%m-%d'),
+                'line': np.asarray(columns, dtype=object)[col_idx],
+                'type': kind,
+                'value': values[day_idx, col_idx],
+                'baseline': mean[day_idx, col_idx],
+                'zscore': z[day_idx, col_idx],
+            }))
+        alerts = pd.concat(frames, ignore_index=True)
+        return alerts.sort_values(['date', 'line', 'type']).reset_index(drop=True)
+
+    def to_json(self, alerts: pd.DataFrame, last_n_days: Optional[int] = None, end: Optional[str] = None) -> Dict:
+        """
+        转换为可导出的JSON结构（只保留最近 n 天的告警，默认 export_days）
+
+        Args:
+            end: 最近 n 天的截止日期，默认为检测时历史数据的最后一天（不是最后一条告警的日期，
+                 否则平稳一段时间后旧告警仍会留在导出中）
+        """
+        last_n_days = last_n_days or self.export_days
+        end = end or self.last_date
+        if last_n_days and not alerts.empty:
+            end = pd.Timestamp(end) if end else pd.to_datetime(alerts['date']).max()
+            cutoff = (end - pd.Timedelta(days=last_n_days - 1)).strftime('%Y-%m-%d')
+            alerts = alerts[alerts['date'] >= cutoff]
+        records = alerts.round({'value': 2, 'baseline': 2, 'zscore': 2})
+        records = records.astype(object).where(records.notna(), None)
+        return {
+            'count': int(len(records)),
+            'by_type': {k: int(v) for k, v in records['type'].value_counts().items()},
+            'alerts': records.to_dict('records')
+        }
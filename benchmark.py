@@ -0,0 +1,1164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+性能基准测试
+
+用法:
+    python benchmark.py export --years 10
+    python benchmark.py anomaly --years 10
+    python benchmark.py rolling --years 10
+    python benchmark.py forecast --years 10
+    python benchmark.py validate --years 10
+    python benchmark.py api --requests 20000 --concurrency 16
+    python benchmark.py heatmap --days 7 30 365 3650
+    python benchmark.py systems --systems 1 2 4 8 --latency 0.2
+    python benchmark.py matrix --years 10 30
+    python benchmark.py parse --posts 1000000 --jobs 1 2 4
+    python benchmark.py correlation --years 10
+    python benchmark.py archive --years 10 --per-day 5 --jobs 1 4
+    python benchmark.py compare --years 10 30
+    python benchmark.py snapshot --years 10 30
+    python benchmark.py concurrency --writers 8 --readers 4 --iterations 20 --compare-unlocked
+    python benchmark.py completeness --years 10
+    python benchmark.py ranged-export --years 3
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def load_lines(config_file: str = 'config.json') -> list:
+    """读取配置中的线路列表"""
+    with open(config_file, 'r', encoding='utf-8') as f:
+        return [line['name'] for line in json.load(f)['lines']]
+
+
+def make_synthetic_history(years: int, lines: list, seed: int = 0) -> pd.DataFrame:
+    """生成带周周期和趋势的合成历史数据（date, total, 各线路）"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=years * 365, freq='D')
+    n_days, n_lines = len(dates), len(lines)
+
+    base = rng.uniform(2, 80, n_lines)
+    weekly = np.where(dates.dayofweek >= 5, 0.8, 1.0)[:, None]
+    trend = np.linspace(0.9, 1.1, n_days)[:, None]
+    noise = rng.normal(1.0, 0.05, (n_days, n_lines))
+    values = np.round(base * weekly * trend * noise, 2)
+
+    df = pd.DataFrame(values, columns=lines)
+    df.insert(0, 'total', values.sum(axis=1).round(2))
+    df.insert(0, 'date', dates.strftime('%Y-%m-%d'))
+    return df
+
+
+def dir_size(path: str) -> int:
+    """目录或文件的总字节数"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def timed(func, *args, **kwargs):
+    """返回 (结果, 耗时秒数)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_export(args):
+    """对比 CSV / JSON / Parquet / Arrow IPC 的写入、读取耗时和文件大小"""
+    from columnar_export import columnar_available, export_history_columnar, read_history_columnar
+
+    lines = load_lines()
+    df = make_synthetic_history(args.years, lines)
+    work_dir = tempfile.mkdtemp(prefix='metro_bench_')
+    print(f"数据规模: {len(df)} 天 × {len(lines)} 条线路")
+
+    results = []
+    try:
+        csv_path = os.path.join(work_dir, 'history.csv')
+        _, write_s = timed(df.to_csv, csv_path, index=False, encoding='utf-8-sig')
+        _, read_s = timed(pd.read_csv, csv_path, encoding='utf-8-sig')
+        results.append(('csv', write_s, read_s, dir_size(csv_path)))
+
+        json_path = os.path.join(work_dir, 'history.json')
+
+        def write_json():
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(df.to_dict('records'), f, ensure_ascii=False, indent=2)
+
+        def read_json():
+            with open(json_path, 'r', encoding='utf-8') as f:
+                return pd.DataFrame(json.load(f))
+
+        _, write_s = timed(write_json)
+        _, read_s = timed(read_json)
+        results.append(('json', write_s, read_s, dir_size(json_path)))
+
+        if columnar_available():
+            for fmt in ('parquet', 'arrow'):
+                _, write_s = timed(export_history_columnar, df, lines, work_dir, fmt)
+                _, read_s = timed(read_history_columnar, work_dir, fmt)
+                results.append((fmt, write_s, read_s, dir_size(os.path.join(work_dir, fmt))))
+        else:
+            print("⚠️ 未安装 pyarrow，跳过列式格式")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{'格式':<8}{'写入(ms)':>12}{'读取(ms)':>12}{'大小(KB)':>12}")
+    for name, write_s, read_s, size in results:
+        print(f"{name:<8}{write_s * 1000:>12.1f}{read_s * 1000:>12.1f}{size / 1024:>12.1f}")
+
+
+def bench_anomaly(args):
+    """异常检测：全部线路 × 全部历史的检测耗时"""
+    from anomaly_detection import RidershipAnomalyDetector
+
+    lines = load_lines()
+    df = make_synthetic_history(args.years, lines)
+    # 注入一些停运和缺失数据
+    df.loc[df.index[-30], lines[0]] = 0.0
+    df.loc[df.index[-20], lines[1]] = np.nan
+    detector = RidershipAnomalyDetector()
+    print(f"数据规模: {len(df)} 天 × {len(lines)} 条线路")
+
+    detector.detect(df, lines)  # 预热
+    timings = []
+    for _ in range(args.repeat):
+        alerts, elapsed = timed(detector.detect, df, lines)
+        timings.append(elapsed)
+    print(f"检测耗时: 最小 {min(timings) * 1000:.1f} ms, 中位数 {np.median(timings) * 1000:.1f} ms")
+    print(f"异常数量: {alerts['type'].value_counts().to_dict()}")
+
+
+def bench_rolling(args):
+    """滚动统计：每天增量更新 vs 全量重算，并校验结果一致"""
+    from rolling_stats import IncrementalRollingStats, full_recompute, verify
+
+    lines = load_lines()
+    series = ['total'] + lines
+    df = make_synthetic_history(args.years, lines)
+    print(f"数据规模: {len(df)} 天 × {len(series)} 个序列")
+
+    stats, build_s = timed(IncrementalRollingStats.from_history, df.iloc[:-args.days], series)
+    new_rows = df.iloc[-args.days:]
+    _, update_s = timed(stats.sync, new_rows)
+    _, full_s = timed(full_recompute, df, series)
+
+    print(f"初始构建: {build_s * 1000:.1f} ms")
+    print(f"增量更新: {update_s / args.days * 1000:.3f} ms/天")
+    print(f"全量重算: {full_s * 1000:.1f} ms/次")
+    print(f"与全量结果最大误差: {verify(stats, df):.2e}")
+
+
+def bench_forecast(args):
+    """预测：批量求解全部线路 vs 逐线路 lstsq 循环"""
+    from forecast import SeasonalForecaster
+
+    lines = load_lines()
+    if args.replicas > 1:
+        # 复制线路以模拟更多序列（如多个线网）
+        lines = [f'{line}#{i}' for i in range(args.replicas) for line in lines]
+    series = ['total'] + lines
+    df = make_synthetic_history(args.years, lines)
+    # 模拟新开线路：前一半时间没有数据
+    df.loc[:len(df) // 2, lines[-1]] = np.nan
+    print(f"数据规模: {len(df)} 天 × {len(series)} 个序列（使用全部历史拟合）")
+
+    forecaster = SeasonalForecaster(fit_days=None)
+    _, batch_s = timed(forecaster.fit, df, series)
+    forecast = forecaster.predict()
+
+    def per_series_loop():
+        frame = df.assign(date=pd.to_datetime(df['date'])).set_index('date')
+        X = forecaster.design_matrix(frame.index)
+        coefs = []
+        for column in series:
+            y = frame[column].to_numpy(dtype=float)
+            mask = ~np.isnan(y)
+            coefs.append(np.linalg.lstsq(X[mask], y[mask], rcond=None)[0])
+        return np.array(coefs).T
+
+    loop_coef, loop_s = timed(per_series_loop)
+    print(f"批量求解: {batch_s * 1000:.1f} ms")
+    print(f"逐序列循环: {loop_s * 1000:.1f} ms")
+    print(f"系数最大差异: {np.nanmax(np.abs(loop_coef - forecaster.coef)):.2e}")
+    print(forecast[forecast['series'] == 'total'].round(1).to_string(index=False))
+
+
+def bench_validate(args):
+    """解析校验：整批校验耗时与正则解析耗时对比"""
+    from data_sources import FakeDataSource
+    from metro_data import NanjingSubwayDataCollector
+
+    collector = NanjingSubwayDataCollector('config.json', FakeDataSource())
+    lines = collector.all_lines
+    df = make_synthetic_history(args.years, lines)
+    # 由内存数据源生成与微博原文格式相同的帖子，模拟完整的解析流程
+    posts = FakeDataSource.from_history(df, lines).posts
+    texts = [post['text_raw'] for post in reversed(posts)]
+    print(f"数据规模: {len(texts)} 条记录 × {len(lines)} 条线路")
+
+    def parse():
+        return [{'date': collector.extract_date(text), 'full_date': date,
+                 'passenger_data': collector.extract_passenger_data(text)}
+                for text, date in zip(texts, df['date'])]
+
+    records, parse_s = timed(parse)
+    # 注入缺失线路和异常数值
+    records[-1]['passenger_data'][lines[0]] = None
+    records[-2]['passenger_data'][lines[1]] = 9999.0
+    checks, validate_s = timed(collector.validator.validate, records)
+    quality, metrics_s = timed(collector.validator.metrics, checks)
+
+    print(f"正则解析: {parse_s * 1000:.1f} ms")
+    print(f"整批校验: {validate_s * 1000:.1f} ms（占解析耗时 {validate_s / parse_s * 100:.1f}%）")
+    print(f"覆盖率统计: {metrics_s * 1000:.1f} ms")
+    print(f"通过校验: {quality['records_ok']}/{quality['records']}, 问题: {quality['issue_counts']}")
+
+
+def bench_api(args):
+    """查询API压测：多线程 keep-alive 连接请求 localhost，统计吞吐和延迟分位数"""
+    import http.client
+    import random
+    import threading
+    from urllib.parse import quote, urlsplit
+    from query_api import RidershipQueryService, serve
+
+    lines = load_lines()
+    server = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+        dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=args.years * 365, freq='D')
+    else:
+        df = make_synthetic_history(args.years, lines)
+        service = RidershipQueryService.from_frame(df)
+        server = serve(service, port=0)
+        host, port = '127.0.0.1', server.server_port
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        dates = pd.to_datetime(df['date'])
+        print(f"数据规模: {len(df)} 天 × {len(lines)} 条线路")
+
+    # 固定数量的不同查询，模拟热点查询分布
+    rng = random.Random(0)
+    day = lambda: dates[rng.randrange(len(dates))].strftime('%Y-%m-%d')
+    paths = ['/lines']
+    for _ in range(args.distinct):
+        start, end = sorted([day(), day()])
+        kind = rng.choice(['ridership', 'ridership_all', 'proportions', 'stats'])
+        if kind == 'ridership':
+            paths.append(f"/ridership?line={quote(rng.choice(lines))}&from={start}&to={end}")
+        elif kind == 'ridership_all':
+            paths.append(f"/ridership?from={end[:8]}01&to={end}")
+        elif kind == 'proportions':
+            paths.append(f"/proportions?date={end}")
+        else:
+            paths.append(f"/stats?window={rng.choice([7, 30, 90, 365])}")
+
+    per_thread = args.requests // args.concurrency
+    latencies, statuses, lock = [], {}, threading.Lock()
+
+    def worker(seed):
+        local_rng = random.Random(seed)
+        conn = http.client.HTTPConnection(host, port)
+        etags, local_lat, local_status = {}, [], {}
+        for _ in range(per_thread):
+            path = local_rng.choice(paths)
+            headers = {}
+            if path in etags and local_rng.random() < args.conditional:
+                headers['If-None-Match'] = etags[path]
+            start = time.perf_counter()
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            local_lat.append(time.perf_counter() - start)
+            local_status[response.status] = local_status.get(response.status, 0) + 1
+            if response.getheader('ETag'):
+                etags[path] = response.getheader('ETag')
+        conn.close()
+        with lock:
+            latencies.extend(local_lat)
+            for status, count in local_status.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    begin = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - begin
+
+    lat_ms = np.array(latencies) * 1000
+    print(f"请求数: {len(lat_ms)}，并发: {args.concurrency}，不同查询: {len(paths)}")
+    print(f"吞吐: {len(lat_ms) / elapsed:.0f} 请求/秒")
+    print(f"延迟: p50 {np.percentile(lat_ms, 50):.2f} ms, p99 {np.percentile(lat_ms, 99):.2f} ms, "
+          f"最大 {lat_ms.max():.2f} ms")
+    print(f"状态码: {dict(sorted(statuses.items()))}")
+    if server is not None:
+        cache = service.cache
+        print(f"LRU命中率: {cache.hits / max(1, cache.hits + cache.misses) * 100:.1f}%")
+        server.shutdown()
+        server.server_close()
+
+
+def bench_heatmap(args):
+    """热力图绘制：逐格标注 vs 选择性标注（线路 × 天数），以及全部历史的日历热力图"""
+    import io
+
+    import main as pipeline
+    from data_sources import FakeDataSource
+    from metro_data import NanjingSubwayDataCollector
+
+    collector = NanjingSubwayDataCollector('config.json', FakeDataSource())
+    visualizer = pipeline.NanjingSubwayVisualizer(collector)
+    plt = pipeline.plt
+    lines = collector.all_lines
+    history = make_synthetic_history(max(1, -(-max(args.days) // 365)), lines)
+
+    def render(draw):
+        fig, ax = plt.subplots(figsize=(18, 8))
+        draw(ax)
+        fig.savefig(io.BytesIO(), format='png', dpi=args.dpi)
+        plt.close(fig)
+
+    def per_cell(ax, data, labels):
+        """原实现：每个格子一个 text，循环内重复计算最大值"""
+        ax.imshow(data, aspect='auto', cmap='YlOrRd', interpolation='nearest')
+        ax.set_xticks(range(data.shape[1]))
+        ax.set_xticklabels(labels, rotation=45, ha='right')
+        for i in range(data.shape[0]):
+            for j in range(data.shape[1]):
+                if not np.isnan(data[i, j]):
+                    ax.text(j, i, f'{data[i, j]:.0f}', ha='center', va='center',
+                            color='white' if data[i, j] > np.nanmax(data) / 2 else 'black', fontsize=20)
+
+    print(f"线路 × 天数热力图（{len(lines)} 条线路，dpi={args.dpi}）")
+    print(f"{'天数':>6} {'逐格标注':>10} {'选择性标注':>10}")
+    for n_days in args.days:
+        frame = history.tail(n_days)
+        data = frame[lines].to_numpy(dtype=float).T
+        labels = list(frame['date'].str[5:])
+        _, old_s = timed(render, lambda ax: per_cell(ax, data, labels))
+        _, new_s = timed(render, lambda ax: visualizer._draw_heatmap(ax, data, lines, labels))
+        print(f"{n_days:>6} {old_s:>9.2f}s {new_s:>9.2f}s")
+
+    print("日历热力图（总客流，保存为 dpi=300 的PNG）")
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp()
+    try:
+        os.chdir(workdir)
+        for years in args.years:
+            frame = make_synthetic_history(years, lines)
+            _, seconds = timed(visualizer.plot_calendar_heatmap, frame)
+            print(f"{years:>4} 年 ({len(frame)} 天): {seconds:.2f}s")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+def bench_systems(args):
+    """多线网采集：逐个采集 vs 线程池并发（内存数据源按页模拟网络延迟）"""
+    from data_sources import FakeDataSource
+    from multi_system import MetroSystem, MultiSystemCollector, PartitionedHistoryStore
+
+    with open('config.json', 'r', encoding='utf-8') as f:
+        base_config = json.load(f)
+    lines = load_lines()
+    df = make_synthetic_history(1, lines).tail(args.days)
+
+    def make_system(i):
+        """第 i 个线网：线网名和筛选关键词不同，每个账号一份帖子"""
+        name = f'测试地铁{i}'
+        config = {**base_config, 'parser': {**base_config.get('parser', {}), 'relevance_keywords': ['客流', name]}}
+        posts = FakeDataSource.from_history(df, lines, system_name=name).posts
+        accounts = [{'type': 'fake', 'posts': posts, 'page_size': 20, 'latency': args.latency}
+                    for _ in range(args.accounts)]
+        return MetroSystem(f'system{i}', config, name, accounts)
+
+    pages = -(-len(df) // 20)
+    print(f"每个账号 {len(df)} 条帖子（{pages} 页），每页延迟 {args.latency}s，每个线网 {args.accounts} 个账号")
+    print(f"{'线网数':>6} {'逐个采集':>10} {'并发采集':>10}")
+    for n_systems in args.systems:
+        systems = [make_system(i) for i in range(n_systems)]
+        timings = []
+        for workers in (1, args.workers):
+            workdir = tempfile.mkdtemp()
+            try:
+                collector = MultiSystemCollector(systems, PartitionedHistoryStore(workdir), workers)
+                results, seconds = timed(collector.collect)
+                collector.save()
+                assert all(len(result['records']) == len(df) for result in results.values())
+                timings.append(seconds)
+            finally:
+                shutil.rmtree(workdir)
+        print(f"{n_systems:>6} {timings[0]:>9.2f}s {timings[1]:>9.2f}s")
+
+
+# 冷启动测量脚本：(导入, 加载历史数据并取最近7天)
+COLD_LOAD_SCRIPTS = {
+    'baseline': ("", ""),
+    'csv': ("from history_store import MetroHistoryStore",
+            "last = MetroHistoryStore(PATH).df.tail(7)"),
+    'matrix': ("from history_matrix import HistoryMatrix",
+               "m = HistoryMatrix(PATH); last = m.values[m.last_rows(7)]"),
+    'matrix+frame': ("from history_matrix import HistoryMatrix; import pandas",
+                     "m = HistoryMatrix(PATH); last = m.to_frame(m.last_rows(7))"),
+    # 首次查询：PATH 为目录，含 history.csv 和 snapshot.npz
+    'collector-csv': ("from metro_data import NanjingSubwayDataCollector; from data_sources import DataSource; "
+                      "from history_store import MetroHistoryStore",
+                      "c = NanjingSubwayDataCollector(source=DataSource()); "
+                      "c.load_history(MetroHistoryStore(PATH + '/history.csv', c.all_lines).df); "
+                      "first = (c.get_latest_line_proportions(), c.get_line_last_n_days(c.all_lines[0], 30))"),
+    'collector-snapshot': ("from metro_data import NanjingSubwayDataCollector; from data_sources import DataSource",
+                           "c = NanjingSubwayDataCollector(source=DataSource()); "
+                           "assert c.load_snapshot(PATH + '/history.csv', PATH + '/snapshot.npz') is not None; "
+                           "first = (c.get_latest_line_proportions(), c.get_line_last_n_days(c.all_lines[0], 30))"),
+    'api-csv': ("from query_api import RidershipQueryService",
+                "s = RidershipQueryService(PATH + '/history.csv', snapshot_path=PATH + '/missing.npz'); "
+                "first = s.handle('/stats', {'window': '30'})"),
+    'api-snapshot': ("from query_api import RidershipQueryService",
+                     "s = RidershipQueryService(PATH + '/history.csv', snapshot_path=PATH + '/snapshot.npz'); "
+                     "first = s.handle('/stats', {'window': '30'})"),
+}
+
+
+def cold_load(kind: str, path: str) -> tuple:
+    """
+    在新的 Python 进程中运行加载脚本
+
+    Returns:
+        tuple: (总耗时, 其中加载数据的耗时, 峰值RSS KB)；RSS 取 /proc 中的 VmHWM，
+               ru_maxrss 在 fork + exec 后会沿用父进程的值
+    """
+    import subprocess
+    import sys
+
+    imports, load = COLD_LOAD_SCRIPTS[kind]
+    code = (f"import time\nstart = time.perf_counter()\nPATH = {path!r}\n{imports}\n"
+            f"loaded = time.perf_counter()\n{load}\nend = time.perf_counter()\n"
+            "hwm = [l for l in open('/proc/self/status') if l.startswith('VmHWM')][0].split()[1]\n"
+            "print(end - start, end - loaded, hwm)")
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+    return float(output[0]), float(output[1]), int(output[2])
+
+
+def bench_matrix(args):
+    """历史数据冷启动：CSV 解析 vs 二进制矩阵内存映射（新进程中加载并取最近7天），以及追加一天的耗时"""
+    from export_writer import AtomicExportWriter
+    from history_matrix import HistoryMatrix
+    from history_store import MetroHistoryStore
+
+    lines = load_lines()
+    for years in args.years:
+        df = make_synthetic_history(years, lines)
+        workdir = tempfile.mkdtemp()
+        try:
+            csv_path = os.path.join(workdir, 'history.csv')
+            matrix_path = os.path.join(workdir, 'history_matrix.bin')
+            # 先保存除最后一天外的数据，再测量追加一天
+            store = MetroHistoryStore(csv_path, lines)
+            store.df = df.iloc[:-1].copy()
+            store.save()
+            matrix = HistoryMatrix(matrix_path)
+            matrix.sync(store.df, lines)
+
+            store.df = df.copy()
+            _, csv_append_s = timed(store.save, AtomicExportWriter())
+            mode, matrix_append_s = timed(matrix.sync, df, lines, AtomicExportWriter())
+            assert mode == 'append'
+
+            print(f"{years} 年 {len(df)} 天 × {len(lines) + 1} 列: CSV {dir_size(csv_path) / 1024:.0f} KB，"
+                  f"矩阵 {dir_size(matrix_path) / 1024:.0f} KB")
+            print(f"  {'方式':<14}{'冷启动总耗时':>12}{'其中读取数据':>12}{'峰值RSS':>10}{'比空解释器多':>12}")
+            base_rss = min(cold_load('baseline', csv_path)[2] for _ in range(args.repeat))
+            for kind, path in (('csv', csv_path), ('matrix', matrix_path), ('matrix+frame', matrix_path)):
+                runs = [cold_load(kind, path) for _ in range(args.repeat)]
+                total_s, load_s, rss = (min(run[i] for run in runs) for i in range(3))
+                print(f"  {kind:<14}{total_s * 1000:>10.1f}ms{load_s * 1000:>10.2f}ms"
+                      f"{rss / 1024:>8.1f}MB{(rss - base_rss) / 1024:>10.1f}MB")
+            print(f"  追加一天: CSV {csv_append_s * 1000:.1f}ms，矩阵 {matrix_append_s * 1000:.1f}ms")
+        finally:
+            shutil.rmtree(workdir)
+
+
+def make_synthetic_posts(n_posts: int, lines: list, irrelevant: float = 0.1, seed: int = 0) -> list:
+    """
+    生成微博原文格式的合成帖子（每条文本都不同，避免进程间序列化时共享字符串）
+
+    日期在最近10年内循环，irrelevant 比例的帖子为非客流内容
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(end=pd.Timestamp.today().normalize(), periods=3650, freq='D')[::-1]
+    values = np.round(rng.uniform(2, 80, (n_posts, len(lines))), 2)
+    skip = rng.random(n_posts) < irrelevant
+    posts = []
+    for i in range(n_posts):
+        day = days[i % len(days)]
+        if skip[i]:
+            text = f"#南京地铁# {day.month}月{day.day}日运营提示：第{i}号公告"
+        else:
+            text = (f"#南京地铁昨日客流# {day.month}月{day.day}日，南京地铁线网客运量{values[i].sum():.2f}万乘次，其中"
+                    + "，".join(f"{line}{value}万" for line, value in zip(lines, values[i].tolist())))
+        posts.append({"id": f"synthetic-{i}", "text_raw": text,
+                      "created_at": f"{day:%a %b %d} 08:00:00 +0800 {day.year}"})
+    return posts
+
+
+def bench_parse(args):
+    """批量解析：进程池分块解析的扩展性（结果与单进程逐条解析一致）"""
+    from data_sources import FakeDataSource
+    from metro_data import NanjingSubwayDataCollector
+
+    collector = NanjingSubwayDataCollector('config.json', FakeDataSource())
+    posts, gen_s = timed(make_synthetic_posts, args.posts, collector.all_lines)
+    print(f"合成 {len(posts)} 条帖子: {gen_s:.1f}s（本机 {os.cpu_count()} 核，分块 {args.chunk_size} 条）")
+
+    def digest(records):
+        """解析结果的摘要（100万条记录保留两份会占用数GB内存，只比较摘要）"""
+        h = hashlib.sha256()
+        for record in records:
+            h.update(repr((record['full_date'], record['passenger_data'], record['raw_text'])).encode('utf-8'))
+        return h.hexdigest()
+
+    reference = baseline = None
+    print(f"{'进程数':>6} {'耗时':>9} {'帖子/秒':>10} {'加速比':>7}")
+    for jobs in args.jobs:
+        counts = {}
+        records, seconds = timed(collector.parse_posts, posts, jobs, args.chunk_size, counts)
+        n_records, result_digest = len(records), digest(records)
+        del records
+        if reference is None:
+            reference, baseline = result_digest, seconds
+        elif result_digest != reference:
+            raise AssertionError(f"{jobs} 个进程的解析结果与 {args.jobs[0]} 个进程不一致")
+        print(f"{jobs:>6} {seconds:>8.2f}s {len(posts) / seconds:>10.0f} {baseline / seconds:>6.2f}x")
+    print(f"记录数: {n_records}，计数: {counts}，各进程数的结果一致")
+
+
+def bench_archive(args):
+    """原始帖子归档：写入、去重、读取的耗时和压缩率，以及从归档重新解析并改写历史数据的耗时"""
+    from data_sources import FakeDataSource
+    from history_store import MetroHistoryStore
+    from metro_data import NanjingSubwayDataCollector
+    from post_archive import PostArchive
+
+    lines = load_lines()
+    posts = make_synthetic_posts(args.years * 365 * args.per_day, lines)
+    raw_bytes = sum(len(json.dumps(post, ensure_ascii=False).encode('utf-8')) + 1 for post in posts)
+    print(f"数据规模: {args.years} 年 × 每天 {args.per_day} 条 = {len(posts)} 条帖子，"
+          f"JSONL {raw_bytes / 1e6:.1f} MB（本机 {os.cpu_count()} 核）")
+
+    root = tempfile.mkdtemp(prefix='metro_archive_')
+    try:
+        archive = PostArchive(os.path.join(root, 'archive'))
+        _, add_s = timed(archive.add, posts)
+        _, save_s = timed(archive.save)
+        print(f"首次归档: 去重 {add_s * 1000:.0f} ms + 压缩写入 {save_s * 1000:.0f} ms，"
+              f"{archive.stats()['bytes'] / 1e6:.2f} MB（压缩率 {raw_bytes / archive.stats()['bytes']:.1f}x）")
+
+        reopened, open_s = timed(PostArchive, archive.root)
+        added, readd_s = timed(reopened.add, posts)
+        print(f"重新打开（只读索引）: {open_s * 1000:.0f} ms；再次加入全部帖子: {readd_s * 1000:.0f} ms，新增 {added} 条")
+        loaded, load_s = timed(reopened.posts)
+        print(f"读取全部帖子: {load_s * 1000:.0f} ms，{len(loaded)} 条")
+        del loaded
+
+        with open('config.json', 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        config['archive'] = {'enabled': True, 'root': archive.root}
+        print(f"{'进程数':>6} {'读取+解析':>10} {'改写历史':>9} {'合计':>8}")
+        reference = None
+        for jobs in args.jobs:
+            collector = NanjingSubwayDataCollector(config=config, source=FakeDataSource())
+            records, parse_s = timed(collector.reparse_archive, jobs)
+            store = MetroHistoryStore(os.path.join(root, f'history-{jobs}.csv'), collector.all_lines)
+            _, store_s = timed(lambda: (store.merge_records(records), store.save()))
+            digest = hashlib.sha256(store.df.to_csv(index=False).encode('utf-8')).hexdigest()
+            if reference is None:
+                reference = digest
+            elif digest != reference:
+                raise AssertionError(f"{jobs} 个进程重新解析的历史数据与 {args.jobs[0]} 个进程不一致")
+            print(f"{jobs:>6} {parse_s:>9.2f}s {store_s:>8.2f}s {parse_s + store_s:>7.2f}s")
+        print(f"历史数据: {len(store.df)} 天，各进程数的结果一致")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_compare(args):
+    """时段对比：前缀和索引 vs 每次按日期筛选后求均值，对比范围从1周到全部历史"""
+    from period_comparison import PeriodComparison, PeriodIndex
+
+    lines = load_lines()
+    series = ['total'] + lines
+    comparer = PeriodComparison()
+    for years in args.years:
+        df = make_synthetic_history(years, lines)
+        frame = df.set_index(pd.to_datetime(df['date']))[series]
+        index, build_s = timed(PeriodIndex.from_history, df, series)
+        print(f"\n{years} 年（{len(df)} 天）: 建立前缀和索引 {build_s * 1000:.1f} ms")
+        print(f"{'本期天数':>8} {'索引求和':>10} {'索引对比(含表格)':>14} {'筛选求均值':>11} {'最大误差':>9}")
+        end = pd.Timestamp(df['date'].iloc[-1])
+        for days in (7, 30, 365, len(df) // 2):
+            current = ((end - pd.Timedelta(days=days - 1)).strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+            base = comparer.baseline(current, 'previous')
+            _, aggregate_s = timed(lambda: [(index.aggregate(base), index.aggregate(current))
+                                            for _ in range(args.repeat)])
+            table, indexed_s = timed(lambda: [comparer.compare(index, base, current) for _ in range(args.repeat)][-1])
+
+            def filtered():
+                means = [frame.loc[period[0]:period[1]].mean() for period in (base, current)]
+                return means[1] / means[0] - 1
+
+            expected, filtered_s = timed(lambda: [filtered() for _ in range(args.repeat)][-1])
+            error = np.nanmax(np.abs(table['delta_pct'].to_numpy() - expected.to_numpy() * 100))
+            print(f"{days:>8} {aggregate_s / args.repeat * 1e6:>8.1f}µs {indexed_s / args.repeat * 1000:>14.3f}ms "
+                  f"{filtered_s / args.repeat * 1000:>9.3f}ms "
+                  f"{error:>9.1e}")
+
+
+def bench_snapshot(args):
+    """采集器冷启动（解析CSV后逐日建立记录）vs 快照热启动，测量新进程中到首次查询的耗时"""
+    from metro_data import NanjingSubwayDataCollector
+    from data_sources import DataSource
+    from history_store import MetroHistoryStore
+
+    lines = load_lines()
+    collector = NanjingSubwayDataCollector(source=DataSource())
+    for years in args.years:
+        df = make_synthetic_history(years, lines)
+        workdir = tempfile.mkdtemp()
+        try:
+            csv_path = os.path.join(workdir, 'history.csv')
+            snapshot_path = os.path.join(workdir, 'snapshot.npz')
+            store = MetroHistoryStore(csv_path, lines)
+            store.df = df.copy()
+            store.save()
+            _, save_s = timed(collector.save_snapshot, store.df, csv_path, snapshot_path)
+
+            # 进程内：冷启动各步骤与热启动的结果一致
+            cold = NanjingSubwayDataCollector(source=DataSource())
+            store, csv_s = timed(MetroHistoryStore, csv_path, lines)
+            _, records_s = timed(cold.load_history, store.df)
+            warm = NanjingSubwayDataCollector(source=DataSource())
+            snapshot, warm_s = timed(warm.load_snapshot, csv_path, snapshot_path)
+            _, line_data_s = timed(lambda: warm.line_data)
+            assert warm.passenger_records == cold.passenger_records and warm.line_data == cold.line_data
+            assert snapshot.frame().equals(store.df)
+
+            print(f"\n{years} 年 {len(df)} 天: CSV {dir_size(csv_path) / 1024:.0f} KB，"
+                  f"快照 {dir_size(snapshot_path) / 1024:.0f} KB（保存 {save_s * 1000:.1f}ms）")
+            print(f"  进程内: 解析CSV {csv_s * 1000:.1f}ms + 建立记录 {records_s * 1000:.1f}ms，"
+                  f"快照恢复 {warm_s * 1000:.1f}ms（首次访问线路索引 {line_data_s * 1000:.1f}ms），记录和线路索引一致")
+            print(f"  {'方式':<20}{'到首次查询':>10}{'其中加载':>10}")
+            for kind in ('collector-csv', 'collector-snapshot', 'api-csv', 'api-snapshot'):
+                runs = [cold_load(kind, workdir) for _ in range(args.repeat)]
+                total_s, load_s = (min(run[i] for run in runs) for i in range(2))
+                print(f"  {kind:<20}{total_s * 1000:>8.1f}ms{load_s * 1000:>8.1f}ms")
+        finally:
+            shutil.rmtree(workdir)
+
+
+def _store_writer(workdir: str, config: dict, writer_id: int, writers: int, iterations: int,
+                  use_lock: bool, timeout: float, results):
+    """压测写入进程：每次把一个新的日期合并进历史数据（update_history：CSV、二进制矩阵、快照、线路指标）"""
+    import contextlib
+    import logging
+    import main as pipeline
+    from data_sources import DataSource
+    from export_writer import AtomicExportWriter, LockTimeout, WriterLock
+    from metro_data import NanjingSubwayDataCollector
+
+    os.chdir(workdir)
+    logging.getLogger().setLevel(logging.WARNING)
+    collector = NanjingSubwayDataCollector(config=config, source=DataSource())
+    lines = collector.all_lines
+    rng = np.random.default_rng(writer_id)
+    waits, timeouts, errors = [], 0, []
+    for k in range(iterations):
+        # 各进程交错写入不重复的日期，大多数是追加，写入顺序颠倒时触发整体重写
+        day = (pd.Timestamp('2030-01-01') + pd.Timedelta(days=k * writers + writer_id)).strftime('%Y-%m-%d')
+        values = np.round(rng.uniform(1, 50, len(lines)), 2).tolist()
+        data = dict(zip(lines, values))
+        data['总客流量'] = round(sum(values), 2)
+        collector.passenger_records = [{'date': day[5:], 'full_date': day, 'passenger_data': data, 'raw_text': ''}]
+        lock = WriterLock(timeout=timeout) if use_lock else contextlib.nullcontext()
+        try:
+            with lock:
+                waits.append(lock.waited if use_lock else 0.0)
+                pipeline.update_history(collector, AtomicExportWriter())
+        except LockTimeout:
+            timeouts += 1
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+    results.put(('writer', waits, timeouts, errors))
+
+
+def _store_reader(workdir: str, series: list, stop, results):
+    """压测读取进程（不加写入锁）：反复读取历史数据、二进制矩阵和快照，检查是否读到不完整的状态"""
+    from collector_snapshot import CollectorSnapshot
+    from history_matrix import HistoryMatrix
+    from history_store import HISTORY_FILE, MetroHistoryStore
+
+    os.chdir(workdir)
+    reads, violations = 0, []
+    last_csv = last_matrix = 0
+    while not stop.is_set():
+        try:
+            df = MetroHistoryStore(HISTORY_FILE, series[1:]).df
+            # 写入方只会新增日期，每天都有总客流量；行数减少或出现缺失说明读到了不完整的文件
+            if len(df) < last_csv or df['total'].isna().any() or df['date'].duplicated().any():
+                violations.append(f"history.csv: {len(df)} 行（之前 {last_csv} 行）")
+            last_csv = len(df)
+
+            matrix = HistoryMatrix()
+            valid = matrix.valid
+            if valid.sum() < last_matrix or (matrix.rows and np.isnan(np.asarray(matrix.values)[valid, 0]).any()):
+                violations.append(f"history_matrix: {int(valid.sum())} 天（之前 {last_matrix} 天）")
+            last_matrix = int(valid.sum())
+
+            snapshot = CollectorSnapshot.load(series, CollectorSnapshot.source_key(HISTORY_FILE))
+            if snapshot is not None and np.isnan(snapshot.values[:, 0]).any():
+                violations.append("collector_snapshot: 有缺失的总客流量")
+        except Exception as e:
+            violations.append(f"{type(e).__name__}: {e}")
+        reads += 1
+    results.put(('reader', reads, violations))
+
+
+def bench_concurrency(args):
+    """
+    存储并发压测：多个写入进程同时向同一个 docs/data 合并新日期，多个读取进程不加锁持续读取；
+    检查最终历史数据是否包含全部写入（没有丢失的更新）、读取方是否读到过不完整的状态
+    """
+    import multiprocessing
+    from history_matrix import HISTORY_MATRIX_FILE, HistoryMatrix
+    from history_store import HISTORY_FILE, MetroHistoryStore
+
+    with open('config.json', 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['archive'] = {'enabled': False}
+    lines = [line['name'] for line in config['lines']]
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+
+    for use_lock in ([True, False] if args.compare_unlocked else [True]):
+        workdir = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(workdir, 'docs', 'data'))
+            seed = make_synthetic_history(1, lines)
+            seed_store = MetroHistoryStore(os.path.join(workdir, HISTORY_FILE), lines)
+            seed_store.df = seed
+            seed_store.save()
+            HistoryMatrix(os.path.join(workdir, HISTORY_MATRIX_FILE)).sync(seed, lines)
+
+            results, stop = context.Queue(), context.Event()
+            readers = [context.Process(target=_store_reader, args=(workdir, ['total'] + lines, stop, results))
+                       for _ in range(args.readers)]
+            writers = [context.Process(target=_store_writer,
+                                       args=(workdir, config, i, args.writers, args.iterations, use_lock,
+                                             args.timeout, results))
+                       for i in range(args.writers)]
+            begin = time.perf_counter()
+            for process in readers + writers:
+                process.start()
+            outcomes = [results.get() for _ in writers]
+            elapsed = time.perf_counter() - begin
+            stop.set()
+            outcomes += [results.get() for _ in readers]
+            for process in readers + writers:
+                process.join()
+
+            waits = np.array([w for kind, *rest in outcomes if kind == 'writer' for w in rest[0]])
+            timeouts = sum(rest[1] for kind, *rest in outcomes if kind == 'writer')
+            errors = [e for kind, *rest in outcomes if kind == 'writer' for e in rest[2]]
+            reads = sum(rest[0] for kind, *rest in outcomes if kind == 'reader')
+            violations = [v for kind, *rest in outcomes if kind == 'reader' for v in rest[1]]
+
+            final = MetroHistoryStore(os.path.join(workdir, HISTORY_FILE), lines).df
+            expected = len(seed) + args.writers * args.iterations - timeouts
+            print(f"\n{'加写入锁' if use_lock else '不加锁'}: {args.writers} 个写入进程 × {args.iterations} 次，"
+                  f"{args.readers} 个读取进程，耗时 {elapsed:.1f}s（{args.writers * args.iterations / elapsed:.1f} 次写入/秒）")
+            if use_lock and len(waits):
+                print(f"  等待写入锁: 平均 {waits.mean() * 1000:.0f}ms，p99 {np.percentile(waits, 99) * 1000:.0f}ms，"
+                      f"最长 {waits.max() * 1000:.0f}ms，超时 {timeouts} 次")
+            print(f"  历史数据: {len(final)} 天，应为 {expected} 天，丢失 {expected - len(final)} 天；写入出错 {len(errors)} 次")
+            print(f"  读取 {reads} 次，读到不完整状态 {len(violations)} 次")
+            for message in (errors[:3] + violations[:3]):
+                print(f"    {message}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_correlation(args):
+    """线路相关性：向量化滚动相关 vs pandas rolling().corr()，以及缓存命中的耗时"""
+    from correlation import _ROLLING_CACHE, LineCorrelation, pandas_rolling_corr
+
+    lines = load_lines()
+    series = ['total'] + lines
+    df = make_synthetic_history(args.years, lines)
+    # 注入缺失数据，校验成对剔除缺失值的结果
+    df.loc[df.index[100:300], lines[3]] = np.nan
+    df.loc[df.index[::17], lines[5]] = np.nan
+    correlation = LineCorrelation(windows=args.windows).fit(df, series)
+    print(f"数据规模: {len(df)} 天 × {len(series)} 个序列（{len(series) ** 2} 个序列对）")
+
+    for window in correlation.windows:
+        _ROLLING_CACHE.clear()
+        corr, vectorized_s = timed(correlation.rolling, window)
+        _, cached_s = timed(correlation.rolling, window)
+        expected, pandas_s = timed(pandas_rolling_corr, df, series, window, correlation.min_periods(window))
+        both = ~np.isnan(corr) & ~np.isnan(expected)
+        nan_mismatch = int((np.isnan(corr) != np.isnan(expected)).sum())
+        print(f"窗口 {window:>4} 天: 向量化 {vectorized_s * 1000:7.1f} ms, 缓存 {cached_s * 1e6:5.1f} µs, "
+              f"pandas {pandas_s * 1000:7.1f} ms, 最大误差 {np.abs(corr - expected)[both].max():.1e}, "
+              f"缺失不一致 {nan_mismatch}")
+
+    _, json_s = timed(correlation.to_json)
+    print(f"导出JSON（全部窗口已缓存）: {json_s * 1000:.1f} ms")
+
+
+def inject_gaps(df: pd.DataFrame, lines: list, day_frac: float, cell_frac: float, seed: int = 0) -> pd.DataFrame:
+    """删除一部分整天（含连续几天的空缺）并随机清空部分线路和总客流的格子"""
+    rng = np.random.default_rng(seed)
+    n = len(df)
+    starts = rng.choice(n - 3, max(1, int(n * day_frac / 2)), replace=False)
+    lengths = rng.choice([1, 1, 1, 2, 3], len(starts))
+    dropped = np.unique(np.concatenate([np.arange(s, s + k) for s, k in zip(starts, lengths)]))
+    # 保留第一天和最后一天，日历范围不变
+    gapped = df.drop(index=df.index[dropped[(dropped > 0) & (dropped < n - 1)]]).copy()
+    cells = gapped[['total'] + lines].to_numpy(dtype=float, copy=True)
+    cells[rng.random(cells.shape) < cell_frac] = np.nan
+    gapped[['total'] + lines] = cells
+    return gapped
+
+
+def loop_fill(filler, values: np.ndarray, open_mask: np.ndarray):
+    """逐格循环的参照实现（语义与 GapFiller.fill_matrix 相同），返回 (补全后的矩阵, 来源编码)"""
+    from completeness import CLOSED, METHOD_CODES, OBSERVED, UNFILLED
+
+    n, s = values.shape
+    nan = float('nan')
+    filled = values.copy()
+    codes = np.full((n, s), CLOSED, dtype=np.int8)
+    for j in range(s):
+        seen = False
+        for t in range(n):
+            seen = seen or not np.isnan(values[t, j])
+            if not np.isnan(values[t, j]):
+                codes[t, j] = OBSERVED
+            elif seen and open_mask[t, j]:
+                codes[t, j] = UNFILLED
+    initial = codes.copy()
+
+    def interpolate(t, j):
+        p = next((r for r in range(t - 1, -1, -1) if not np.isnan(values[r, j])), None)
+        q = next((r for r in range(t + 1, n) if not np.isnan(values[r, j])), None)
+        if p is None or q is None or q - p - 1 > filler.max_gap:
+            return nan
+        return values[p, j] + (values[q, j] - values[p, j]) * (t - p) / (q - p)
+
+    def weekday(t, j):
+        samples = [values[r, j] for k in range(1, filler.weekday_weeks + 1) for r in (t - 7 * k, t + 7 * k)
+                   if 0 <= r < n and not np.isnan(values[r, j])]
+        return float(np.median(samples)) if len(samples) >= max(filler.min_weekday_samples, 1) else nan
+
+    def window_share(t, j):
+        half = filler.share_window // 2
+        ratios = [values[r, j] / values[r, 0] for r in range(max(0, t - half), min(n, t + filler.share_window - half))
+                  if values[r, 0] > 0 and not np.isnan(values[r, j])]
+        return sum(ratios) / len(ratios) if ratios else None
+
+    share_cache = {}
+
+    def share(t, j):
+        if (t, j) not in share_cache:
+            value = window_share(t, j)
+            if value is None:
+                earlier = (window_share(r, j) for r in range(t - 1, -1, -1))
+                later = (window_share(r, j) for r in range(t + 1, n))
+                value = next((v for v in earlier if v is not None), None)
+                value = next((v for v in later if v is not None), nan) if value is None else value
+            share_cache[t, j] = value
+        return share_cache[t, j]
+
+    def share_estimate(t, j):
+        if j == 0:
+            if any(initial[t, k] == UNFILLED for k in range(1, s)) or not any(initial[t, 1:] == OBSERVED):
+                return nan
+            return float(np.nansum(values[t, 1:]))
+        total = filled[t, 0]
+        missing = [k for k in range(1, s) if codes[t, k] == UNFILLED]
+        known = sum(filled[t, k] for k in range(1, s) if codes[t, k] >= OBSERVED)
+        share_missing = sum(share(t, k) for k in missing if not np.isnan(share(t, k)))
+        residual = total - known
+        if total * share_missing != 0 and abs(residual / (total * share_missing) - 1) <= filler.share_tolerance:
+            return residual * share(t, j) / share_missing
+        return share(t, j) * total
+
+    estimators = {'share': share_estimate, 'interpolate': interpolate, 'weekday_median': weekday}
+    for columns in (range(0, 1), range(1, s)):
+        for strategy in filler.strategies:
+            estimates = {(t, j): estimators[strategy](t, j) for t in range(n) for j in columns
+                         if codes[t, j] == UNFILLED}
+            for (t, j), value in estimates.items():
+                if not np.isnan(value):
+                    filled[t, j], codes[t, j] = value, METHOD_CODES[strategy]
+    return filled, codes
+
+
+def bench_completeness(args):
+    """缺失插补：向量化 vs 逐格循环（结果一致性、耗时），以及各插补方式相对真实值的误差"""
+    from completeness import METHOD_CODES, UNFILLED, GapFiller
+    from history_matrix import HistoryMatrix
+    from line_config import VersionedLineConfig
+
+    with open('config.json', 'r', encoding='utf-8') as f:
+        line_config = VersionedLineConfig(json.load(f)['lines'])
+    lines = line_config.lines
+    series = ['total'] + lines
+    truth = make_synthetic_history(args.years, lines)
+    gapped = inject_gaps(truth, lines, args.day_frac, args.cell_frac)
+    filler = GapFiller()
+    completed, vectorized_s = timed(filler.fill, gapped, lines, line_config)
+    print(f"数据规模: {len(completed)} 天 × {len(series)} 个序列，整天缺失 {len(completed.gap_days)} 天，"
+          f"缺失 {int(completed.missing.sum())} 格")
+    print(f"向量化补全: {vectorized_s * 1000:.1f} ms")
+
+    window = GapFiller().context_days + 7
+    _, window_s = timed(lambda: [filler.fill(gapped.tail(window), lines, line_config) for _ in range(args.repeat)])
+    print(f"最近7天（含 {window - 7} 天上下文）: {window_s / args.repeat * 1000:.2f} ms")
+
+    if args.loop_days:
+        head = gapped[gapped['date'] < str(completed.dates[min(args.loop_days, len(completed)) - 1] + 1)]
+        sample = filler.fill(head, lines, line_config)
+        open_mask = filler.open_mask(sample.dates, lines, line_config)
+        _, values = HistoryMatrix.dense(head, series)
+        (expected, expected_codes), loop_s = timed(loop_fill, filler, values, open_mask)
+        _, sample_s = timed(filler.fill, head, lines, line_config)
+        both = ~np.isnan(sample.values) & ~np.isnan(expected)
+        print(f"逐格循环（前 {len(sample)} 天）: {loop_s * 1000:.1f} ms vs 向量化 {sample_s * 1000:.1f} ms，"
+              f"来源不一致 {int((sample.codes != expected_codes).sum())} 格，"
+              f"最大误差 {np.abs(sample.values - expected)[both].max():.1e}")
+
+    reference = truth.set_index('date').reindex(
+        np.datetime_as_string(completed.dates, unit='D'))[series].to_numpy(dtype=float)
+    print(f"\n{'插补方式（顺序 / 实际使用）':<34}{'格子数':>8}{'总客流误差':>10}{'线路误差':>8}")
+    for order in (filler.strategies, ['interpolate'], ['weekday_median'], ['share', 'interpolate']):
+        result = completed if order == filler.strategies else GapFiller(strategies=order).fill(gapped, lines, line_config)
+        label = '+'.join(order)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            error = np.abs(result.values - reference) / reference * 100
+        for name, code in METHOD_CODES.items():
+            cells = result.codes == code
+            if not cells.any():
+                continue
+            total_err = f"{np.nanmean(error[:, 0][cells[:, 0]]):.2f}%" if cells[:, 0].any() else '-'
+            line_err = f"{np.nanmean(error[:, 1:][cells[:, 1:]]):.2f}%" if cells[:, 1:].any() else '-'
+            print(f"{label + ' / ' + name:<40}{int(cells.sum()):>8}{total_err:>11}{line_err:>10}")
+        print(f"{label + ' / 未补':<40}{int((result.codes == UNFILLED).sum()):>8}")
+
+
+def file_digests(root: str, exclude: tuple = ()) -> dict:
+    """目录下各文件的内容摘要（相对路径 -> sha1），exclude 为跳过的子目录或文件"""
+    digests = {}
+    for dirpath, dirnames, files in os.walk(root):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) not in exclude]
+        for name in files:
+            path = os.path.join(dirpath, name)
+            if path in exclude:
+                continue
+            with open(path, 'rb') as f:
+                digests[os.path.relpath(path, root)] = hashlib.sha1(f.read()).hexdigest()
+    return digests
+
+
+def bench_ranged_export(args):
+    """
+    带 --from/--to 的 export 阶段：检查全局导出（列式年份分区、latest_data.json、线路指标、分析结果）
+    与不带范围时完全一致，范围数据只写到 docs/data/ranges/ 下
+    """
+    import logging
+    import cli
+    from columnar_export import COLUMNAR_DIR, columnar_available, read_history_columnar
+    from history_matrix import HistoryMatrix
+    from history_store import HISTORY_FILE, MetroHistoryStore
+
+    with open('config.json', 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['archive'] = {'enabled': False}
+    lines = [line['name'] for line in config['lines']]
+    df = make_synthetic_history(args.years, lines)
+    last = pd.Timestamp(df['date'].iloc[-1])
+    ranges = [
+        ((last - pd.Timedelta(days=400)).strftime('%Y-%m-%d'), (last - pd.Timedelta(days=300)).strftime('%Y-%m-%d')),
+        ((last - pd.Timedelta(days=30)).strftime('%Y-%m-%d'), None),
+        (None, df['date'].iloc[len(df) // 2]),
+    ]
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp()
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        os.chdir(workdir)
+        os.makedirs('docs/data')
+        with open('config.json', 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False)
+        store = MetroHistoryStore(HISTORY_FILE, lines)
+        store.df = df.copy()
+        store.save()
+        HistoryMatrix().sync(df, lines)
+
+        _, full_s = timed(cli.run, ['export'], cli.PipelineContext('config.json'), [])
+        # 写入锁文件记录持有者，每次运行都会变化
+        exclude = (os.path.join('docs/data', 'ranges'), os.path.normpath(config['storage']['lock_file']))
+        baseline = file_digests('docs/data', exclude)
+        partitions = sorted(p for p in baseline if p.startswith(os.path.relpath(COLUMNAR_DIR, 'docs/data')))
+        print(f"\n{args.years} 年 {len(df)} 天: 全量导出 {full_s:.2f}s，{len(baseline)} 个文件，"
+              f"列式分区 {len(partitions)} 个")
+
+        failures = []
+        for start, end in ranges:
+            ctx = cli.PipelineContext('config.json', start, end)
+            _, ranged_s = timed(cli.run, ['export'], ctx, [])
+            after = file_digests('docs/data', exclude)
+            changed = sorted(p for p in set(baseline) | set(after) if baseline.get(p) != after.get(p))
+            out_dir = cli.range_dir(start, end)
+            expected_days = int(((df['date'] >= (start or '')) & (df['date'] <= (end or '9999'))).sum())
+            range_days = len(MetroHistoryStore(os.path.join(out_dir, 'history.csv'), lines).df)
+            if columnar_available():
+                range_days = min(range_days, len(read_history_columnar(os.path.join(out_dir, 'columnar'))))
+            print(f"  --from {start or '-':<10} --to {end or '-':<10} {ranged_s:.2f}s: "
+                  f"全局导出变化 {len(changed)} 个文件，范围导出 {range_days}/{expected_days} 天（{out_dir}）")
+            for path in changed[:5]:
+                print(f"    变化: {path}")
+            if changed or range_days != expected_days:
+                failures.append((start, end))
+        assert not failures, f"带日期范围的导出改动了全局导出或范围数据不完整: {failures}"
+        print("  ✅ 全局导出未受日期范围影响")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='南京地铁客流分析性能基准')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='导出格式对比')
+    export_parser.add_argument('--years', type=int, default=10, help='合成历史数据年数')
+    export_parser.set_defaults(func=bench_export)
+
+    anomaly_parser = subparsers.add_parser('anomaly', help='异常检测耗时')
+    anomaly_parser.add_argument('--years', type=int, default=10, help='合成历史数据年数')
+    anomaly_parser.add_argument('--repeat', type=int, default=5, help='重复次数')
+    anomaly_parser.set_defaults(func=bench_anomaly)
+
+    rolling_parser = subparsers.add_parser('rolling', help='滚动统计增量更新耗时')
+    rolling_parser.add_argument('--years', type=int, default=10, help='合成历史数据年数')
+    rolling_parser.add_argument('--days', type=int, default=30, help='增量追加的天数')
+    rolling_parser.set_defaults(func=bench_rolling)
+
+    forecast_parser = subparsers.add_parser('forecast', help='预测拟合耗时')
+    forecast_parser.add_argument('--years', type=int, default=10, help='合成历史数据年数')
+    forecast_parser.add_argument('--replicas', type=int, default=1, help='线路复制倍数')
+    forecast_parser.set_defaults(func=bench_forecast)
+
+    validate_parser = subparsers.add_parser('validate', help='解析校验耗时')
+    validate_parser.add_argument('--years', type=int, default=10, help='合成历史数据年数')
+    validate_parser.set_defaults(func=bench_validate)
+
+    api_parser = subparsers.add_parser('api', help='查询API压测')
+    api_parser.add_argument('--years', type=int, default=10, help='合成历史数据年数')
+    api_parser.add_argument('--url', help='压测已启动的服务（如 http://127.0.0.1:8766），默认在进程内启动')
+    api_parser.add_argument('--requests', type=int, default=20000, help='总请求数')
+    api_parser.add_argument('--concurrency', type=int, default=16, help='并发连接数')
+    api_parser.add_argument('--distinct', type=int, default=200, help='不同查询的数量')
+    api_parser.add_argument('--conditional', type=float, default=0.3, help='携带 If-None-Match 的请求比例')
+    api_parser.set_defaults(func=bench_api)
+
+    heatmap_parser = subparsers.add_parser('heatmap', help='热力图绘制耗时')
+    heatmap_parser.add_argument('--days', type=int, nargs='+', default=[7, 31, 90, 365, 3650],
+                                help='线路热力图的天数')
+    heatmap_parser.add_argument('--years', type=int, nargs='+', default=[1, 5, 10], help='日历热力图的年数')
+    heatmap_parser.add_argument('--dpi', type=int, default=100, help='线路热力图的保存分辨率')
+    heatmap_parser.set_defaults(func=bench_heatmap)
+
+    systems_parser = subparsers.add_parser('systems', help='多线网并发采集耗时')
+    systems_parser.add_argument('--systems', type=int, nargs='+', default=[1, 2, 4, 8], help='线网数')
+    systems_parser.add_argument('--accounts', type=int, default=1, help='每个线网的账号数')
+    systems_parser.add_argument('--days', type=int, default=180, help='每个账号的帖子数')
+    systems_parser.add_argument('--latency', type=float, default=0.2, help='每页模拟的网络延迟（秒）')
+    systems_parser.add_argument('--workers', type=int, default=8, help='并发数')
+    systems_parser.set_defaults(func=bench_systems)
+
+    matrix_parser = subparsers.add_parser('matrix', help='二进制历史数据冷启动耗时和内存')
+    matrix_parser.add_argument('--years', type=int, nargs='+', default=[10, 30], help='合成历史数据年数')
+    matrix_parser.add_argument('--repeat', type=int, default=3, help='每种方式的重复次数（取最小值）')
+    matrix_parser.set_defaults(func=bench_matrix)
+
+    parse_parser = subparsers.add_parser('parse', help='进程池批量解析耗时')
+    parse_parser.add_argument('--posts', type=int, default=1000000, help='合成帖子数')
+    parse_parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, 8], help='进程数')
+    parse_parser.add_argument('--chunk-size', type=int, default=20000, help='每块的帖子数')
+    parse_parser.set_defaults(func=bench_parse)
+
+    correlation_parser = subparsers.add_parser('correlation', help='线路滚动相关性耗时')
+    correlation_parser.add_argument('--years', type=int, default=10, help='合成历史数据年数')
+    correlation_parser.add_argument('--windows', type=int, nargs='+', default=[30, 90, 365], help='窗口天数')
+    correlation_parser.set_defaults(func=bench_correlation)
+
+    archive_parser = subparsers.add_parser('archive', help='原始帖子归档及重新解析耗时')
+    archive_parser.add_argument('--years', type=int, default=10, help='帖子覆盖的年数（不超过10）')
+    archive_parser.add_argument('--per-day', type=int, default=5, help='每天的帖子数')
+    archive_parser.add_argument('--jobs', type=int, nargs='+', default=[1, 4], help='重新解析的进程数')
+    archive_parser.set_defaults(func=bench_archive)
+
+    compare_parser = subparsers.add_parser('compare', help='任意时段对比耗时')
+    compare_parser.add_argument('--years', type=int, nargs='+', default=[10, 30], help='合成历史数据年数')
+    compare_parser.add_argument('--repeat', type=int, default=50, help='每个范围的重复次数')
+    compare_parser.set_defaults(func=bench_compare)
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='采集器快照热启动耗时')
+    snapshot_parser.add_argument('--years', type=int, nargs='+', default=[10, 30], help='合成历史数据年数')
+    snapshot_parser.add_argument('--repeat', type=int, default=3, help='每种方式的重复次数（取最小值）')
+    snapshot_parser.set_defaults(func=bench_snapshot)
+
+    concurrency_parser = subparsers.add_parser('concurrency', help='多进程同时读写历史数据的压测')
+    concurrency_parser.add_argument('--writers', type=int, default=8, help='写入进程数')
+    concurrency_parser.add_argument('--readers', type=int, default=4, help='读取进程数')
+    concurrency_parser.add_argument('--iterations', type=int, default=20, help='每个写入进程的写入次数')
+    concurrency_parser.add_argument('--timeout', type=float, default=120, help='等待写入锁的超时秒数')
+    concurrency_parser.add_argument('--compare-unlocked', action='store_true', help='再运行一次不加写入锁的对照')
+    concurrency_parser.set_defaults(func=bench_concurrency)
+
+    completeness_parser = subparsers.add_parser('completeness', help='缺失检测及插补耗时和误差')
+    completeness_parser.add_argument('--years', type=int, default=10, help='合成历史数据年数')
+    completeness_parser.add_argument('--day-frac', type=float, default=0.03, help='整天缺失的比例')
+    completeness_parser.add_argument('--cell-frac', type=float, default=0.02, help='单个格子缺失的比例')
+    completeness_parser.add_argument('--loop-days', type=int, default=730, help='逐格循环参照实现的天数（0 为不对比）')
+    completeness_parser.add_argument('--repeat', type=int, default=20, help='最近7天补全的重复次数')
+    completeness_parser.set_defaults(func=bench_completeness)
+
+    ranged_parser = subparsers.add_parser('ranged-export', help='带日期范围的导出不影响全局导出')
+    ranged_parser.add_argument('--years', type=int, default=3, help='合成历史数据年数')
+    ranged_parser.set_defaults(func=bench_ranged_export)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
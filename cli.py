@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+命令行入口：按阶段运行分析流程，各阶段通过本地历史数据（docs/data/history.csv）衔接
+
+用法:
+    python cli.py collect                       采集并合并到历史数据
+    python cli.py render                        只重绘图表（读取历史数据，不访问网络）
+    python cli.py render --charts trend --window 14
+    python cli.py export --from 2025-01-01 --to 2025-06-30   全局导出不变，范围数据导出到 docs/data/ranges/
+    python cli.py report
+    python cli.py all --jobs 4                  采集 → 导出 → 绘图 → 报告
+    python cli.py collect --parse-jobs 8        多进程解析（本地文件大批量回填）
+    python cli.py reparse --parse-jobs 4        用当前解析规则重新解析原始帖子归档并改写历史数据
+
+阶段可以组合，按 reparse → collect → export → render → report 的顺序执行，如:
+    python cli.py export render --jobs 4
+    python cli.py reparse export render
+all 不包含 reparse
+"""
+
+import argparse
+import copy
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import main as pipeline
+from export_writer import AtomicExportWriter, WriterLock
+from metro_data import NanjingSubwayDataCollector
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('reparse', 'collect', 'export', 'render', 'report')
+# --from/--to 范围导出的根目录（全局导出不受日期范围影响）
+RANGE_DIR = 'docs/data/ranges'
+# all 表示的阶段（reparse 只在解析规则改进后手动运行）
+DEFAULT_STAGES = STAGES[1:]
+
+
+class PipelineContext:
+    """各阶段共用的采集器、历史数据和写入器（历史数据按需加载一次）"""
+
+    def __init__(self, config_file: str = 'config.json', start: Optional[str] = None,
+                 end: Optional[str] = None, window: Optional[int] = None, parse_jobs: int = 1):
+        self.config_file = config_file
+        self.start = start
+        self.end = end
+        self.parse_jobs = parse_jobs
+        self.collector = NanjingSubwayDataCollector(config_file)
+        self.window = window or self.collector.config.get('visualization', {}).get('default_days', 7)
+        self.writer = AtomicExportWriter()
+        self._history = None
+        self._view = None
+        self._forecast = None
+        # 采集器中的记录是否就是完整的历史数据（从快照或CSV加载后为 True，采集/重新解析后为 False）
+        self._full_history_loaded = False
+        # 采集器当前对应的数据：'full'（完整历史）、'view'（--from/--to 视图）或 None（尚未对应）
+        self._collector_points_to = None
+
+    @property
+    def ranged(self) -> bool:
+        """是否用 --from/--to 限定了日期范围"""
+        return bool(self.start or self.end)
+
+    @property
+    def history(self):
+        """完整的历史数据（collect 阶段合并并保存），快照有效时热启动"""
+        if self._history is None:
+            # collect/reparse 阶段已有新记录时只加载历史数据，不覆盖采集器的记录
+            load_records = not self.collector.passenger_records
+            self._history = pipeline.open_history(self.collector, self.writer, load_records)
+            self._full_history_loaded = load_records
+        return self._history
+
+    @property
+    def full_history(self):
+        """完整的历史数据，同时让采集器的记录对应完整历史（全局导出使用，不受 --from/--to 影响）"""
+        self._point_collector('full')
+        return self.history
+
+    @property
+    def store(self):
+        """按 --from/--to 截取的历史数据视图（只在内存中，不会写回），同时让采集器的记录对应该视图"""
+        if self._view is None:
+            view = copy.copy(self.history)
+            df = view.df
+            if self.start:
+                df = df[df['date'] >= self.start]
+            if self.end:
+                df = df[df['date'] <= self.end]
+            view.df = df.reset_index(drop=True)
+            self._view = view
+        self._point_collector('view' if self.ranged else 'full')
+        return self._view
+
+    def _point_collector(self, target: str):
+        """用完整历史（'full'）或日期范围视图（'view'）填充采集器的记录，已对应时不重复加载"""
+        if self._collector_points_to == target:
+            return
+        if target == 'view':
+            self.collector.load_history(self._view.df)
+            self.collector.history_matrix = None
+            self._full_history_loaded = False
+        else:
+            history = self.history
+            if not self._full_history_loaded:
+                self.collector.load_history(history.df)
+                self._full_history_loaded = True
+            # 完整历史的最近n天数据直接从二进制历史数据切片
+            self.collector.open_history_matrix()
+        self._collector_points_to = target
+
+    def invalidate(self):
+        """历史数据更新后重新生成视图和指标"""
+        self._view = None
+        self._forecast = None
+        self._full_history_loaded = False
+        self._collector_points_to = None
+
+    @property
+    def forecast(self):
+        """预测拟合结果（export 和 render 阶段共用一次拟合），历史不足时为 None"""
+        if self._forecast is None:
+            self._forecast = (pipeline.fit_forecast(self.collector.config, self.store),)
+        return self._forecast[0]
+
+
+def stage_reparse(ctx: PipelineContext):
+    """从原始帖子归档重新解析（--from/--to 限定帖子的发布日期），解析结果覆盖历史数据中的同一天"""
+    records = ctx.collector.reparse_archive(ctx.parse_jobs, ctx.start, ctx.end)
+    logger.info(f"归档中 {ctx.collector.collect_stats.get('posts', 0)} 条帖子重新解析出 {len(records)} 条客流记录")
+    pipeline.write_parse_quality(ctx.collector, ctx.writer)
+    if not records:
+        logger.warning("归档中没有可解析的帖子")
+        return
+    pipeline.update_history(ctx.collector, ctx.writer, ctx.history)
+    ctx.invalidate()
+
+
+def stage_collect(ctx: PipelineContext):
+    """采集 → 归档原始帖子 → 校验 → 合并到历史数据"""
+    records = ctx.collector.collect_data(ctx.parse_jobs)
+    logger.info(f"共收集到 {len(records)} 条客流记录")
+    pipeline.save_archive(ctx.collector, ctx.writer)
+    pipeline.write_parse_quality(ctx.collector, ctx.writer)
+    if not records:
+        logger.warning("没有收集到数据，后续阶段使用已有的历史数据")
+        return
+    pipeline.update_history(ctx.collector, ctx.writer, ctx.history)
+    ctx.invalidate()
+
+
+def stage_export(ctx: PipelineContext):
+    """
+    导出最近几天CSV/JSON、列式历史、线路指标和分析结果
+
+    这些是全局导出（网页、报告和下游读取的固定文件），始终基于完整历史；
+    指定 --from/--to 时该范围的数据另外导出到 RANGE_DIR 下按范围命名的目录，不覆盖全局导出
+    """
+    from line_metrics import LINE_METRICS_FILE, LineMetricsTable
+
+    if ctx.ranged:
+        export_range(ctx)
+    history = ctx.full_history
+    if history.df.empty:
+        logger.warning("没有历史数据，跳过导出")
+        return
+    line_metrics = LineMetricsTable(history.df, ctx.collector.line_config)
+    ctx.writer.write_json(LINE_METRICS_FILE, line_metrics.to_json(), indent=2)
+    # 没有限定日期范围时视图就是完整历史，预测与 render 阶段共用
+    pipeline.export_latest(ctx.collector, history, ctx.writer, ctx.window)
+    pipeline.run_analytics(ctx.collector, history, ctx.writer, None if ctx.ranged else ctx.forecast)
+
+
+def range_dir(start: Optional[str], end: Optional[str]) -> str:
+    """日期范围导出的目录，如 docs/data/ranges/2025-01-01_2025-06-30（未指定的一端为 begin/latest）"""
+    return os.path.join(RANGE_DIR, f"{start or 'begin'}_{end or 'latest'}")
+
+
+def export_range(ctx: PipelineContext) -> str:
+    """
+    导出 --from/--to 范围内的历史数据、线路指标和列式分区（单独的目录，与全局导出互不影响）
+
+    Returns:
+        str: 导出目录
+    """
+    from columnar_export import export_history_columnar
+    from line_metrics import LineMetricsTable
+
+    out_dir = range_dir(ctx.start, ctx.end)
+    view = ctx.store
+    if view.df.empty:
+        logger.warning(f"{ctx.start or '最早'} ~ {ctx.end or '最新'} 没有历史数据，跳过范围导出")
+        return out_dir
+    ctx.writer.write_csv(os.path.join(out_dir, 'history.csv'), view.df, encoding='utf-8-sig')
+    metrics = LineMetricsTable(view.df, ctx.collector.line_config)
+    ctx.writer.write_json(os.path.join(out_dir, 'line_metrics.json'), metrics.to_json(), indent=2)
+    export_history_columnar(view.df, view.lines, out_dir=os.path.join(out_dir, 'columnar'), writer=ctx.writer)
+    logger.info(f"范围数据已导出到 {out_dir}（{len(view.df)} 天）")
+    return out_dir
+
+
+# 绘图子进程中的上下文（每个进程只加载一次历史数据和 matplotlib）
+_worker: Dict = {}
+
+
+def _init_render_worker(config_file: str, start: Optional[str], end: Optional[str], window: int):
+    ctx = PipelineContext(config_file, start, end, window)
+    ctx.store  # 加载历史数据并让采集器的记录对应 --from/--to 视图
+    _worker['ctx'] = ctx
+    _worker['visualizer'] = pipeline.NanjingSubwayVisualizer(ctx.collector)
+
+
+def _render_one(name: str) -> tuple:
+    """在子进程中绘制一张图表，返回 (名称, 是否成功, 耗时)"""
+    ctx = _worker['ctx']
+    start = time.perf_counter()
+    ok = pipeline.render_charts(_worker['visualizer'], ctx.window, ctx.store, names=[name]) > 0
+    return name, ok, time.perf_counter() - start
+
+
+def submit_render(ctx: PipelineContext, names: List[str], jobs: int):
+    """
+    在进程池中并行绘制图表（matplotlib 不是线程安全的）
+
+    Returns:
+        tuple: (executor, futures)，调用方等待完成后关闭 executor
+    """
+    executor = ProcessPoolExecutor(max_workers=min(jobs, len(names)), initializer=_init_render_worker,
+                                   initargs=(ctx.config_file, ctx.start, ctx.end, ctx.window))
+    return executor, [executor.submit(_render_one, name) for name in names]
+
+
+def wait_render(executor, futures) -> int:
+    rendered = 0
+    try:
+        for future in futures:
+            name, ok, seconds = future.result()
+            logger.info(f"  图表 {name}: {'已保存' if ok else '失败'}（{seconds:.2f}s）")
+            rendered += ok
+    finally:
+        executor.shutdown()
+    return rendered
+
+
+def stage_render(ctx: PipelineContext, names: List[str], jobs: int = 1) -> int:
+    """绘制图表（jobs > 1 时多进程并行）"""
+    if ctx.store.df.empty:
+        logger.warning("没有历史数据，跳过绘图")
+        return 0
+    if jobs > 1 and len(names) > 1:
+        return wait_render(*submit_render(ctx, names, jobs))
+    visualizer = pipeline.NanjingSubwayVisualizer(ctx.collector)
+    return pipeline.render_charts(visualizer, ctx.window, ctx.store, names, ctx.forecast)
+
+
+def stage_report(ctx: PipelineContext):
+    """生成HTML报告（读取导出阶段的结果）"""
+    from generate_report import generate_html_report
+    generate_html_report()
+
+
+def run(stages: List[str], ctx: PipelineContext, charts: List[str], jobs: int = 1) -> Dict[str, float]:
+    """
+    按顺序运行选中的阶段；jobs > 1 时图表在子进程中绘制，同时在主进程中执行导出。
+    运行期间持有写入锁，其他写入进程运行中时等待（超时抛出 LockTimeout）
+
+    Returns:
+        Dict[str, float]: 各阶段耗时（秒）
+    """
+    timings = {}
+
+    def timed(name, func, *args):
+        start = time.perf_counter()
+        logger.info(f"=== {name} ===")
+        result = func(*args)
+        timings[name] = round(time.perf_counter() - start, 2)
+        return result
+
+    # 各阶段都会写入 docs/data，整个运行期间持有写入锁（与其他写入进程互斥，读取方不受影响）
+    with WriterLock.from_config(ctx.collector.config):
+        if 'reparse' in stages:
+            timed('reparse', stage_reparse, ctx)
+        if 'collect' in stages:
+            timed('collect', stage_collect, ctx)
+
+        parallel_render = 'render' in stages and jobs > 1 and len(charts) > 1 and not ctx.store.df.empty
+        if parallel_render:
+            render_start = time.perf_counter()
+            # 子进程从磁盘读取历史数据，collect 阶段已经保存
+            pending = submit_render(ctx, charts, jobs)
+        if 'export' in stages:
+            timed('export', stage_export, ctx)
+        if parallel_render:
+            wait_render(*pending)
+            timings['render'] = round(time.perf_counter() - render_start, 2)
+        elif 'render' in stages:
+            timed('render', stage_render, ctx, charts, 1)
+        if 'report' in stages:
+            timed('report', stage_report, ctx)
+
+    ctx.writer.log_summary()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='南京地铁客流分析',
+        epilog='阶段按 reparse → collect → export → render → report 的顺序执行，all 表示除 reparse 外的全部阶段')
+    parser.add_argument('stages', nargs='+', choices=STAGES + ('all',), help='要运行的阶段')
+    parser.add_argument('--config', default='config.json', help='配置文件')
+    parser.add_argument('--from', dest='start', help='起始日期 YYYY-MM-DD（绘图使用的历史范围；导出时另存到 docs/data/ranges/）')
+    parser.add_argument('--to', dest='end', help='结束日期 YYYY-MM-DD')
+    parser.add_argument('--window', type=int, help='趋势图、仪表板和最近数据导出的天数（默认读取配置）')
+    parser.add_argument('--charts', nargs='+', choices=pipeline.CHART_NAMES, default=list(pipeline.CHART_NAMES),
+                        help='render 阶段绘制的图表')
+    parser.add_argument('--jobs', type=int, default=1, help=f'并行绘图的进程数（本机 {os.cpu_count()} 核）')
+    parser.add_argument('--parse-jobs', type=int, default=1,
+                        help='collect/reparse 阶段解析帖子的进程数（大批量回填、重新解析时使用）')
+    args = parser.parse_args()
+
+    stages = list(DEFAULT_STAGES) if 'all' in args.stages else [s for s in STAGES if s in args.stages]
+    ctx = PipelineContext(args.config, args.start, args.end, args.window, max(1, args.parse_jobs))
+    start = time.perf_counter()
+    timings = run(stages, ctx, args.charts, max(1, args.jobs))
+
+    print("\n" + "=" * 60)
+    print(f"✅ 完成阶段: {', '.join(stages)}（总耗时 {time.perf_counter() - start:.2f}s）")
+    for name, seconds in timings.items():
+        print(f"   {name:<8}{seconds:>8.2f}s")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
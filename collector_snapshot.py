@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import json
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from export_writer import AtomicExportWriter, flock_file
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SNAPSHOT_FILE = 'docs/data/collector_snapshot.npz'
+# 与 history_store.HISTORY_FILE 相同；热启动不导入 history_store，避免加载 pandas
+SOURCE_FILE = 'docs/data/history.csv'
+# 快照中数组的含义或布局变化时加1，旧快照自动作废并重建
+SNAPSHOT_VERSION = 1
+
+
+class CollectorSnapshot:
+    """
+    采集器状态快照（热启动用）：由历史数据加载出的全部记录，按列保存为一个 npz 文件
+
+        version       快照格式版本
+        series        列名（total + 各线路），与当前配置的线路不一致时快照作废
+        source        生成快照时 history.csv 的内容摘要，历史数据被改写后快照作废
+        full_dates    日期 YYYY-MM-DD（与 passenger_records 相同，最新日期在前）
+        values        天数 × 列 float64 矩阵，缺失值为 NaN
+        digest        数据版本摘要（查询服务的 ETag 等使用）
+        collect_stats 最近一次采集的计数（JSON 字符串）
+
+    只保存数组和字符串（不使用 pickle）。热启动不导入 pandas：passenger_records 由这些列一次性重建，
+    line_data 在首次访问时建立；前缀和等毫秒级以内的派生结果不保存，加载后按需计算
+    """
+
+    def __init__(self, full_dates: np.ndarray, values: np.ndarray, series: List[str],
+                 source: str = '', collect_stats: Optional[Dict] = None):
+        self.full_dates = np.asarray(full_dates, dtype='U10')
+        self.values = np.asarray(values, dtype=float).reshape(len(self.full_dates), len(series))
+        self.series = list(series)
+        self.source = source
+        self.collect_stats = dict(collect_stats or {})
+
+    @staticmethod
+    def source_key(path: str) -> str:
+        """历史数据文件的内容摘要（文件不存在时为空串）；不用修改时间，重新检出仓库后快照仍然有效"""
+        if not os.path.exists(path):
+            return ''
+        with open(path, 'rb') as f:
+            flock_file(f, shared=True)
+            return hashlib.sha1(f.read()).hexdigest()
+
+    @classmethod
+    def from_history(cls, df: 'pd.DataFrame', lines: List[str], source: str = '',
+                     collect_stats: Optional[Dict] = None) -> 'CollectorSnapshot':
+        """由历史数据（date 升序, total, 各线路）创建"""
+        series = ['total'] + list(lines)
+        frame = df.reindex(columns=['date'] + series).iloc[::-1]
+        return cls(frame['date'].astype(str).to_numpy(), frame[series].to_numpy(dtype=float),
+                   series, source, collect_stats)
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.full_dates.tobytes() + self.values.tobytes()).hexdigest()[:16]
+
+    def frame(self) -> 'pd.DataFrame':
+        """MetroHistoryStore 格式的历史数据（date 升序）"""
+        import pandas as pd
+
+        df = pd.DataFrame(self.values[::-1], columns=self.series)
+        df.insert(0, 'date', self.full_dates[::-1].astype(object))
+        return df
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(buffer, version=SNAPSHOT_VERSION, series=np.array(self.series), source=self.source,
+                 full_dates=self.full_dates, values=self.values, digest=self.digest,
+                 collect_stats=json.dumps(self.collect_stats, ensure_ascii=False, default=str))
+        return buffer.getvalue()
+
+    def save(self, path: str = SNAPSHOT_FILE, writer: Optional[AtomicExportWriter] = None) -> AtomicExportWriter:
+        """原子写入（内容未变化时跳过）"""
+        writer = writer or AtomicExportWriter()
+        writer.write_bytes(path, self.to_bytes())
+        return writer
+
+    @classmethod
+    def load(cls, series: List[str], source: str, path: str = SNAPSHOT_FILE) -> Optional['CollectorSnapshot']:
+        """
+        加载快照，不存在、版本或列名不一致、与历史数据不一致时返回 None（调用方全量重建）
+
+        Args:
+            series: 当前配置的列名（total + 各线路）
+            source: 当前 history.csv 的 source_key
+            path: 快照文件
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['version']) != SNAPSHOT_VERSION or data['series'].tolist() != list(series) \
+                        or str(data['source']) != source:
+                    return None
+                snapshot = cls(data['full_dates'], data['values'], list(series), source,
+                               json.loads(str(data['collect_stats'])))
+                if str(data['digest']) != snapshot.digest:
+                    return None
+        except (OSError, KeyError, ValueError) as e:
+            print(f"⚠️ 读取采集器快照 {path} 时出错: {e}")
+            return None
+        return snapshot
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+from typing import List, Optional
+
+import pandas as pd
+
+from export_writer import AtomicExportWriter
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 为可选依赖
+    pa = None
+
+COLUMNAR_DIR = 'docs/data/columnar'
+
+
+def columnar_available() -> bool:
+    """是否安装了 pyarrow"""
+    return pa is not None
+
+
+def build_schema(lines: List[str]):
+    """历史数据的列式schema：日期为date32，线路和总量均为float64"""
+    fields = [pa.field('date', pa.date32()), pa.field('total', pa.float64())]
+    fields += [pa.field(line, pa.float64()) for line in lines]
+    return pa.schema(fields)
+
+
+def to_arrow_table(df: pd.DataFrame, lines: List[str]):
+    """将历史数据DataFrame转换为带类型的Arrow表"""
+    frame = df.reindex(columns=['date', 'total'] + list(lines)).copy()
+    frame['date'] = pd.to_datetime(frame['date']).dt.date
+    for col in frame.columns[1:]:
+        frame[col] = frame[col].astype('float64')
+    return pa.Table.from_pandas(frame, schema=build_schema(lines), preserve_index=False)
+
+
+def export_history_columnar(df: pd.DataFrame, lines: List[str], out_dir: str = COLUMNAR_DIR,
+                            fmt: str = 'parquet', writer: Optional[AtomicExportWriter] = None) -> List[str]:
+    """
+    按年份分区导出全部历史数据
+
+    Args:
+        df: 历史数据（date, total, 各线路）
+        lines: 线路列表
+        out_dir: 输出目录，文件布局为 year=YYYY/part.parquet（或 part.arrow）
+        fmt: 'parquet' 或 'arrow'（Arrow IPC，可直接内存映射读取）
+        writer: 导出写入器，内容未变化的年份分区不会重写
+
+    Returns:
+        List[str]: 导出的分区文件路径
+    """
+    if not columnar_available():
+        print("⚠️ 未安装 pyarrow，跳过列式数据导出")
+        return []
+    if fmt not in ('parquet', 'arrow'):
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    if df.empty:
+        return []
+
+    writer = writer or AtomicExportWriter()
+    fmt_dir = os.path.join(out_dir, fmt)
+    years = pd.to_datetime(df['date']).dt.year
+    written = []
+    for year, group in df.groupby(years, sort=True):
+        table = to_arrow_table(group, lines)
+        sink = pa.BufferOutputStream()
+        if fmt == 'parquet':
+            path = os.path.join(fmt_dir, f'year={year}', 'part.parquet')
+            pq.write_table(table, sink, compression='zstd')
+        else:
+            path = os.path.join(fmt_dir, f'year={year}', 'part.arrow')
+            # 不压缩的IPC文件才能零拷贝内存映射
+            feather.write_feather(table, sink, compression='uncompressed')
+        writer.write_bytes(path, sink.getvalue().to_pybytes())
+        written.append(path)
+
+    # 清理已不存在的年份分区
+    expected = {f'year={year}' for year in years.unique()}
+    for part in os.listdir(fmt_dir):
+        if part.startswith('year=') and part not in expected:
+            shutil.rmtree(os.path.join(fmt_dir, part))
+    return written
+
+
+def read_history_columnar(out_dir: str = COLUMNAR_DIR, fmt: str = 'parquet',
+                          years: Optional[List[int]] = None) -> pd.DataFrame:
+    """
+    读取列式导出的历史数据
+
+    Args:
+        out_dir: 导出目录
+        fmt: 'parquet' 或 'arrow'
+        years: 只读取指定年份的分区，None 表示全部
+
+    Returns:
+        pd.DataFrame: 按日期升序的历史数据，date 为 YYYY-MM-DD 字符串
+    """
+    if not columnar_available():
+        raise ImportError("读取列式数据需要安装 pyarrow")
+
+    fmt_dir = os.path.join(out_dir, fmt)
+    if not os.path.isdir(fmt_dir):
+        return pd.DataFrame()
+
+    tables = []
+    for part in sorted(os.listdir(fmt_dir)):
+        if not part.startswith('year='):
+            continue
+        if years is not None and int(part[5:]) not in years:
+            continue
+        if fmt == 'parquet':
+            tables.append(pq.read_table(os.path.join(fmt_dir, part, 'part.parquet')))
+        else:
+            # 内存映射读取，表数据直接引用映射区域而不复制
+            source = pa.memory_map(os.path.join(fmt_dir, part, 'part.arrow'), 'r')
+            tables.append(pa.ipc.open_file(source).read_all())
+
+    if not tables:
+        return pd.DataFrame()
+    df = pa.concat_tables(tables).to_pandas()
+    df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+    return df.sort_values('date').reset_index(drop=True)
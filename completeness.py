@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import warnings
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from history_matrix import HistoryMatrix
+
+COMPLETENESS_FILE = 'docs/data/completeness.json'
+
+# 每个格子的来源（codes 矩阵中的取值）
+OBSERVED = 0
+SHARE = 1
+INTERPOLATE = 2
+WEEKDAY_MEDIAN = 3
+UNFILLED = -1   # 缺失且所有插补方式都不适用，仍为 NaN
+CLOSED = -2     # 线路未开通或尚无数据，不算缺失
+
+METHOD_CODES = {'share': SHARE, 'interpolate': INTERPOLATE, 'weekday_median': WEEKDAY_MEDIAN}
+METHOD_NAMES = {OBSERVED: 'observed', SHARE: 'share', INTERPOLATE: 'interpolate',
+                WEEKDAY_MEDIAN: 'weekday_median', UNFILLED: 'unfilled', CLOSED: 'closed'}
+
+
+def neighbours(valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    每个格子之前（含当天）和之后（含当天）最近的有效行号
+
+    Args:
+        valid: 天数 × 序列 布尔矩阵
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (前一个有效行，没有时为 -1；后一个有效行，没有时为天数)
+    """
+    n = len(valid)
+    rows = np.arange(n)[:, None]
+    prev = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    nxt = np.minimum.accumulate(np.where(valid, rows, n)[::-1], axis=0)[::-1]
+    return prev, nxt
+
+
+def interpolate_gaps(values: np.ndarray, max_gap: int) -> np.ndarray:
+    """
+    两端都有数据、连续缺失不超过 max_gap 天的空缺按日期线性插值（不外推）
+
+    Returns:
+        np.ndarray: 与 values 形状相同，只有可插值的缺失格子有值，其余为 NaN
+    """
+    n = len(values)
+    if not n:
+        return np.full(values.shape, np.nan)
+    valid = ~np.isnan(values)
+    prev, nxt = neighbours(valid)
+    inside = ~valid & (prev >= 0) & (nxt < n) & (nxt - prev - 1 <= max_gap)
+    cols = np.broadcast_to(np.arange(values.shape[1]), values.shape)
+    before = values[np.clip(prev, 0, n - 1), cols]
+    after = values[np.clip(nxt, 0, n - 1), cols]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = (np.arange(n)[:, None] - prev) / (nxt - prev)
+        return np.where(inside, before + (after - before) * frac, np.nan)
+
+
+def weekday_median(values: np.ndarray, weeks: int, min_samples: int) -> np.ndarray:
+    """
+    前后各 weeks 周同一星期几的中位数（只用有数据的天，样本不足 min_samples 时为 NaN）
+
+    (2 × weeks, 天数, 序列) 的位移矩阵由 weeks 次整块切片得到，中位数一次计算
+    """
+    n = len(values)
+    stack = np.full((2 * weeks,) + values.shape, np.nan)
+    for k in range(1, weeks + 1):
+        lag = 7 * k
+        if lag >= n:
+            break
+        stack[2 * k - 2, lag:] = values[:-lag]
+        stack[2 * k - 1, :-lag] = values[lag:]
+    samples = (~np.isnan(stack)).sum(axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(stack, axis=0) if n else np.full(values.shape, np.nan)
+    median[samples < max(min_samples, 1)] = np.nan
+    return median
+
+
+def rolling_share(lines: np.ndarray, total: np.ndarray, window: int) -> np.ndarray:
+    """
+    各线路占总客流比例的居中滚动均值（只用两者都有数据的天），窗口内没有数据时取最近的估计
+
+    Returns:
+        np.ndarray: 天数 × 线路，线路从未有数据时为 NaN
+    """
+    n = len(lines)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = lines / np.where(total > 0, total, np.nan)[:, None]
+    valid = ~np.isnan(ratio)
+    sums = np.zeros((n + 1, lines.shape[1]))
+    np.cumsum(np.where(valid, ratio, 0.0), axis=0, out=sums[1:])
+    counts = np.zeros((n + 1, lines.shape[1]))
+    np.cumsum(valid, axis=0, out=counts[1:])
+    half = window // 2
+    lo = np.clip(np.arange(n) - half, 0, n)
+    hi = np.clip(np.arange(n) + window - half, 0, n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = (sums[hi] - sums[lo]) / (counts[hi] - counts[lo])
+    # 窗口内没有数据的天先取之前、再取之后最近的估计
+    has = ~np.isnan(share)
+    prev, nxt = neighbours(has)
+    cols = np.broadcast_to(np.arange(share.shape[1]), share.shape)
+    nearest = np.where(prev >= 0, prev, np.clip(nxt, 0, max(n - 1, 0)))
+    return share[nearest, cols] if n else share
+
+
+class CompletedHistory:
+    """
+    补全后的历史数据：按完整日历排列的 日期 × (total + 各线路) 矩阵，以及每个格子的来源
+
+        values  补全后的数值（未开通和无法插补的格子为 NaN）
+        codes   来源编码：OBSERVED / SHARE / INTERPOLATE / WEEKDAY_MEDIAN / UNFILLED / CLOSED
+    """
+
+    def __init__(self, dates: np.ndarray, series: List[str], values: np.ndarray, codes: np.ndarray):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.series = list(series)
+        self.values = values
+        self.codes = codes
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def tail(self, n: int) -> 'CompletedHistory':
+        """最近 n 个自然日"""
+        n = max(n, 0)
+        return CompletedHistory(self.dates[len(self) - n:], self.series,
+                                self.values[len(self) - n:], self.codes[len(self) - n:])
+
+    @property
+    def imputed(self) -> np.ndarray:
+        """是否为插补值的布尔矩阵"""
+        return self.codes > OBSERVED
+
+    @property
+    def missing(self) -> np.ndarray:
+        """原始数据中缺失（应有数据而没有）的布尔矩阵"""
+        return (self.codes > OBSERVED) | (self.codes == UNFILLED)
+
+    @property
+    def gap_days(self) -> np.ndarray:
+        """整天没有数据的日期"""
+        if not len(self):
+            return self.dates
+        return self.dates[~(self.codes == OBSERVED).any(axis=1)]
+
+    def frame(self) -> pd.DataFrame:
+        """MetroHistoryStore 格式（date 升序, total, 各线路）的补全数据"""
+        df = pd.DataFrame(self.values, columns=self.series)
+        df.insert(0, 'date', np.datetime_as_string(self.dates, unit='D'))
+        return df
+
+    def mask(self) -> pd.DataFrame:
+        """与 frame() 对应的插补掩码（date 列之外为布尔值），图表据此区分插补点"""
+        df = pd.DataFrame(self.imputed, columns=self.series)
+        df.insert(0, 'date', np.datetime_as_string(self.dates, unit='D'))
+        return df
+
+    def gap_runs(self) -> List[Dict]:
+        """连续的整天空缺：[{'from', 'to', 'days'}]"""
+        days = self.gap_days
+        if not len(days):
+            return []
+        breaks = np.flatnonzero(np.diff(days).astype(int) != 1)
+        starts = np.concatenate([[0], breaks + 1])
+        ends = np.concatenate([breaks, [len(days) - 1]])
+        return [{'from': str(days[s]), 'to': str(days[e]), 'days': int(e - s + 1)} for s, e in zip(starts, ends)]
+
+    def to_json(self, export_days: int = 90) -> Dict:
+        """导出用的JSON结构：空缺统计、整天空缺区间、各序列按方式的插补数和最近 export_days 天的插补明细"""
+        if not len(self):
+            return {}
+        counts = {name: {METHOD_NAMES[code]: int(n) for code, n in
+                         zip(*np.unique(self.codes[:, j], return_counts=True)) if code not in (OBSERVED, CLOSED)}
+                  for j, name in enumerate(self.series)}
+        missing = self.missing
+        series = {}
+        for j, name in enumerate(self.series):
+            rows = np.flatnonzero(missing[:, j])
+            series[name] = {'missing': int(len(rows)), **counts[name],
+                            'last_missing': str(self.dates[rows[-1]]) if len(rows) else None}
+        methods = {name: int((self.codes == code).sum()) for name, code in METHOD_CODES.items()}
+        methods['unfilled'] = int((self.codes == UNFILLED).sum())
+
+        recent = self.tail(export_days)
+        details = {}
+        for i, j in zip(*np.nonzero(recent.missing)):
+            details.setdefault(str(recent.dates[i]), {})[self.series[j]] = METHOD_NAMES[int(recent.codes[i, j])]
+        return {
+            'start': str(self.dates[0]),
+            'end': str(self.dates[-1]),
+            'calendar_days': len(self),
+            'gap_days': int(len(self.gap_days)),
+            'gaps': self.gap_runs(),
+            'missing_cells': int(missing.sum()),
+            'methods': methods,
+            'series': series,
+            'recent': details,
+        }
+
+
+class GapFiller:
+    """
+    历史数据完整性检查与插补
+
+    历史数据按完整日历展开（漏掉的帖子成为整天空缺，某条线路未解析到成为单个空格），
+    线路开通之前、以及序列第一次有数据之前的格子不算缺失。先补总客流，再补各线路，
+    每个格子按 strategies 的顺序使用第一个适用的方式：
+
+        share           线路：总客流减去当天已知线路之和，按各线路近期占比分给缺失的线路；
+                        差额与按占比的估计相差超过 share_tolerance 时改为 占比 × 总客流。
+                        总客流：当天全部开通线路都有数据时取线路之和
+        weekday_median  前后各 weekday_weeks 周同一星期几的中位数（至少 min_weekday_samples 个样本）
+        interpolate     前后都有数据、连续缺失不超过 max_gap 天时按日期线性插值
+
+    默认顺序如上：客流的周周期明显，整天空缺的总客流用同星期几中位数比跨周末的线性插值准确得多
+
+    全部序列、全部日期一次向量化计算；估计值只用观测数据得出，插补值不作为其他插补的依据
+    （按占比拆分线路时使用补全后的总客流除外）
+    """
+
+    STRATEGIES = tuple(METHOD_CODES)
+
+    def __init__(self, strategies: Sequence[str] = ('share', 'weekday_median', 'interpolate'),
+                 max_gap: int = 7, weekday_weeks: int = 4, min_weekday_samples: int = 2,
+                 share_window: int = 28, share_tolerance: float = 0.5, export_days: int = 90):
+        unknown = [s for s in strategies if s not in METHOD_CODES]
+        if unknown:
+            raise ValueError(f"未知的插补方式: {', '.join(unknown)}，可选: {', '.join(self.STRATEGIES)}")
+        self.strategies = list(strategies)
+        self.max_gap = max_gap
+        self.weekday_weeks = weekday_weeks
+        self.min_weekday_samples = min_weekday_samples
+        self.share_window = share_window
+        self.share_tolerance = share_tolerance
+        self.export_days = export_days
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'GapFiller':
+        """从 config.json 的 analytics.completeness 段创建"""
+        params = config.get('analytics', {}).get('completeness', {})
+        keys = ('strategies', 'max_gap', 'weekday_weeks', 'min_weekday_samples', 'share_window',
+                'share_tolerance', 'export_days')
+        return cls(**{k: v for k, v in params.items() if k in keys})
+
+    @property
+    def context_days(self) -> int:
+        """补全最近 n 天时需要额外读取的之前天数（插值的端点、同星期几的样本、占比窗口）"""
+        return max(7 * self.weekday_weeks, self.share_window, self.max_gap + 1)
+
+    @staticmethod
+    def open_mask(dates: np.ndarray, lines: List[str], line_config=None) -> np.ndarray:
+        """日期 × (total + 各线路) 的已开通矩阵（不在配置中的线路视为一直开通）"""
+        mask = np.ones((len(dates), len(lines) + 1), dtype=bool)
+        if line_config is None or not len(dates):
+            return mask
+        matrix = line_config.matrices['open'][line_config.intervals(dates)]
+        for j, line in enumerate(lines):
+            if line in line_config.lines:
+                mask[:, j + 1] = matrix[:, line_config.lines.index(line)]
+        return mask
+
+    def fill(self, df: pd.DataFrame, lines: List[str], line_config=None) -> CompletedHistory:
+        """
+        补全历史数据
+
+        Args:
+            df: 历史数据（date 为 YYYY-MM-DD, total, 各线路），可以缺天
+            lines: 线路列表
+            line_config: VersionedLineConfig，用于排除未开通的线路
+
+        Returns:
+            CompletedHistory: 从第一天到最后一天的完整日历
+        """
+        series = ['total'] + list(lines)
+        start, values = HistoryMatrix.dense(df, series)
+        dates = start + np.arange(len(values)) if start is not None else np.array([], dtype='datetime64[D]')
+        return self.fill_matrix(dates, series, values, self.open_mask(dates, list(lines), line_config))
+
+    def fill_matrix(self, dates: np.ndarray, series: List[str], values: np.ndarray,
+                    open_mask: Optional[np.ndarray] = None) -> CompletedHistory:
+        """
+        补全按日期连续的 天数 × (total + 各线路) 矩阵（第0列为总客流）
+
+        Args:
+            open_mask: 与 values 形状相同的已开通矩阵，默认全部开通
+        """
+        values = np.asarray(values, dtype=float)
+        observed = ~np.isnan(values)
+        if open_mask is None:
+            open_mask = np.ones(values.shape, dtype=bool)
+        eligible = open_mask & np.maximum.accumulate(observed, axis=0)
+        codes = np.where(observed, OBSERVED, np.where(eligible, UNFILLED, CLOSED)).astype(np.int8)
+        filled = values.copy()
+        if not len(values):
+            return CompletedHistory(dates, series, filled, codes)
+
+        def apply(columns: slice, estimate: np.ndarray, code: int):
+            target = (codes[:, columns] == UNFILLED) & ~np.isnan(estimate)
+            filled[:, columns][target] = estimate[target]
+            codes[:, columns][target] = code
+
+        total, lines = slice(0, 1), slice(1, None)
+        for columns in (total, lines):
+            for strategy in self.strategies:
+                if not (codes[:, columns] == UNFILLED).any():
+                    break
+                if strategy == 'share':
+                    estimate = self._share(values, filled, codes, eligible, columns is total)
+                elif strategy == 'interpolate':
+                    estimate = interpolate_gaps(values[:, columns], self.max_gap)
+                else:
+                    estimate = weekday_median(values[:, columns], self.weekday_weeks, self.min_weekday_samples)
+                apply(columns, estimate, METHOD_CODES[strategy])
+        return CompletedHistory(dates, series, filled, codes)
+
+    def _share(self, values: np.ndarray, filled: np.ndarray, codes: np.ndarray, eligible: np.ndarray,
+               for_total: bool) -> np.ndarray:
+        """占比方式的估计值（for_total 时为 天数 × 1，否则为 天数 × 线路）"""
+        line_values, line_codes = values[:, 1:], codes[:, 1:]
+        if for_total:
+            # 当天全部开通线路都有数据时，总客流为线路之和
+            complete = ~(eligible[:, 1:] & (line_codes != OBSERVED)).any(axis=1) & (line_codes == OBSERVED).any(axis=1)
+            return np.where(complete, np.nansum(line_values, axis=1), np.nan)[:, None]
+
+        total = filled[:, 0]
+        share = rolling_share(line_values, values[:, 0], self.share_window)
+        missing = line_codes == UNFILLED
+        known = np.where(line_codes >= OBSERVED, filled[:, 1:], 0.0).sum(axis=1)
+        share_missing = np.where(missing, share, 0.0)
+        share_missing = np.where(np.isnan(share_missing), 0.0, share_missing).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            residual = total - known
+            ratio = residual / (total * share_missing)
+            by_residual = residual[:, None] * share / share_missing[:, None]
+        use_residual = np.abs(ratio - 1) <= self.share_tolerance
+        return np.where(use_residual[:, None], by_residual, share * total[:, None])
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from history_matrix import HistoryMatrix
+
+CORRELATION_FILE = 'docs/data/line_correlation.json'
+
+# 滚动相关矩阵的进程内缓存：(数据摘要, 变换, 窗口, 最少天数比例, 日期类型) → (天数, 序列, 序列) 数组，
+# 同一进程中导出和绘图共用，只保留最近几个
+_ROLLING_CACHE: Dict[tuple, np.ndarray] = {}
+_ROLLING_CACHE_SIZE = 8
+
+
+def rolling_corr(values: np.ndarray, window: int, min_periods: int) -> np.ndarray:
+    """
+    全部序列两两之间的滚动 Pearson 相关系数（按自然日窗口，成对剔除缺失值）
+
+    对每一对序列 (i, j) 只使用两者都有数据的天，窗口内的 Σx、Σx²、Σxy 和有效天数
+    由累计和相减得到，全部窗口、全部序列对一次计算，不逐窗口循环
+
+    Args:
+        values: 天数 × 序列 矩阵（按日期连续，缺失为 NaN）
+        window: 窗口天数
+        min_periods: 窗口内成对有效天数的下限，不足时为 NaN
+
+    Returns:
+        np.ndarray: (天数, 序列, 序列)，第 t 个矩阵为截至第 t 天的窗口
+    """
+    n, s = values.shape
+    mask = ~np.isnan(values)
+    # 按列中心化，减小累计和相减时的舍入误差
+    with np.errstate(invalid='ignore'):
+        center = np.where(mask.any(axis=0), np.nanmean(np.where(mask, values, np.nan), axis=0), 0.0)
+    x = np.where(mask, values - center, 0.0)
+    m = mask.astype(float)
+
+    def windowed(a: np.ndarray) -> np.ndarray:
+        # a: (天数, 序列, 序列)；返回截至每一天的窗口和（开头不足一个窗口时为已有天数的和）
+        cs = np.cumsum(a, axis=0)
+        out = cs.copy()
+        out[window:] -= cs[:-window]
+        return out
+
+    count = windowed(m[:, :, None] * m[:, None, :])
+    sx = windowed(x[:, :, None] * m[:, None, :])          # Σx_i（j 也有数据的天）
+    sxx = windowed((x * x)[:, :, None] * m[:, None, :])
+    sxy = windowed(x[:, :, None] * x[:, None, :])
+    sy, syy = sx.transpose(0, 2, 1), sxx.transpose(0, 2, 1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy - sx * sy / count
+        var_x = sxx - sx * sx / count
+        var_y = syy - sy * sy / count
+        corr = cov / np.sqrt(var_x * var_y)
+    # 方差接近0（如停运期间全为0）时相关系数无意义
+    scale = np.maximum(np.abs(sxx), np.abs(syy))
+    flat = (var_x <= 1e-12 * scale) | (var_y <= 1e-12 * scale)
+    corr[(count < max(min_periods, 2)) | flat] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def cluster_order(corr: np.ndarray) -> List[int]:
+    """
+    平均连接层次聚类的叶子顺序（距离为 1 - r，缺失视为不相关），用于热力图排序
+
+    序列只有十几条，直接维护距离矩阵逐步合并
+    """
+    n = len(corr)
+    if n <= 2:
+        return list(range(n))
+    dist = 1.0 - np.nan_to_num(np.asarray(corr, dtype=float), nan=0.0)
+    np.fill_diagonal(dist, np.inf)
+    members = {i: [i] for i in range(n)}
+    while len(members) > 1:
+        i, j = np.unravel_index(np.argmin(dist), dist.shape)
+        i, j = min(i, j), max(i, j)
+        ni, nj = len(members[i]), len(members[j])
+        merged = (ni * dist[i] + nj * dist[j]) / (ni + nj)
+        dist[i], dist[:, i] = merged, merged
+        dist[i, i] = np.inf
+        dist[j], dist[:, j] = np.inf, np.inf
+        members[i] = members[i] + members.pop(j)
+    return next(iter(members.values()))
+
+
+class LineCorrelation:
+    """
+    线路之间、线路与总客流之间的滚动相关性
+
+    历史数据展开为按日期连续的矩阵后，每个窗口的滚动相关矩阵由 rolling_corr 一次向量化计算，
+    按窗口缓存；transform 为 'log_diff' 时使用日环比（对数差分），排除共同的长期趋势
+    """
+
+    TRANSFORMS = ('level', 'log_diff')
+
+    def __init__(self, windows: Sequence[int] = (30, 90, 365), heatmap_window: int = 90,
+                 min_coverage: float = 0.8, transform: str = 'level', export_days: int = 90):
+        if transform not in self.TRANSFORMS:
+            raise ValueError(f"未知的变换: {transform}，可选: {', '.join(self.TRANSFORMS)}")
+        # 热力图使用的窗口总是包含在导出的窗口中
+        self.windows = sorted({int(w) for w in windows} | {int(heatmap_window)})
+        self.heatmap_window = int(heatmap_window)
+        self.min_coverage = min_coverage
+        self.transform = transform
+        self.export_days = export_days
+        self.series: List[str] = []
+        self.dates = np.array([], dtype='datetime64[D]')
+        self.values = np.empty((0, 0))
+        self.day_types: Optional[np.ndarray] = None
+        self._digest = ''
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'LineCorrelation':
+        """从 config.json 的 analytics.correlation 段创建"""
+        params = config.get('analytics', {}).get('correlation', {})
+        keys = ('windows', 'heatmap_window', 'min_coverage', 'transform', 'export_days')
+        return cls(**{k: v for k, v in params.items() if k in keys})
+
+    def fit(self, df: pd.DataFrame, series: List[str], calendar=None) -> 'LineCorrelation':
+        """
+        载入历史数据
+
+        Args:
+            df: 历史数据（date, total, 各线路）
+            series: 参与计算的列，如 ['total'] + 线路
+            calendar: HolidayCalendar，提供时可按日期类型（工作日/周末/节假日）分别计算
+        """
+        self.series = list(series)
+        start, matrix = HistoryMatrix.dense(df, self.series)
+        if start is None:
+            self.dates, self.values = np.array([], dtype='datetime64[D]'), matrix
+        else:
+            self.dates = start + np.arange(len(matrix))
+            self.values = self._transform(matrix)
+        self.day_types = calendar.day_types(pd.DatetimeIndex(self.dates)) if calendar is not None else None
+        digest = hashlib.sha1(self.transform.encode('utf-8'))
+        digest.update('|'.join(self.series).encode('utf-8'))
+        digest.update(str(self.dates[:1]).encode('utf-8'))
+        digest.update(np.ascontiguousarray(self.values).tobytes())
+        self._digest = digest.hexdigest()
+        return self
+
+    def _transform(self, matrix: np.ndarray) -> np.ndarray:
+        if self.transform == 'level':
+            return matrix
+        with np.errstate(invalid='ignore', divide='ignore'):
+            logs = np.log(np.where(matrix > 0, matrix, np.nan))
+        diff = np.full_like(logs, np.nan)
+        diff[1:] = logs[1:] - logs[:-1]
+        return diff
+
+    def min_periods(self, window: int) -> int:
+        return max(3, math.ceil(window * self.min_coverage))
+
+    def rolling(self, window: int, day_type: Optional[str] = None) -> np.ndarray:
+        """
+        某个窗口的滚动相关矩阵（按窗口缓存）
+
+        Args:
+            window: 窗口天数
+            day_type: 只使用某类日期（工作日/周末/节假日），窗口内有效天数下限按该类日期的占比折算
+
+        Returns:
+            np.ndarray: (天数, 序列, 序列)
+        """
+        key = (self._digest, window, self.min_coverage, day_type)
+        if key not in _ROLLING_CACHE:
+            values, min_periods = self.values, self.min_periods(window)
+            if day_type is not None:
+                if self.day_types is None:
+                    raise ValueError("按日期类型计算需要在 fit 时提供节假日日历")
+                selected = self.day_types == day_type
+                values = np.where(selected[:, None], values, np.nan)
+                share = selected[-window:].mean() if selected.size else 0.0
+                min_periods = max(3, math.ceil(window * share * self.min_coverage))
+            _ROLLING_CACHE[key] = rolling_corr(values, window, min_periods)
+            while len(_ROLLING_CACHE) > _ROLLING_CACHE_SIZE:
+                del _ROLLING_CACHE[next(iter(_ROLLING_CACHE))]
+        return _ROLLING_CACHE[key]
+
+    def latest(self, window: int, day_type: Optional[str] = None) -> pd.DataFrame:
+        """最后一天的 序列 × 序列 相关矩阵"""
+        if not len(self.dates):
+            return pd.DataFrame(index=self.series, columns=self.series, dtype=float)
+        return pd.DataFrame(self.rolling(window, day_type)[-1], index=self.series, columns=self.series)
+
+    def vs_total(self, window: int) -> pd.DataFrame:
+        """各线路与总客流的滚动相关系数（天数 × 线路）"""
+        if 'total' not in self.series:
+            raise ValueError("series 中没有 total")
+        k = self.series.index('total')
+        lines = [s for s in self.series if s != 'total']
+        corr = self.rolling(window)[:, k, :] if len(self.dates) else np.empty((0, len(self.series)))
+        frame = pd.DataFrame(corr, index=pd.DatetimeIndex(self.dates), columns=self.series)
+        return frame[lines]
+
+    def clustered(self, window: Optional[int] = None) -> pd.DataFrame:
+        """
+        按层次聚类重新排列的最新相关矩阵（去掉全部缺失的序列），用于热力图
+
+        Returns:
+            pd.DataFrame: 行列顺序相同的相关矩阵
+        """
+        corr = self.latest(window or self.heatmap_window)
+        off_diag = corr.where(~np.eye(len(corr), dtype=bool))
+        keep = off_diag.notna().any(axis=1)
+        corr = corr.loc[keep, keep]
+        order = [corr.index[i] for i in cluster_order(corr.to_numpy())]
+        return corr.loc[order, order]
+
+    @staticmethod
+    def pairs(corr: pd.DataFrame, top: int = 5, exclude: Tuple[str, ...] = ('total',)) -> Dict[str, List[Dict]]:
+        """相关性最强和最弱的线路对"""
+        labels = [s for s in corr.index if s not in exclude]
+        sub = corr.loc[labels, labels].to_numpy()
+        i, j = np.triu_indices(len(labels), k=1)
+        r = sub[i, j]
+        valid = ~np.isnan(r)
+        i, j, r = i[valid], j[valid], r[valid]
+        order = np.argsort(-r, kind='stable')
+
+        def items(idx):
+            return [{'a': labels[i[k]], 'b': labels[j[k]], 'r': round(float(r[k]), 3)} for k in idx]
+
+        return {'strongest': items(order[:top]), 'weakest': items(order[::-1][:top])}
+
+    def to_json(self) -> Dict:
+        """导出用的JSON结构：各窗口最新相关矩阵、线路与总客流的相关及其近期走势"""
+
+        def clean(values):
+            return [None if v != v else round(float(v), 3) for v in values]
+
+        windows = {}
+        for window in self.windows:
+            corr = self.latest(window)
+            entry = {
+                'min_periods': self.min_periods(window),
+                'matrix': [clean(row) for row in corr.to_numpy()],
+                **self.pairs(corr),
+            }
+            if 'total' in self.series:
+                entry['vs_total'] = dict(zip(corr.index, clean(corr['total'])))
+                entry['vs_total'].pop('total')
+            windows[str(window)] = entry
+
+        result = {
+            'date': str(self.dates[-1]) if len(self.dates) else None,
+            'transform': self.transform,
+            'series': self.series,
+            'order': list(self.clustered().index) if len(self.dates) else [],
+            'windows': windows,
+        }
+        if self.day_types is not None and len(self.dates):
+            result['by_day_type'] = {
+                'window': self.windows[-1],
+                'matrices': {str(day_type): [clean(row) for row in self.latest(self.windows[-1], day_type).to_numpy()]
+                             for day_type in np.unique(self.day_types[-self.windows[-1]:])},
+            }
+        if 'total' in self.series and len(self.dates):
+            recent = self.vs_total(self.heatmap_window).tail(self.export_days)
+            result['vs_total_history'] = {
+                'window': self.heatmap_window,
+                'dates': [d.strftime('%Y-%m-%d') for d in recent.index],
+                'series': {line: clean(recent[line]) for line in recent.columns},
+            }
+        return result
+
+
+def pandas_rolling_corr(df: pd.DataFrame, series: List[str], window: int, min_periods: int) -> np.ndarray:
+    """用 pandas rolling().corr() 逐日计算最后一天的相关矩阵，用于校验 rolling_corr"""
+    start, matrix = HistoryMatrix.dense(df, series)
+    frame = pd.DataFrame(matrix, columns=series)
+    return frame.rolling(window, min_periods=min_periods).corr().to_numpy().reshape(len(frame), len(series), -1)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+常驻服务模式：只导入和配置字体一次，按计划轮询数据源，只重跑输入有变化的阶段
+
+用法:
+    python daemon.py                  # 按 config.json 的 daemon 段运行
+    python daemon.py --interval 600   # 覆盖轮询间隔（秒）
+    python daemon.py --cycles 3       # 运行3轮后退出（用于测量）
+
+健康检查:
+    GET http://127.0.0.1:8765/health    状态、最近成功时间、连续失败次数
+    GET http://127.0.0.1:8765/metrics   各阶段运行/跳过次数和耗时
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import signal
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+import main as pipeline
+from export_writer import AtomicExportWriter, WriterLock
+from generate_report import generate_html_report
+from metro_data import NanjingSubwayDataCollector
+
+logger = logging.getLogger(__name__)
+
+# 各阶段依赖的输入：records 为本轮采集到的记录，history 为合并后的历史数据
+STAGE_INPUTS = {
+    'history': ('records',),
+    'charts': ('records', 'history'),
+    'export': ('records', 'history'),
+    'analytics': ('history',),
+    'report': ('records', 'history'),
+}
+
+
+def records_digest(records: List[Dict]) -> str:
+    """采集记录内容的摘要（只取日期和客流数据）"""
+    payload = [(r.get('full_date') or r.get('date'), r['passenger_data']) for r in records]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """DataFrame 内容的摘要（列名 + 逐行哈希）"""
+    digest = hashlib.sha256('|'.join(map(str, df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class MetroDaemon:
+    """
+    常驻轮询服务
+
+    每轮采集后计算各阶段输入的摘要，与上次运行该阶段时的摘要相同则跳过；
+    成功后按 interval ± jitter 等待，失败后按指数退避（backoff_initial × 2^n，不超过 backoff_max）
+    """
+
+    def __init__(self, config_file: str = 'config.json', interval: float = 3600, jitter: float = 0.1,
+                 backoff_initial: float = 60, backoff_max: float = 1800,
+                 host: str = '127.0.0.1', port: int = 8765, report: bool = True):
+        self.config_file = config_file
+        self.interval = interval
+        self.jitter = jitter
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.host = host
+        self.port = port
+        self.report = report
+
+        # 常驻进程只需导入一次 matplotlib 并配置一次字体
+        pipeline.setup_plotting()
+        self.collector = NanjingSubwayDataCollector(config_file)
+        self.store = None
+        self.stage_digests: Dict[str, str] = {}
+        self.stop_event = threading.Event()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+        self.started = datetime.now()
+        self.cycles = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_success: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.next_poll: Optional[datetime] = None
+        self.cycle_seconds: List[float] = []
+        self.stage_stats = {stage: {'runs': 0, 'skips': 0, 'last_seconds': None} for stage in STAGE_INPUTS}
+
+    @classmethod
+    def from_config(cls, config_file: str = 'config.json', **overrides) -> 'MetroDaemon':
+        """从 config.json 的 daemon 段创建，overrides 中非 None 的值优先"""
+        with open(config_file, 'r', encoding='utf-8') as f:
+            params = json.load(f).get('daemon', {})
+        keys = ('interval', 'jitter', 'backoff_initial', 'backoff_max', 'host', 'port', 'report')
+        params = {k: v for k, v in params.items() if k in keys}
+        params.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(config_file, **params)
+
+    def _run_stage(self, name: str, inputs: Dict[str, str], func) -> bool:
+        """输入摘要变化时运行阶段，返回是否运行"""
+        digest = '|'.join(inputs[key] for key in STAGE_INPUTS[name])
+        stats = self.stage_stats[name]
+        if self.stage_digests.get(name) == digest:
+            stats['skips'] += 1
+            return False
+        start = time.perf_counter()
+        func()
+        stats['last_seconds'] = round(time.perf_counter() - start, 3)
+        stats['runs'] += 1
+        # 运行成功后才记录摘要，失败的阶段下一轮会重试
+        self.stage_digests[name] = digest
+        return True
+
+    def run_cycle(self) -> List[str]:
+        """
+        执行一轮：采集 → 校验 → 只重跑输入变化的阶段
+
+        Returns:
+            List[str]: 本轮实际运行的阶段
+        """
+        collector = self.collector
+        # 与定时任务、手动运行等其他写入进程互斥；等待期间其他进程写入的历史数据和归档在加锁后重新加载
+        with WriterLock.from_config(collector.config):
+            if self.store is not None and self.store.refresh():
+                collector.open_history_matrix()
+            if collector.archive is not None:
+                collector.archive.load_index()
+            records = collector.collect_data()
+            writer = AtomicExportWriter()
+            pipeline.save_archive(collector, writer)
+            pipeline.write_parse_quality(collector, writer)
+            if not records:
+                logger.warning("本轮没有收集到数据")
+                return []
+
+            inputs = {'records': records_digest(records)}
+            ran = []
+
+            def update_history():
+                self.store = pipeline.update_history(collector, writer, self.store)
+
+            if self._run_stage('history', inputs, update_history):
+                ran.append('history')
+            inputs['history'] = frame_digest(self.store.df)
+
+            # 预测只在需要它的阶段第一次运行时拟合，图表和分析导出共用
+            fitted = {}
+
+            def forecast():
+                if 'result' not in fitted:
+                    fitted['result'] = pipeline.fit_forecast(collector.config, self.store)
+                return fitted['result']
+
+            def charts():
+                visualizer = pipeline.NanjingSubwayVisualizer(collector)
+                pipeline.render_charts(visualizer, store=self.store, fitted=forecast())
+
+            stages = [
+                ('charts', charts),
+                ('export', lambda: pipeline.export_latest(collector, self.store, writer)),
+                ('analytics', lambda: pipeline.run_analytics(collector, self.store, writer, forecast())),
+            ]
+            if self.report:
+                stages.append(('report', generate_html_report))
+            for name, func in stages:
+                if self._run_stage(name, inputs, func):
+                    ran.append(name)
+
+            writer.log_summary()
+            return ran
+
+    def next_delay(self) -> float:
+        """下一次轮询前的等待秒数"""
+        if self.consecutive_failures:
+            delay = min(self.backoff_initial * 2 ** (self.consecutive_failures - 1), self.backoff_max)
+        else:
+            delay = self.interval
+        return max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def run(self, max_cycles: Optional[int] = None):
+        """循环运行直到收到停止信号（或达到 max_cycles 轮）"""
+        self.start_server()
+        try:
+            while not self.stop_event.is_set():
+                start = time.perf_counter()
+                try:
+                    ran = self.run_cycle()
+                    self.consecutive_failures = 0
+                    self.last_success = datetime.now()
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"第 {self.cycles + 1} 轮完成，耗时 {elapsed:.2f}s，"
+                                f"运行阶段: {', '.join(ran) if ran else '无（输入未变化）'}")
+                except Exception as e:
+                    self.failures += 1
+                    self.consecutive_failures += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    elapsed = time.perf_counter() - start
+                    logger.error(f"第 {self.cycles + 1} 轮失败: {e}", exc_info=True)
+                self.cycles += 1
+                self.cycle_seconds.append(round(elapsed, 3))
+                del self.cycle_seconds[:-100]
+
+                if max_cycles and self.cycles >= max_cycles:
+                    break
+                delay = self.next_delay()
+                self.next_poll = datetime.fromtimestamp(time.time() + delay)
+                logger.info(f"下一次轮询: {self.next_poll:%Y-%m-%d %H:%M:%S}")
+                self.stop_event.wait(delay)
+        finally:
+            self.stop_server()
+
+    def stop(self, *_):
+        """停止服务（可作为信号处理函数）"""
+        self.stop_event.set()
+
+    def health(self) -> Dict:
+        """健康状态"""
+        healthy = self.consecutive_failures < 3
+        return {
+            'status': 'ok' if healthy else 'degraded',
+            'started': self.started.isoformat(timespec='seconds'),
+            'cycles': self.cycles,
+            'last_success': self.last_success.isoformat(timespec='seconds') if self.last_success else None,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'next_poll': self.next_poll.isoformat(timespec='seconds') if self.next_poll else None,
+        }
+
+    def metrics(self) -> Dict:
+        """运行指标：每轮耗时（第一轮为冷启动）和各阶段运行/跳过次数"""
+        warm = self.cycle_seconds[1:]
+        return {
+            'cycles': self.cycles,
+            'failures': self.failures,
+            'first_cycle_seconds': self.cycle_seconds[0] if self.cycle_seconds else None,
+            'last_cycle_seconds': self.cycle_seconds[-1] if self.cycle_seconds else None,
+            'warm_cycle_mean_seconds': round(sum(warm) / len(warm), 3) if warm else None,
+            'stages': self.stage_stats,
+            'collect': self.collector.collect_stats,
+            'history_days': len(self.store.df) if self.store is not None else 0,
+        }
+
+    def start_server(self):
+        """在后台线程中启动健康检查服务（port 为 0 时不启动）"""
+        if not self.port:
+            return
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                routes = {'/health': daemon.health, '/metrics': daemon.metrics}
+                path = self.path.split('?')[0]
+                if path not in routes:
+                    self.send_error(404)
+                    return
+                payload = routes[path]()
+                status = 503 if path == '/health' and payload['status'] != 'ok' else 200
+                body = json.dumps(payload, ensure_ascii=False, indent=2).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"健康检查服务: http://{self.host}:{self.server.server_port}/health")
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='南京地铁客流分析常驻服务')
+    parser.add_argument('--config', default='config.json', help='配置文件')
+    parser.add_argument('--interval', type=float, help='轮询间隔（秒）')
+    parser.add_argument('--port', type=int, help='健康检查端口（0 表示不启动）')
+    parser.add_argument('--cycles', type=int, help='运行指定轮数后退出')
+    parser.add_argument('--no-report', dest='report', action='store_false', default=None,
+                        help='不生成HTML报告')
+    args = parser.parse_args()
+
+    daemon = MetroDaemon.from_config(args.config, interval=args.interval, port=args.port, report=args.report)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run(max_cycles=args.cycles)
+    print(json.dumps(daemon.metrics(), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
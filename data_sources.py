@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+客流数据源
+
+所有数据源按页返回微博格式的帖子字典（至少包含 text_raw、created_at，可选 id），
+解析、存储、图表和报告不关心数据来自哪里。通过 config.json 的 data_source.type 选择：
+
+    weibo   微博 searchProfile 接口（默认）
+    local   本地 JSONL / CSV 文件（历史导入、离线重跑）
+    fake    内存中的帖子（测试和基准测试）
+"""
+
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+WEIBO_SEARCH_URL = "https://weibo.com/ajax/statuses/searchProfile?"
+# Cookie 从环境变量读取，不写在代码中
+WEIBO_COOKIE_ENV = "WEIBO_COOKIE"
+
+
+class DataSource:
+    """数据源基类：按页获取帖子"""
+
+    name = "base"
+
+    def __init__(self, max_pages: int = 10):
+        self.max_pages = max_pages
+
+    @classmethod
+    def from_config(cls, source_config: Dict) -> 'DataSource':
+        """从 config.json 的 data_source 段创建"""
+        return cls(max_pages=source_config.get("max_pages", 10))
+
+    def page_numbers(self) -> range:
+        """需要获取的页码"""
+        return range(1, self.max_pages)
+
+    def fetch_page(self, page: int) -> Optional[List[Dict]]:
+        """
+        获取一页帖子
+
+        Args:
+            page: 页码（从1开始）
+
+        Returns:
+            Optional[List[Dict]]: 帖子列表；返回 None 表示没有更多数据
+        """
+        raise NotImplementedError
+
+    def iter_posts(self) -> Iterator[Dict]:
+        """逐条产出全部帖子（出错的页会抛出异常）"""
+        for page in self.page_numbers():
+            posts = self.fetch_page(page)
+            if posts is None:
+                break
+            yield from posts
+
+
+class WeiboSource(DataSource):
+    """微博用户主页搜索接口"""
+
+    name = "weibo"
+
+    def __init__(self, user_id: str, keyword: str, max_pages: int = 10,
+                 cookie: Optional[str] = None, timeout: float = 15.0):
+        super().__init__(max_pages)
+        self.user_id = user_id
+        self.keyword = keyword
+        self.cookie = cookie if cookie is not None else os.environ.get(WEIBO_COOKIE_ENV, "")
+        self.timeout = timeout
+        # requests 只在使用微博数据源时导入
+        import requests
+        self.session = requests.Session()
+
+    @classmethod
+    def from_config(cls, source_config: Dict) -> 'WeiboSource':
+        return cls(
+            user_id=source_config["weibo_user_id"],
+            keyword=source_config["search_keyword"],
+            max_pages=source_config.get("max_pages", 10),
+            cookie=source_config.get("cookie"),
+            timeout=source_config.get("timeout", 15.0),
+        )
+
+    def headers(self) -> Dict[str, str]:
+        """请求头（Cookie 为空时不发送）"""
+        headers = {
+            "Accept": "application/json, text/plain, */*",
+            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
+            "Client-Version": "v2.47.142",
+            "Referer": f"https://weibo.com/u/{self.user_id}?tabtype=feed",
+            "Sec-Fetch-Dest": "empty",
+            "Sec-Fetch-Mode": "cors",
+            "Sec-Fetch-Site": "same-origin",
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36 Edg/143.0.0.0",
+            "X-Requested-With": "XMLHttpRequest",
+        }
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+            # XSRF-TOKEN 同时需要放在请求头中
+            for part in self.cookie.split(";"):
+                key, _, value = part.strip().partition("=")
+                if key == "XSRF-TOKEN":
+                    headers["x-xsrf-token"] = value
+        return headers
+
+    def search(self, page: int) -> dict:
+        """
+        搜索微博数据
+
+        Args:
+            page: 页码
+
+        Returns:
+            dict: 返回的JSON数据
+        """
+        params = {"uid": self.user_id, "page": page, "q": self.keyword}
+        response = self.session.get(WEIBO_SEARCH_URL, headers=self.headers(), params=params, timeout=self.timeout)
+        return response.json()
+
+    def fetch_page(self, page: int) -> Optional[List[Dict]]:
+        response = self.search(page)
+        if 'data' not in response or 'list' not in response['data']:
+            raise ValueError(f"响应中没有 data.list: {str(response)[:100]}")
+        return response['data']['list']
+
+
+class LocalFileSource(DataSource):
+    """
+    本地文件数据源
+
+    JSONL: 每行一个帖子对象，字段 text_raw（或 text）、created_at、id
+    CSV:   列 text_raw（或 text）、created_at、id
+    每 page_size 条作为一页，文件读完即结束
+    """
+
+    name = "local"
+
+    def __init__(self, path: str, page_size: int = 100, max_pages: Optional[int] = None):
+        super().__init__(max_pages or 0)
+        self.path = path
+        self.page_size = page_size
+        self._posts: Optional[List[Dict]] = None
+        self._mtime: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, source_config: Dict) -> 'LocalFileSource':
+        return cls(source_config["path"], source_config.get("page_size", 100),
+                   source_config.get("max_pages"))
+
+    @staticmethod
+    def normalize(post: Dict) -> Dict:
+        """统一为微博帖子的字段名"""
+        post = dict(post)
+        if "text_raw" not in post:
+            post["text_raw"] = post.pop("text", "") or ""
+        post.setdefault("created_at", "")
+        return post
+
+    def load(self) -> List[Dict]:
+        """读取全部帖子（文件未修改时复用上次读取的结果）"""
+        mtime = os.path.getmtime(self.path)
+        if self._posts is None or mtime != self._mtime:
+            if self.path.endswith(".csv"):
+                with open(self.path, "r", encoding="utf-8-sig", newline="") as f:
+                    posts = list(csv.DictReader(f))
+            else:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    posts = [json.loads(line) for line in f if line.strip()]
+            self._posts = [self.normalize(post) for post in posts]
+            self._mtime = mtime
+        return self._posts
+
+    def page_numbers(self) -> range:
+        n_pages = -(-len(self.load()) // self.page_size)
+        if self.max_pages:
+            n_pages = min(n_pages, self.max_pages)
+        return range(1, n_pages + 1)
+
+    def fetch_page(self, page: int) -> Optional[List[Dict]]:
+        posts = self.load()
+        start = (page - 1) * self.page_size
+        return posts[start:start + self.page_size] if start < len(posts) else None
+
+
+class FakeDataSource(DataSource):
+    """内存数据源，用于测试和基准测试；fail_pages 中的页码会抛出异常"""
+
+    name = "fake"
+
+    def __init__(self, posts: Optional[List[Dict]] = None, page_size: int = 20,
+                 fail_pages=(), latency: float = 0.0):
+        super().__init__(0)
+        self.posts = [LocalFileSource.normalize(post) for post in posts or []]
+        self.page_size = page_size
+        self.fail_pages = set(fail_pages)
+        # 每页模拟的网络延迟（秒）
+        self.latency = latency
+
+    @classmethod
+    def from_config(cls, source_config: Dict) -> 'FakeDataSource':
+        return cls(source_config.get("posts", []), source_config.get("page_size", 20),
+                   latency=source_config.get("latency", 0.0))
+
+    @classmethod
+    def from_history(cls, df, lines: List[str], system_name: str = "南京地铁", **kwargs) -> 'FakeDataSource':
+        """
+        由历史数据（date, total, 各线路）生成微博原文格式的帖子，最新日期在前
+
+        Args:
+            df: 历史数据
+            lines: 线路名列表
+            system_name: 帖子中的线网名称
+        """
+        posts = []
+        for row in reversed(df.to_dict("records")):
+            day = datetime.strptime(row["date"], "%Y-%m-%d")
+            text = (f"#{system_name}昨日客流# {day.month}月{day.day}日，{system_name}线网客运量{row['total']}万乘次，其中"
+                    + "，".join(f"{line}{row[line]}万" for line in lines if row.get(line) == row.get(line)))
+            posts.append({"id": f"fake-{row['date']}", "text_raw": text,
+                          "created_at": f"{day:%a %b %d} 08:00:00 +0800 {day.year}"})
+        return cls(posts, **kwargs)
+
+    def page_numbers(self) -> range:
+        return range(1, -(-len(self.posts) // self.page_size) + 1)
+
+    def fetch_page(self, page: int) -> Optional[List[Dict]]:
+        if self.latency:
+            time.sleep(self.latency)
+        if page in self.fail_pages:
+            raise ConnectionError(f"模拟第 {page} 页请求失败")
+        start = (page - 1) * self.page_size
+        return self.posts[start:start + self.page_size] if start < len(self.posts) else None
+
+
+SOURCE_TYPES = {
+    WeiboSource.name: WeiboSource,
+    LocalFileSource.name: LocalFileSource,
+    FakeDataSource.name: FakeDataSource,
+}
+
+
+def create_source(config: Dict) -> DataSource:
+    """
+    根据 config.json 的 data_source.type 创建数据源（默认 weibo）
+
+    Raises:
+        ValueError: 未知的数据源类型
+    """
+    source_config = config.get("data_source", {})
+    source_type = source_config.get("type", WeiboSource.name)
+    if source_type not in SOURCE_TYPES:
+        raise ValueError(f"未知的数据源类型: {source_type}，可选: {', '.join(SOURCE_TYPES)}")
+    return SOURCE_TYPES[source_type].from_config(source_config)
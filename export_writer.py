@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+WRITER_LOCK_FILE = 'docs/data/.writer.lock'
+
+# 本进程已持有的写入锁（绝对路径 → 嵌套层数），同一进程内重复加锁不会等待自己
+_held_locks: Dict[str, int] = {}
+
+
+def flock_file(f, shared: bool = False):
+    """
+    对已打开的文件加 flock，关闭文件时自动释放（Windows 上不加锁）
+
+    原地追加的文件（history.csv）追加时加排他锁，读取方读取整个文件时加共享锁，
+    不会读到只写入了一部分的新增行；写入时间很短，直接阻塞等待
+    """
+    if sys.platform != 'win32':
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+
+class LockTimeout(TimeoutError):
+    """等待写入锁超时（另一个写入方运行时间过长或卡住）"""
+
+
+class WriterLock:
+    """
+    数据目录的写入锁：同一时间只有一个进程写入（定时任务、手动运行、daemon 可能重叠）
+
+    读取方不加锁：重写的文件经临时文件 + os.replace 原子替换，追加写入的文件由读取方只读取
+    完整的行或索引记录的有效长度，任何时刻读到的都是某次完整写入后的状态。
+
+    用 fcntl.flock（Windows 上为 msvcrt.locking）加锁，持有锁的进程退出（包括崩溃）时由操作系统释放，
+    不会残留；锁文件中记录持有者的 pid 和开始时间，超时时报告。等待时按 poll 秒重试、间隔每次翻倍
+    （不超过 max_poll 秒），超过 timeout 秒抛出 LockTimeout
+    """
+
+    def __init__(self, path: str = WRITER_LOCK_FILE, timeout: float = 600.0, poll: float = 0.05,
+                 max_poll: float = 0.5):
+        self.path = path
+        self.timeout = timeout
+        self.poll = poll
+        self.max_poll = max_poll
+        self.waited = 0.0
+        self.attempts = 0
+        self._fd = None
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'WriterLock':
+        """从 config.json 的 storage 段创建"""
+        params = config.get('storage', {})
+        return cls(params.get('lock_file', WRITER_LOCK_FILE), params.get('lock_timeout', 600.0),
+                   params.get('lock_poll', 0.05), params.get('lock_max_poll', 0.5))
+
+    @staticmethod
+    def _try_lock(fd: int) -> bool:
+        try:
+            if sys.platform == 'win32':
+                import msvcrt
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    @staticmethod
+    def _unlock(fd: int):
+        if sys.platform == 'win32':
+            import msvcrt
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def holder(self) -> str:
+        """锁文件中记录的持有者（可能是已释放锁的上一个持有者）"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except OSError:
+            return ''
+
+    def acquire(self) -> float:
+        """
+        获取写入锁，等待超时时抛出 LockTimeout
+
+        Returns:
+            float: 等待的秒数
+        """
+        key = os.path.abspath(self.path)
+        if _held_locks.get(key):
+            _held_locks[key] += 1
+            return 0.0
+
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        fd = os.open(key, os.O_RDWR | os.O_CREAT, 0o644)
+        start = time.monotonic()
+        delay = self.poll
+        self.attempts = 0
+        try:
+            while True:
+                self.attempts += 1
+                if self._try_lock(fd):
+                    break
+                elapsed = time.monotonic() - start
+                if elapsed >= self.timeout:
+                    raise LockTimeout(f"等待写入锁 {self.path} 超过 {self.timeout:.0f} 秒"
+                                      f"（持有者: {self.holder() or '未知'}）")
+                time.sleep(min(delay, self.timeout - elapsed))
+                delay = min(delay * 2, self.max_poll)
+        except BaseException:
+            os.close(fd)
+            raise
+
+        info = f"pid={os.getpid()} since={datetime.now().isoformat(timespec='seconds')} cmd={' '.join(sys.argv)}\n"
+        data = info.encode('utf-8')
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, data)
+        os.ftruncate(fd, len(data))
+        self._fd = fd
+        _held_locks[key] = 1
+        self.waited = time.monotonic() - start
+        return self.waited
+
+    def release(self):
+        key = os.path.abspath(self.path)
+        if _held_locks.get(key, 0) > 1:
+            _held_locks[key] -= 1
+            return
+        if self._fd is None:
+            return
+        _held_locks.pop(key, None)
+        try:
+            self._unlock(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> 'WriterLock':
+        waited = self.acquire()
+        if waited >= 1:
+            logger.info(f"等待写入锁 {waited:.1f}s（重试 {self.attempts - 1} 次）")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class AtomicExportWriter:
+    """导出文件写入器：临时文件 + 原子重命名，内容未变化时跳过写入，并统计写入字节数"""
+
+    def __init__(self):
+        self.bytes_written = 0
+        self.files_written = []
+        self.files_skipped = []
+        self.files_appended = []
+
+    @staticmethod
+    def file_digest(path: str) -> Optional[str]:
+        """计算已有文件的SHA-256，文件不存在时返回None"""
+        if not os.path.exists(path):
+            return None
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def write_bytes(self, path: str, data: bytes) -> bool:
+        """
+        原子写入文件内容
+
+        Args:
+            path: 目标文件路径
+            data: 文件内容
+
+        Returns:
+            bool: 是否实际写入（内容未变化时返回False）
+        """
+        if self.file_digest(path) == hashlib.sha256(data).hexdigest():
+            self.files_skipped.append(path)
+            return False
+
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # 临时文件必须与目标在同一目录（同一文件系统），os.replace 才是原子操作
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp 创建的文件权限为0600，恢复为普通文件权限
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.bytes_written += len(data)
+        self.files_written.append(path)
+        return True
+
+    def write_text(self, path: str, text: str, encoding: str = 'utf-8') -> bool:
+        """原子写入文本文件"""
+        return self.write_bytes(path, text.encode(encoding))
+
+    def write_json(self, path: str, obj, volatile_keys: tuple = (), **kwargs) -> bool:
+        """
+        原子写入JSON文件
+
+        Args:
+            path: 目标文件路径
+            obj: 待写入的对象
+            volatile_keys: 比较内容时忽略的顶层键（如更新时间），其余内容未变化时跳过写入
+            **kwargs: 传给 json.dumps 的参数
+        """
+        kwargs.setdefault('ensure_ascii', False)
+        if volatile_keys and isinstance(obj, dict) and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    existing = json.load(f)
+            except (OSError, ValueError):
+                existing = None
+            if isinstance(existing, dict):
+                strip = lambda d: {k: v for k, v in d.items() if k not in volatile_keys}
+                if strip(existing) == json.loads(json.dumps(strip(obj))):
+                    self.files_skipped.append(path)
+                    return False
+        return self.write_text(path, json.dumps(obj, **kwargs))
+
+    def write_csv(self, path: str, df: 'pd.DataFrame', encoding: str = 'utf-8') -> bool:
+        """原子写入CSV文件"""
+        return self.write_bytes(path, df.to_csv(index=False).encode(encoding))
+
+    def append_csv(self, path: str, df: 'pd.DataFrame', encoding: str = 'utf-8') -> bool:
+        """
+        向已有CSV追加新行（不重写已有内容）
+
+        Args:
+            path: 目标文件路径，必须已存在且表头与df列一致
+            df: 待追加的行
+            encoding: 文件编码
+
+        Returns:
+            bool: 是否实际写入
+        """
+        if df.empty:
+            self.files_skipped.append(path)
+            return False
+
+        data = df.to_csv(index=False, header=False).encode(encoding)
+        with open(path, 'rb+') as f:
+            flock_file(f)
+            # 上次追加中途崩溃会留下不完整的末行，先截断到最后一个换行符
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(max(0, size - 4096))
+                tail = f.read()
+                if not tail.endswith(b'\n'):
+                    cut = tail.rfind(b'\n')
+                    if cut < 0:
+                        raise ValueError(f"{path} 末尾损坏，无法追加")
+                    f.truncate(size - len(tail) + cut + 1)
+            f.seek(0, os.SEEK_END)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.bytes_written += len(data)
+        self.files_appended.append(path)
+        return True
+
+    def append_bytes(self, path: str, data: bytes, offset: int) -> bool:
+        """
+        从 offset 处写入数据（之后的内容被截断），用于定长记录的二进制文件追加
+
+        Args:
+            path: 目标文件路径，必须已存在且长度不小于 offset
+            data: 待追加的内容
+            offset: 已有有效内容的字节数（上次追加中途崩溃时多出的部分会被丢弃）
+
+        Returns:
+            bool: 是否实际写入
+        """
+        if not data:
+            self.files_skipped.append(path)
+            return False
+
+        with open(path, 'rb+') as f:
+            if f.seek(0, os.SEEK_END) < offset:
+                raise ValueError(f"{path} 长度小于 {offset} 字节，无法追加")
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.bytes_written += len(data)
+        self.files_appended.append(path)
+        return True
+
+    def summary(self) -> Dict:
+        """本次运行的写入统计"""
+        return {
+            'bytes_written': self.bytes_written,
+            'written': len(self.files_written),
+            'appended': len(self.files_appended),
+            'skipped': len(self.files_skipped)
+        }
+
+    def log_summary(self):
+        """输出本次运行的写入统计"""
+        stats = self.summary()
+        logger.info(f"导出写入 {stats['bytes_written']} 字节: 重写 {stats['written']} 个文件, "
+                    f"追加 {stats['appended']} 个文件, 未变化跳过 {stats['skipped']} 个文件")
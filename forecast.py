@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+FORECAST_FILE = 'docs/data/forecast.json'
+
+
+class SeasonalForecaster:
+    """
+    短期客流预测：线性趋势 + 星期几季节项
+
+        y = a + b·t + Σ c_d·[星期几 = d]    (d = 周二 ~ 周日，周一为基准)
+
+    所有序列共用同一个设计矩阵，缺失值通过权重置0处理，
+    用批量正规方程一次求解全部序列（np.linalg.solve 支持批量），不逐线路循环
+    """
+
+    def __init__(self, horizon: int = 7, fit_days: Optional[int] = 182, z: float = 1.96):
+        self.horizon = horizon
+        self.fit_days = fit_days
+        self.z = z
+        self.series: List[str] = []
+        self.coef: Optional[np.ndarray] = None
+        self.sigma: Optional[np.ndarray] = None
+        self.origin: Optional[pd.Timestamp] = None
+        self.last_date: Optional[pd.Timestamp] = None
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'SeasonalForecaster':
+        """从 config.json 的 analytics.forecast 段创建"""
+        params = config.get('analytics', {}).get('forecast', {})
+        return cls(**{k: v for k, v in params.items() if k in ('horizon', 'fit_days', 'z')})
+
+    def design_matrix(self, dates: pd.DatetimeIndex) -> np.ndarray:
+        """设计矩阵：常数项、趋势项（以年为单位）、6个星期几哑变量"""
+        t = ((dates - self.origin).days.to_numpy() / 365.0)[:, None]
+        dow = dates.dayofweek.to_numpy()[:, None] == np.arange(1, 7)[None, :]
+        return np.hstack([np.ones_like(t), t, dow.astype(float)])
+
+    def fit(self, df: pd.DataFrame, series: List[str]) -> 'SeasonalForecaster':
+        """
+        拟合全部序列
+
+        Args:
+            df: 历史数据（date 升序）
+            series: 需要预测的列，如 ['total'] + 线路
+        """
+        frame = df.assign(date=pd.to_datetime(df['date'])).set_index('date')[list(series)].astype(float)
+        if self.fit_days:
+            frame = frame[frame.index > frame.index.max() - pd.Timedelta(days=self.fit_days)]
+
+        self.series = list(series)
+        self.origin = frame.index.min()
+        self.last_date = frame.index.max()
+
+        X = self.design_matrix(frame.index)              # (n, k)
+        Y = frame.to_numpy()                             # (n, s)
+        W = (~np.isnan(Y)).astype(float)                 # 缺失值权重为0
+        Y0 = np.nan_to_num(Y)
+
+        k = X.shape[1]
+        # 每个序列的正规方程 XᵀWX·β = XᵀWy；XᵀWX 对所有序列一次矩阵乘法得到 (s, k, k)
+        outer = (X[:, :, None] * X[:, None, :]).reshape(len(X), k * k)
+        XtWX = (outer.T @ W).T.reshape(-1, k, k)
+        XtWy = (X.T @ (W * Y0)).T
+        # 轻微岭正则，保证数据不足（如新开线路）时矩阵可逆
+        XtWX += 1e-9 * np.eye(k)[None, :, :]
+        self.coef = np.linalg.solve(XtWX, XtWy[:, :, None])[:, :, 0].T   # (k, s)
+
+        residuals = (Y0 - X @ self.coef) * W
+        dof = np.maximum(W.sum(axis=0) - k, 1)
+        self.sigma = np.sqrt((residuals ** 2).sum(axis=0) / dof)
+        # 有效样本太少的序列不做预测
+        self.coef[:, W.sum(axis=0) < 2 * k] = np.nan
+        return self
+
+    def predict(self, horizon: Optional[int] = None) -> pd.DataFrame:
+        """
+        预测未来 horizon 天
+
+        Returns:
+            pd.DataFrame: 列为 date, series, yhat, lower, upper
+        """
+        if self.coef is None:
+            raise RuntimeError("请先调用 fit()")
+        horizon = horizon or self.horizon
+        dates = pd.date_range(self.last_date + pd.Timedelta(days=1), periods=horizon, freq='D')
+        yhat = np.clip(self.design_matrix(dates) @ self.coef, 0, None)      # (h, s)
+        band = self.z * self.sigma[None, :]
+
+        n_series = len(self.series)
+        return pd.DataFrame({
+            'date': np.repeat(dates.strftime('%Y-%m-%d').to_numpy(), n_series),
+            'series': np.tile(np.asarray(self.series, dtype=object), horizon),
+            'yhat': yhat.ravel(),
+            'lower': np.clip(yhat - band, 0, None).ravel(),
+            'upper': (yhat + band).ravel(),
+        })
+
+    def to_json(self, forecast: pd.DataFrame) -> Dict:
+        """导出用的JSON结构：按序列分组的预测值和区间"""
+        forecast = forecast.dropna(subset=['yhat']).round({'yhat': 2, 'lower': 2, 'upper': 2})
+        return {
+            'generated_from': str(self.last_date.date()) if self.last_date is not None else None,
+            'horizon': self.horizon,
+            'fit_days': self.fit_days,
+            'model': 'linear trend + day-of-week',
+            'series': {
+                name: group[['date', 'yhat', 'lower', 'upper']].to_dict('records')
+                for name, group in forecast.groupby('series', sort=False)
+            }
+        }
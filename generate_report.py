@@ -5,6 +5,188 @@ import os
 import json
 from datetime import datetime, timedelta
 import pandas as pd
+from history_store import MetroHistoryStore
+from export_writer import AtomicExportWriter, WriterLock
+from aggregation import RidershipAggregator
+from line_metrics import LINE_METRICS_FILE
+from completeness import COMPLETENESS_FILE
+from line_config import VersionedLineConfig
+
+PAGES_DIR = 'docs/data/pages'
+
+
+def generate_history_pages(store: MetroHistoryStore, pages_dir: str = PAGES_DIR,
+                           writer: AtomicExportWriter = None) -> dict:
+    """
+    按月份生成历史数据分页片段（HTML表格）和摘要索引
+    
+    Args:
+        store: 历史数据存储
+        pages_dir: 分页文件输出目录
+        writer: 导出写入器，未变化的月份不会重写
+        
+    Returns:
+        dict: 摘要索引（同时写入 index.json）
+    """
+    writer = writer or AtomicExportWriter()
+    index = {
+        'generated': datetime.now().isoformat(),
+        'lines': store.lines,
+        'months': []
+    }
+    
+    columns = {'date': '日期', 'total': '总客流量(万)'}
+    for month, group in store.iter_months():
+        # 每页只包含一个月的数据，页面体积不随历史长度增长
+        fragment = group.iloc[::-1].rename(columns=columns).to_html(
+            index=False, classes='data-table', na_rep='-', float_format=lambda v: f'{v:.2f}')
+        writer.write_text(os.path.join(pages_dir, f'{month}.html'), fragment)
+        # 页面只按月加载 HTML 片段，旧版本生成的月度 JSON 没有读取方
+        stale = os.path.join(pages_dir, f'{month}.json')
+        if os.path.exists(stale):
+            os.remove(stale)
+        
+        totals = group['total'].dropna()
+        index['months'].append({
+            'month': month,
+            'days': int(len(group)),
+            'avg_total': round(float(totals.mean()), 2) if not totals.empty else None,
+            'max_total': round(float(totals.max()), 2) if not totals.empty else None,
+            'html': f'data/pages/{month}.html'
+        })
+    
+    # 最新月份排在前面
+    index['months'].reverse()
+    writer.write_json(os.path.join(pages_dir, 'index.json'), index,
+                      volatile_keys=('generated',), separators=(',', ':'))
+    
+    print(f"✅ 已生成 {len(index['months'])} 个月的历史数据分页")
+    return index
+
+
+def render_history_section(index: dict, pages_dir: str = PAGES_DIR) -> str:
+    """生成历史数据分页区块：仅内嵌最新月份，其余月份按需加载"""
+    if not index or not index['months']:
+        return ''
+    
+    latest = index['months'][0]
+    with open(os.path.join(pages_dir, f"{latest['month']}.html"), 'r', encoding='utf-8') as f:
+        latest_fragment = f.read()
+    
+    options = '\n'.join(
+        f'<option value="{m["month"]}">{m["month"]}（{m["days"]}天，日均{m["avg_total"] if m["avg_total"] is not None else "-"}万）</option>'
+        for m in index['months']
+    )
+    
+    return f"""
+        <h2><i class="fas fa-history"></i> 历史数据</h2>
+        <div class="history-pager">
+            <button type="button" id="history-prev">&lt; 上一月</button>
+            <select id="history-month">
+                {options}
+            </select>
+            <button type="button" id="history-next">下一月 &gt;</button>
+        </div>
+        <div class="table-container" id="history-table">
+            {latest_fragment}
+        </div>
+        <script>
+        (function() {{
+            var select = document.getElementById('history-month');
+            var target = document.getElementById('history-table');
+            var cache = {{}};
+            function load(month) {{
+                if (cache[month]) {{ target.innerHTML = cache[month]; return; }}
+                fetch('data/pages/' + month + '.html')
+                    .then(function(r) {{ return r.text(); }})
+                    .then(function(html) {{ cache[month] = html; target.innerHTML = html; }})
+                    .catch(function() {{ target.innerHTML = '<p>数据加载失败</p>'; }});
+            }}
+            select.addEventListener('change', function() {{ load(select.value); }});
+            document.getElementById('history-prev').addEventListener('click', function() {{
+                if (select.selectedIndex < select.options.length - 1) {{ select.selectedIndex += 1; load(select.value); }}
+            }});
+            document.getElementById('history-next').addEventListener('click', function() {{
+                if (select.selectedIndex > 0) {{ select.selectedIndex -= 1; load(select.value); }}
+            }});
+        }})();
+        </script>
+"""
+
+
+def render_line_metrics_section(metrics_file: str = LINE_METRICS_FILE) -> str:
+    """根据预计算的线路指标生成运营强度表格"""
+    if not os.path.exists(metrics_file):
+        return ''
+    try:
+        with open(metrics_file, 'r', encoding='utf-8') as f:
+            metrics = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 读取线路指标 {metrics_file} 时出错: {e}")
+        return ''
+    if not metrics.get('latest'):
+        return ''
+    
+    table = pd.DataFrame.from_dict(metrics['latest'], orient='index')
+    table = table.reindex(columns=['ridership', 'per_station', 'per_km', 'utilisation', 'share'])
+    table = table.dropna(subset=['ridership']).rename(columns={
+        'ridership': '客流量(万)',
+        'per_station': '站点客流强度(万/站)',
+        'per_km': '线路负荷强度(万/公里)',
+        'utilisation': '运能利用率(%)',
+        'share': '客流占比(%)'
+    })
+    table.index.name = '线路'
+    html = table.reset_index().to_html(index=False, classes='data-table', na_rep='-',
+                                       float_format=lambda v: f'{v:.2f}')
+    return f"""
+        <h2><i class="fas fa-tachometer-alt"></i> 线路运营强度（{metrics['date']}）</h2>
+        <div class="table-container">
+            {html}
+        </div>
+"""
+
+
+def render_completeness_section(completeness_file: str = COMPLETENESS_FILE) -> str:
+    """根据导出的数据完整性结果生成缺失及插补说明（没有缺失时不显示）"""
+    if not os.path.exists(completeness_file):
+        return ''
+    try:
+        with open(completeness_file, 'r', encoding='utf-8') as f:
+            completeness = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 读取数据完整性结果 {completeness_file} 时出错: {e}")
+        return ''
+    if not completeness.get('missing_cells'):
+        return ''
+    
+    methods = completeness['methods']
+    gaps = '、'.join(gap['from'] if gap['days'] == 1 else f"{gap['from']} ~ {gap['to']}"
+                    for gap in completeness['gaps'][-10:]) or '无'
+    table = pd.DataFrame.from_dict(completeness['series'], orient='index')
+    counts = ['missing', 'share', 'weekday_median', 'interpolate', 'unfilled']
+    table = table[table['missing'] > 0].reindex(columns=counts + ['last_missing'])
+    table[counts] = table[counts].fillna(0).astype(int)
+    table = table.rename(columns={
+        'missing': '缺失天数',
+        'share': '按占比',
+        'weekday_median': '同星期几中位数',
+        'interpolate': '线性插值',
+        'unfilled': '未补',
+        'last_missing': '最近缺失'
+    })
+    table.index.name = '序列'
+    html = table.reset_index().to_html(index=False, classes='data-table')
+    return f"""
+        <h2><i class="fas fa-calendar-check"></i> 数据完整性（{completeness['start']} ~ {completeness['end']}）</h2>
+        <p>{completeness['calendar_days']} 天中整天缺失 {completeness['gap_days']} 天（最近: {gaps}），
+           共 {completeness['missing_cells']} 个缺失值：按占比补 {methods['share']}，同星期几中位数补 {methods['weekday_median']}，
+           线性插值补 {methods['interpolate']}，未补 {methods['unfilled']}。趋势图中空心点、仪表板热力图中斜线格子为插补值。</p>
+        <div class="table-container">
+            {html}
+        </div>
+"""
+
 
 def generate_html_report():
     """生成HTML报告"""
@@ -89,6 +271,41 @@ def generate_html_report():
             except Exception as e:
                 print(f"⚠️ 读取日志文件时出错: {e}")
     
+    # 历史数据分页（按月份拆分，按需加载）
+    history_section = ''
+    writer = AtomicExportWriter()
+    store = MetroHistoryStore()
+    change_label = '较前一天'
+    
+    # 运营线路数按最新数据日期的配置计算（未开通的线路不计入）
+    line_count = 13
+    config = {}
+    try:
+        with open('config.json', 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        line_config = VersionedLineConfig(config['lines'])
+        as_of = store.df['date'].iloc[-1] if not store.df.empty else datetime.now().strftime('%Y-%m-%d')
+        line_count = len(line_config.open_lines(as_of))
+    except Exception as e:
+        print(f"⚠️ 读取线路配置时出错: {e}")
+    
+    if not store.df.empty:
+        try:
+            history_section = render_history_section(generate_history_pages(store, writer=writer))
+        except Exception as e:
+            print(f"⚠️ 生成历史数据分页时出错: {e}")
+        
+        # 周变化：与上周同一天相比（而不是前一天）
+        try:
+            # 与 run_analytics 相同，节假日文件取自 analytics.holidays_file
+            comparison = RidershipAggregator.from_config(store.df, store.lines, config).same_weekday_comparison()
+            last_week_pct = comparison.get('series', {}).get('total', {}).get('last_week_pct')
+            if last_week_pct is not None:
+                change_pct = last_week_pct
+                change_label = f"与上周{comparison['weekday']}相比"
+        except Exception as e:
+            print(f"⚠️ 计算周变化时出错: {e}")
+    
     # HTML模板
     html_template = f"""
 <!DOCTYPE html>
@@ -236,6 +453,20 @@ def generate_html_report():
             background-color: #f5f5f5;
         }}
         
+        .history-pager {{
+            display: flex;
+            gap: 10px;
+            align-items: center;
+            margin-top: 10px;
+        }}
+        
+        .history-pager select, .history-pager button {{
+            padding: 6px 10px;
+            border: 1px solid #ddd;
+            border-radius: 4px;
+            background: white;
+        }}
+        
         .line-legend {{
             display: flex;
             flex-wrap: wrap;
@@ -308,12 +539,12 @@ def generate_html_report():
             <div class="stat-card orange">
                 <div class="stat-label"><i class="fas fa-arrow-up"></i> 周变化</div>
                 <div class="stat-value">{change_pct if change_pct != 'N/A' else 'N/A':.1f}%</div>
-                <div class="stat-label">与上周相比</div>
+                <div class="stat-label">{change_label}</div>
             </div>
             
             <div class="stat-card blue">
                 <div class="stat-label"><i class="fas fa-subway"></i> 运营线路</div>
-                <div class="stat-value">13条</div>
+                <div class="stat-value">{line_count}条</div>
                 <div class="stat-label">地铁+S线</div>
             </div>
         </div>
@@ -343,12 +574,57 @@ def generate_html_report():
                     <p>多维度的数据分析视图</p>
                 </div>
             </div>
+            
+            <div class="image-card">
+                <img src="images/客流异常检测图.png" alt="客流异常检测图">
+                <div class="caption">
+                    <h3>客流异常检测图</h3>
+                    <p>最近90天总客流及同星期几基线区间，标注各线路的异常（停运、未解析到、明显偏离）</p>
+                </div>
+            </div>
+
+            <div class="image-card">
+                <img src="images/客流预测图.png" alt="客流预测图">
+                <div class="caption">
+                    <h3>客流预测图</h3>
+                    <p>总客流及各线路未来7天预测（虚线为预测，阴影为预测区间）</p>
+                </div>
+            </div>
+            
+            <div class="image-card">
+                <img src="images/客流日历热力图.png" alt="客流日历热力图">
+                <div class="caption">
+                    <h3>客流日历热力图</h3>
+                    <p>全部历史的每日总客流（按周 × 星期排列）</p>
+                </div>
+            </div>
+            
+            <div class="image-card">
+                <img src="images/线路相关性热力图.png" alt="线路相关性热力图">
+                <div class="caption">
+                    <h3>线路相关性热力图</h3>
+                    <p>线路之间及与总客流的滚动相关系数（按联动程度聚类排序）</p>
+                </div>
+            </div>
+            
+            <div class="image-card">
+                <img src="images/时段对比图.png" alt="时段对比图">
+                <div class="caption">
+                    <h3>时段对比图</h3>
+                    <p>最近7天与去年同期（历史不足一年时为前7天）的日均客流及占比变化</p>
+                </div>
+            </div>
         </div>
         
+        {render_line_metrics_section()}
+        
+        {render_completeness_section()}
+        
         <h2><i class="fas fa-table"></i> 最近7天数据</h2>
         <div class="table-container">
             {df.to_html(index=False, classes='data-table') if len(df) > 0 else '<p>暂无数据</p>'}
         </div>
+        {history_section}
         
         <h2><i class="fas fa-info-circle"></i> 使用说明</h2>
         <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; margin-bottom: 30px;">
@@ -377,11 +653,14 @@ def generate_html_report():
 """
     
     # 保存HTML文件
-    os.makedirs('docs', exist_ok=True)
-    with open('docs/index.html', 'w', encoding='utf-8') as f:
-        f.write(html_template)
+    writer.write_text('docs/index.html', html_template)
     
-    print("HTML报告已生成")
+    stats = writer.summary()
+    print(f"HTML报告已生成（写入 {stats['bytes_written']} 字节，跳过未变化文件 {stats['skipped']} 个）")
 
 if __name__ == "__main__":
-    generate_html_report()
+    with open('config.json', 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    # 单独运行时同样写入 docs/，与采集、导出进程共用写入锁
+    with WriterLock.from_config(config):
+        generate_html_report()
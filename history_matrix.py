@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import numpy as np
+
+from export_writer import AtomicExportWriter
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+HISTORY_MATRIX_FILE = 'docs/data/history_matrix.bin'
+HISTORY_MATRIX_INDEX = 'docs/data/history_matrix.json'
+MATRIX_FORMAT = 1
+MATRIX_DTYPE = '<f8'
+# 打开时数据文件与索引不一致（其他进程正在重写）的重试次数
+OPEN_RETRIES = 5
+
+
+class HistoryMatrix:
+    """
+    定长二进制历史数据：(天数 × 序列) float64 矩阵，行主序，按日期连续排列（缺失的天为 NaN 行）
+
+        history_matrix.bin    矩阵数据，无文件头
+        history_matrix.json   格式版本、起始日期、行数、列名（total + 各线路）和首末行摘要
+
+    第 i 行对应 start + i 天，按日期定位只需一次减法；打开时用 np.memmap 映射，
+    切片不复制数据，也不需要导入 pandas。追加新的天数只在文件末尾写入新行并更新索引，
+    已映射旧长度的读取方不受影响
+    """
+
+    def __init__(self, path: str = HISTORY_MATRIX_FILE, index_path: Optional[str] = None):
+        self.path = path
+        self.index_path = index_path or os.path.splitext(path)[0] + '.json'
+        self.columns: List[str] = []
+        self.start: Optional[np.datetime64] = None
+        self.values = np.empty((0, 0))
+        self._valid = None
+        self.open()
+
+    def open(self) -> bool:
+        """映射磁盘上的矩阵（文件不存在时为空矩阵），返回是否存在"""
+        self._valid = None
+        # 整体重写时数据文件先被替换、索引后更新；读到旧索引时首末行的摘要与数据不符，稍后重新读取索引
+        for attempt in range(OPEN_RETRIES):
+            if not (os.path.exists(self.path) and os.path.exists(self.index_path)):
+                self.columns, self.start, self.values = [], None, np.empty((0, 0))
+                return False
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('format') != MATRIX_FORMAT:
+                raise ValueError(f"{self.index_path} 的格式版本 {index.get('format')} 不受支持")
+            shape = (index['rows'], len(index['columns']))
+            if not index['rows']:
+                values = np.empty(shape)
+                break
+            # 文件可能比索引记录的长（追加写入后、更新索引前中断），只映射索引记录的行数
+            try:
+                values = np.memmap(self.path, dtype=MATRIX_DTYPE, mode='r', shape=shape)
+            except ValueError:
+                values = None
+            if values is not None and index.get('edges') in (None, self.edges_digest(values)):
+                break
+            time.sleep(0.01 * (attempt + 1))
+        else:
+            raise ValueError(f"{self.path} 与索引 {self.index_path} 不一致（正在被其他进程重写）")
+        self.columns = index['columns']
+        self.start = np.datetime64(index['start'], 'D')
+        self.values = values
+        return True
+
+    @property
+    def rows(self) -> int:
+        return self.values.shape[0]
+
+    @property
+    def lines(self) -> List[str]:
+        return [c for c in self.columns if c != 'total']
+
+    @property
+    def dates(self) -> np.ndarray:
+        """每行对应的日期（datetime64[D]）"""
+        if self.start is None:
+            return np.array([], dtype='datetime64[D]')
+        return self.start + np.arange(self.rows)
+
+    @property
+    def valid(self) -> np.ndarray:
+        """每行是否有数据（缺失的天全部为 NaN）"""
+        if self._valid is None:
+            self._valid = ~np.isnan(self.values).all(axis=1) if self.rows else np.zeros(0, dtype=bool)
+        return self._valid
+
+    def row(self, day) -> Optional[int]:
+        """日期对应的行号，不在范围内时返回 None"""
+        if self.start is None:
+            return None
+        pos = int((np.datetime64(str(day)[:10], 'D') - self.start).astype(int))
+        return pos if 0 <= pos < self.rows else None
+
+    def range(self, start=None, end=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        日期范围（含两端）内的日期和矩阵视图（不复制）
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (日期, 天数 × 列 的视图)
+        """
+        if self.start is None:
+            return self.dates, self.values
+        lo = 0 if start is None else int((np.datetime64(str(start)[:10], 'D') - self.start).astype(int))
+        hi = self.rows if end is None else int((np.datetime64(str(end)[:10], 'D') - self.start).astype(int)) + 1
+        lo, hi = max(lo, 0), min(max(hi, 0), self.rows)
+        lo = min(lo, hi)
+        return self.dates[lo:hi], self.values[lo:hi]
+
+    def last_rows(self, n: int) -> np.ndarray:
+        """最近 n 个有数据的天的行号（升序）"""
+        return np.flatnonzero(self.valid)[-n:] if n > 0 else np.array([], dtype=int)
+
+    def to_frame(self, rows=None) -> 'pd.DataFrame':
+        """
+        转为 MetroHistoryStore 格式的 DataFrame（date, total, 各线路），默认只含有数据的天
+
+        Args:
+            rows: 行号数组，默认全部有数据的行
+        """
+        import pandas as pd
+
+        rows = np.flatnonzero(self.valid) if rows is None else np.asarray(rows)
+        df = pd.DataFrame(self.values[rows], columns=self.columns)
+        df.insert(0, 'date', np.datetime_as_string(self.dates[rows], unit='D'))
+        return df
+
+    @staticmethod
+    def dense(df: 'pd.DataFrame', columns: List[str]) -> Tuple[Optional[np.datetime64], np.ndarray]:
+        """
+        把历史数据展开为按日期连续的矩阵
+
+        Returns:
+            Tuple: (起始日期, 天数 × 列 矩阵，缺失的天为 NaN)
+        """
+        if df.empty:
+            return None, np.empty((0, len(columns)))
+        days = np.array(df['date'], dtype='datetime64[D]')
+        start = days.min()
+        offsets = (days - start).astype(int)
+        matrix = np.full((int(offsets.max()) + 1, len(columns)), np.nan)
+        matrix[offsets] = df.reindex(columns=columns).to_numpy(dtype=float)
+        return start, matrix
+
+    @staticmethod
+    def edges_digest(values: np.ndarray) -> str:
+        """矩阵首行和末行的摘要"""
+        if not len(values):
+            return ''
+        edges = np.ascontiguousarray(values[[0, -1]], dtype=MATRIX_DTYPE)
+        return hashlib.sha1(edges.tobytes()).hexdigest()[:16]
+
+    def _write_index(self, writer: AtomicExportWriter, data: np.ndarray, start: np.datetime64, columns: List[str]):
+        writer.write_json(self.index_path, {
+            'format': MATRIX_FORMAT,
+            'dtype': MATRIX_DTYPE,
+            'start': str(start),
+            'rows': len(data),
+            'columns': columns,
+            # 首末行的摘要：追加不改变，起始日期或末行变化的重写会改变，读取方据此确认数据与索引一致
+            'edges': self.edges_digest(data),
+        }, indent=2)
+
+    def sync(self, df: 'pd.DataFrame', lines: Optional[List[str]] = None,
+             writer: Optional[AtomicExportWriter] = None) -> str:
+        """
+        与历史数据同步：已有的行未变化时只追加新增的天，否则原子重写整个文件
+
+        Args:
+            df: MetroHistoryStore 格式的历史数据
+            lines: 线路列表，默认取 df 中除 date、total 外的列
+            writer: 导出写入器
+
+        Returns:
+            str: 'unchanged'、'append' 或 'rewrite'
+        """
+        writer = writer or AtomicExportWriter()
+        columns = ['total'] + list(lines if lines is not None else [c for c in df.columns if c not in ('date', 'total')])
+        start, matrix = self.dense(df, columns)
+        if start is None:
+            return 'unchanged'
+
+        rows = self.rows
+        can_append = (
+            columns == self.columns
+            and start == self.start
+            and len(matrix) >= rows
+            and np.array_equal(matrix[:rows], self.values, equal_nan=True)
+        )
+        if can_append and len(matrix) == rows:
+            return 'unchanged'
+
+        data = np.ascontiguousarray(matrix, dtype=MATRIX_DTYPE)
+        if can_append:
+            mode = 'append'
+            offset = rows * len(columns) * data.itemsize
+            writer.append_bytes(self.path, data[rows:].tobytes(), offset)
+        else:
+            mode = 'rewrite'
+            writer.write_bytes(self.path, data.tobytes())
+        # 数据写完后再更新索引，中途中断时读取方仍按旧的行数读取
+        self._write_index(writer, data, start, columns)
+        self.open()
+        return mode
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from export_writer import AtomicExportWriter, flock_file
+
+HISTORY_FILE = 'docs/data/history.csv'
+
+
+class MetroHistoryStore:
+    """客流历史数据存储：一天一行（date, total, 各线路），按日期升序"""
+
+    def __init__(self, path: str = HISTORY_FILE, lines: Optional[List[str]] = None):
+        self.path = path
+        self.lines = list(lines) if lines else []
+        self.df = self.load()
+        # 磁盘上已有的数据，用于判断保存时能否只追加新增天数
+        self._saved = self.df.copy()
+        self._file_key = self.file_key()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, path: str = HISTORY_FILE,
+                   lines: Optional[List[str]] = None) -> 'MetroHistoryStore':
+        """
+        用已规范化、与磁盘内容一致的历史数据创建（如采集器快照），不读取CSV
+
+        Args:
+            df: 历史数据（date 升序、已去重）
+            path: 对应的CSV文件，保存时写入
+            lines: 线路列表，默认取 df 中除 date、total 外的列
+        """
+        store = cls.__new__(cls)
+        store.path = path
+        store.lines = list(lines) if lines else [c for c in df.columns if c not in ('date', 'total')]
+        store.df = df.reindex(columns=store.columns).reset_index(drop=True)
+        store._saved = store.df.copy()
+        store._file_key = store.file_key()
+        return store
+
+    def file_key(self) -> Optional[Tuple[int, int]]:
+        """磁盘上文件的 (大小, 修改时间)，文件不存在时为 None"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def refresh(self) -> bool:
+        """
+        文件在上次加载/保存后被其他进程改写时重新加载（常驻进程在获得写入锁后调用），
+        未保存的修改会被丢弃
+
+        Returns:
+            bool: 是否重新加载
+        """
+        key = self.file_key()
+        if key == self._file_key:
+            return False
+        self.df = self.load()
+        self._saved = self.df.copy()
+        self._file_key = key
+        return True
+
+    @property
+    def columns(self) -> List[str]:
+        return ['date', 'total'] + self.lines
+
+    def load(self) -> pd.DataFrame:
+        """从CSV加载历史数据，文件不存在时返回空表"""
+        if not os.path.exists(self.path):
+            return pd.DataFrame(columns=self.columns)
+        try:
+            # 共享锁：其他进程正在追加时等待追加完成，不会读到一部分新增行
+            with open(self.path, 'rb') as f:
+                flock_file(f, shared=True)
+                data = f.read()
+            df = pd.read_csv(io.BytesIO(data), encoding='utf-8')
+        except Exception as e:
+            print(f"⚠️ 读取历史数据 {self.path} 时出错: {e}")
+            return pd.DataFrame(columns=self.columns)
+
+        # 追加写入中途崩溃时末行不完整，丢弃该行
+        if data[-1:] not in (b'\n', b'') and not df.empty:
+            df = df.iloc[:-1]
+
+        if not self.lines:
+            self.lines = [c for c in df.columns if c not in ('date', 'total')]
+        return self._normalize(df)
+
+    def _normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """统一列顺序与类型，按日期去重并升序排列"""
+        df = df.reindex(columns=self.columns)
+        df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+        for col in self.columns[1:]:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
+        df = df.drop_duplicates(subset='date', keep='last')
+        return df.sort_values('date').reset_index(drop=True)
+
+    def merge_records(self, records: List[Dict]) -> int:
+        """
+        合并采集到的记录（需包含 full_date 字段）
+
+        Args:
+            records: collect_data 返回的记录列表
+
+        Returns:
+            int: 新增的天数
+        """
+        rows = []
+        for record in records:
+            full_date = record.get('full_date')
+            if not full_date:
+                continue
+            data = record['passenger_data']
+            row = {'date': full_date, 'total': data.get('总客流量')}
+            for line in self.lines:
+                row[line] = data.get(line)
+            rows.append(row)
+
+        if not rows:
+            return 0
+
+        known = set(self.df['date'])
+        # 新采集的数据覆盖旧数据（同一天以最新解析结果为准）
+        incoming = pd.DataFrame(rows, columns=self.columns)
+        merged = pd.concat([self.df, incoming], ignore_index=True)
+        self.df = self._normalize(merged)
+        return len(set(incoming['date']) - known)
+
+    def save(self, writer: Optional[AtomicExportWriter] = None) -> AtomicExportWriter:
+        """
+        保存历史数据到CSV
+
+        已保存的行未变化时只追加新增天数，否则通过临时文件原子重写整个文件
+
+        Args:
+            writer: 导出写入器，None 时新建一个
+
+        Returns:
+            AtomicExportWriter: 使用的写入器（含写入统计）
+        """
+        writer = writer or AtomicExportWriter()
+        saved_rows = len(self._saved)
+        head = self.df.iloc[:saved_rows].reset_index(drop=True)
+        can_append = (
+            saved_rows > 0
+            and os.path.exists(self.path)
+            and list(self._saved.columns) == self.columns
+            and head.equals(self._saved)
+        )
+
+        if can_append:
+            try:
+                writer.append_csv(self.path, self.df.iloc[saved_rows:])
+            except ValueError as e:
+                print(f"⚠️ {e}，改为重写历史数据")
+                writer.write_csv(self.path, self.df)
+        else:
+            writer.write_csv(self.path, self.df)
+
+        self._saved = self.df.copy()
+        self._file_key = self.file_key()
+        return writer
+
+    def date_range(self) -> Tuple[str, str]:
+        """返回历史数据的起止日期"""
+        if self.df.empty:
+            return "", ""
+        return self.df['date'].iloc[0], self.df['date'].iloc[-1]
+
+    def iter_months(self) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """按月份（YYYY-MM）遍历历史数据"""
+        if self.df.empty:
+            return
+        months = self.df['date'].str[:7]
+        for month, group in self.df.groupby(months, sort=True):
+            yield month, group
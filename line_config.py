@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+from datetime import date as date_type, timedelta
+from typing import TYPE_CHECKING, Dict, List
+
+# numpy/pandas 只在向量化查询时导入，按日期查询配置（采集阶段）不需要
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# 支持按日期变化的线路属性
+DATED_FIELDS = ('stations', 'length_km', 'capacity')
+
+
+def _to_date(value) -> date_type:
+    """将字符串/Timestamp/datetime/date 统一转换为 date"""
+    if isinstance(value, str):
+        return date_type.fromisoformat(value[:10])
+    if hasattr(value, 'date') and callable(value.date):
+        return value.date()
+    return value
+
+
+class VersionedLineConfig:
+    """
+    按日期分版本的线路配置
+
+    每条线路的顶层 stations / length_km / capacity 为当前值，可选的 history 列表记录此前的版本：
+        "history": [{"until": "2010-05-27", "stations": 16, "length_km": 21.7}]
+    日期 D 使用 until >= D 的第一个历史版本（未给出的字段取顶层值），晚于所有 until 时使用当前值；
+    opening_date 之前线路未开通。
+
+    所有线路的开通日期和版本切换日期构成一组有序断点，相邻断点之间配置不变，
+    预先为每个区间生成配置快照，as_of(D) 只需在断点上二分查找，O(log n)。
+    """
+
+    def __init__(self, line_configs: List[Dict]):
+        self.line_configs = list(line_configs)
+        self.lines = [line['name'] for line in self.line_configs]
+
+        breakpoints = set()
+        for line in self.line_configs:
+            if line.get('opening_date'):
+                breakpoints.add(_to_date(line['opening_date']))
+            for version in line.get('history', []):
+                # until 当天仍是旧版本，次日切换
+                breakpoints.add(_to_date(version['until']) + timedelta(days=1))
+        self.breakpoints = sorted(breakpoints)
+
+        # 区间 i 为 [breakpoints[i-1], breakpoints[i])，区间 0 早于所有断点
+        starts = [date_type.min] + self.breakpoints
+        self.snapshots = [self._resolve_at(start) for start in starts]
+        self._matrices = None
+
+    @property
+    def matrices(self) -> Dict[str, 'np.ndarray']:
+        """向量化查询用的 区间×线路 属性矩阵（另含布尔矩阵 'open'），首次使用时构建"""
+        if self._matrices is None:
+            import numpy as np
+
+            matrices = {
+                field: np.array([[snap[line][field] if line in snap else np.nan for line in self.lines]
+                                 for snap in self.snapshots], dtype=float)
+                for field in DATED_FIELDS
+            }
+            matrices['open'] = np.array([[line in snap for line in self.lines] for snap in self.snapshots],
+                                        dtype=bool).reshape(len(self.snapshots), len(self.lines))
+            self._matrices = matrices
+        return self._matrices
+
+    def _resolve_at(self, day: date_type) -> Dict[str, Dict]:
+        """逐线路解析某一天的配置（仅用于构建快照）"""
+        snapshot = {}
+        for line in self.line_configs:
+            opening = line.get('opening_date')
+            if opening and day < _to_date(opening):
+                continue
+            resolved = dict(line)
+            resolved.pop('history', None)
+            versions = sorted(line.get('history', []), key=lambda v: v['until'])
+            for version in versions:
+                if day <= _to_date(version['until']):
+                    resolved.update({k: v for k, v in version.items() if k != 'until'})
+                    break
+            for field in DATED_FIELDS:
+                if resolved.get(field) is None:
+                    resolved[field] = float('nan')
+            snapshot[line['name']] = resolved
+        return snapshot
+
+    def _interval(self, day) -> int:
+        return bisect.bisect_right(self.breakpoints, _to_date(day))
+
+    def as_of(self, day) -> Dict[str, Dict]:
+        """
+        某一天的线路配置（只包含已开通的线路）
+
+        Args:
+            day: 日期（字符串 YYYY-MM-DD、date 或 Timestamp）
+
+        Returns:
+            Dict[str, Dict]: 线路名 -> 当天生效的配置
+        """
+        return self.snapshots[self._interval(day)]
+
+    def open_lines(self, day) -> List[str]:
+        """某一天已开通的线路（保持配置中的顺序）"""
+        snapshot = self.as_of(day)
+        return [line for line in self.lines if line in snapshot]
+
+    def line_info(self, line_name: str, day=None) -> Dict:
+        """指定线路在某一天的配置，day 为 None 时返回当前配置"""
+        snapshot = self.snapshots[-1] if day is None else self.as_of(day)
+        return snapshot.get(line_name, {})
+
+    def intervals(self, dates: 'np.ndarray') -> 'np.ndarray':
+        """一组日期（datetime64）所在的区间编号，用于索引 matrices"""
+        import numpy as np
+
+        points = np.array(self.breakpoints, dtype='datetime64[D]')
+        return np.searchsorted(points, np.asarray(dates).astype('datetime64[D]'), side='right')
+
+    def resolve(self, dates: 'pd.DatetimeIndex') -> Dict[str, 'pd.DataFrame']:
+        """
+        向量化解析多个日期的线路属性
+
+        Returns:
+            Dict[str, pd.DataFrame]: 字段名 -> 日期×线路 矩阵（未开通为空值），另含 'open'
+        """
+        import pandas as pd
+
+        intervals = self.intervals(dates.values)
+        return {field: pd.DataFrame(matrix[intervals], index=dates, columns=self.lines)
+                for field, matrix in self.matrices.items()}
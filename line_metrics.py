@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from line_config import VersionedLineConfig
+
+LINE_METRICS_FILE = 'docs/data/line_metrics.json'
+
+
+class LineMetricsTable:
+    """
+    线路运营强度指标（全部历史一次性向量化计算，图表、导出和报告共用）
+
+        per_station  站点客流强度 = 客流量 ÷ 站点数（万/站）
+        per_km       线路负荷强度 = 客流量 ÷ 线路长度（万/公里）
+        utilisation  能力利用率 = 客流量 ÷ 设计运能 × 100%（配置了 capacity 的线路）
+        share        客流占比 = 客流量 ÷ 总客流 × 100%
+    """
+
+    METRICS = ('ridership', 'per_station', 'per_km', 'utilisation', 'share')
+
+    def __init__(self, df: pd.DataFrame, line_config: VersionedLineConfig):
+        self.lines = line_config.lines
+        frame = df.assign(date=pd.to_datetime(df['date'])).set_index('date').sort_index()
+        ridership = frame.reindex(columns=self.lines).astype(float)
+        total = frame['total'].astype(float) if 'total' in frame.columns else ridership.sum(axis=1, min_count=1)
+
+        # 站点数、长度、运能按日期取当时的配置，未开通的线路为空值，不计入分母
+        self.attributes = line_config.resolve(ridership.index)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            metrics = {
+                'ridership': ridership,
+                'per_station': ridership / self.attributes['stations'].where(self.attributes['stations'] > 0),
+                'per_km': ridership / self.attributes['length_km'].where(self.attributes['length_km'] > 0),
+                'utilisation': ridership / self.attributes['capacity'].where(self.attributes['capacity'] > 0) * 100,
+                'share': ridership.div(total.where(total > 0), axis=0) * 100,
+            }
+        # 列为 (指标, 线路) 的宽表
+        self.table = pd.concat(metrics, axis=1)
+        self.total = total
+
+    def metric(self, name: str, last_n_days: Optional[int] = None) -> pd.DataFrame:
+        """取某个指标的 日期×线路 矩阵"""
+        frame = self.table[name]
+        return frame.tail(last_n_days) if last_n_days else frame
+
+    def attribute(self, field: str, date=None) -> pd.Series:
+        """指定日期（默认最新一天）各线路的属性值"""
+        frame = self.attributes[field]
+        if frame.empty:
+            return pd.Series(dtype=float)
+        return frame.loc[pd.Timestamp(date)] if date is not None else frame.iloc[-1]
+
+    def latest(self) -> pd.DataFrame:
+        """最新一天各线路的全部指标（行：线路，列：指标）"""
+        if self.table.empty:
+            return pd.DataFrame(columns=list(self.METRICS))
+        return self.table.iloc[-1].unstack(level=0).reindex(index=self.lines, columns=list(self.METRICS))
+
+    def to_json(self, last_n_days: int = 30) -> Dict:
+        """导出用的JSON结构：最新一天的指标及最近 n 天的序列"""
+        if self.table.empty:
+            return {}
+        latest = self.latest().round(3)
+        recent = self.table.tail(last_n_days).round(3)
+        recent.index = recent.index.strftime('%Y-%m-%d')
+        return {
+            'date': self.table.index[-1].strftime('%Y-%m-%d'),
+            'latest': latest.astype(object).where(latest.notna(), None).to_dict('index'),
+            'recent': {
+                metric: recent[metric].astype(object).where(recent[metric].notna(), None).to_dict('index')
+                for metric in self.METRICS
+            }
+        }
@@ -3,28 +3,26 @@
 
 import os
 import sys
-
-# 首先配置字体
-try:
-    from setup_fonts import setup_chinese_fonts, test_chinese_font
-    if setup_chinese_fonts():
-        print("✓ 字体配置完成")
-    else:
-        print("⚠ 字体配置可能有问题，继续运行...")
-except Exception as e:
-    print(f"⚠ 字体配置脚本出错: {e}")
-
-# 然后导入其他库
-import matplotlib
-matplotlib.use('Agg')  # 使用Agg后端，避免GUI问题
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import numpy as np
-from metro_data import NanjingSubwayDataCollector
-import pandas as pd
 import logging
 from datetime import datetime
-import json
+from typing import Dict, Optional
+from metro_data import NanjingSubwayDataCollector
+from export_writer import AtomicExportWriter, WriterLock
+from parse_validation import PARSE_QUALITY_FILE
+
+# matplotlib、numpy、pandas 在首次创建可视化器时由 setup_plotting() 导入，
+# 只采集或只导出数据时不需要加载
+plt = None
+fm = None
+np = None
+pd = None
+
+# 热力图：逐格标注数值的格子数上限（约13条线路 × 31天）、横轴最多刻度数
+HEATMAP_CMAP = 'YlOrRd'
+HEATMAP_ANNOTATE_MAX_CELLS = 403
+HEATMAP_MAX_XTICKS = 31
+# 插补值的样式：折线图中为空心标记，热力图中为斜线格子
+IMPUTED_HATCH = '///'
 
 # 配置日志
 logging.basicConfig(
@@ -76,18 +74,44 @@ def ensure_chinese_font():
     except Exception as e:
         logger.error(f"确保字体设置时出错: {e}")
 
-# 调用字体检查
-ensure_chinese_font()
-
-# 设置图表样式
-plt.rcParams['figure.dpi'] = 100
-plt.rcParams['savefig.dpi'] = 300
-plt.rcParams['figure.figsize'] = (14, 8)
+def setup_plotting():
+    """导入绘图相关的库并配置中文字体和图表样式（只执行一次）"""
+    global plt, fm, np, pd
+    if plt is not None:
+        return
+    
+    # 首先配置字体
+    try:
+        from setup_fonts import setup_chinese_fonts
+        if setup_chinese_fonts():
+            print("✓ 字体配置完成")
+        else:
+            print("⚠ 字体配置可能有问题，继续运行...")
+    except Exception as e:
+        print(f"⚠ 字体配置脚本出错: {e}")
+    
+    # 然后导入其他库
+    import matplotlib
+    matplotlib.use('Agg')  # 使用Agg后端，避免GUI问题
+    import matplotlib.pyplot
+    import matplotlib.font_manager
+    import numpy
+    import pandas
+    plt, fm, np, pd = matplotlib.pyplot, matplotlib.font_manager, numpy, pandas
+    
+    # 调用字体检查
+    ensure_chinese_font()
+    
+    # 设置图表样式
+    plt.rcParams['figure.dpi'] = 100
+    plt.rcParams['savefig.dpi'] = 300
+    plt.rcParams['figure.figsize'] = (14, 8)
 
 class NanjingSubwayVisualizer:
     """南京地铁数据可视化器"""
     
     def __init__(self, data_collector):
+        setup_plotting()
         self.data_collector = data_collector
         self.line_colors = self._get_line_colors()
         
@@ -354,46 +378,111 @@ class NanjingSubwayVisualizer:
             logger.error(f"生成紧凑型饼图时出错: {e}", exc_info=True)
             return None
     
-    def plot_last_n_days_line_trend(self, n_days=7):
+    def _draw_heatmap(self, ax, data, row_labels, col_labels, cbar_label='客流量（万）',
+                      cmap=HEATMAP_CMAP, norm=None, fmt='{:.0f}', hatched=None):
+        """
+        绘制 行 × 列 热力图（单个 imshow，颜色范围只计算一次）
+        
+        格子数不超过 HEATMAP_ANNOTATE_MAX_CELLS 时逐格标注数值，否则只标注每行的最大值，
+        文字数量不随天数增长；norm 默认取数据的最小~最大值。
+        hatched 为与 data 形状相同的布尔矩阵时，对应格子（插补值）加斜线，全部斜线为一个 PatchCollection
+        """
+        if norm is None:
+            norm = plt.Normalize(np.nanmin(data), np.nanmax(data))
+        im = ax.imshow(np.ma.masked_invalid(data), aspect='auto', cmap=cmap, norm=norm,
+                       interpolation='nearest')
+        
+        n_rows, n_cols = data.shape
+        ax.set_yticks(range(n_rows))
+        ax.set_yticklabels(row_labels)
+        ticks = np.arange(0, n_cols, max(1, -(-n_cols // HEATMAP_MAX_XTICKS)))
+        ax.set_xticks(ticks)
+        ax.set_xticklabels([col_labels[j] for j in ticks], rotation=45, ha='right')
+        
+        cbar = plt.colorbar(im, ax=ax)
+        cbar.set_label(cbar_label)
+        
+        if hatched is not None and np.any(hatched):
+            from matplotlib.collections import PatchCollection
+            from matplotlib.patches import Rectangle
+            cells = [Rectangle((j - 0.5, i - 0.5), 1, 1) for i, j in zip(*np.nonzero(hatched))]
+            ax.add_collection(PatchCollection(cells, facecolor='none', edgecolor='#555555',
+                                              hatch=IMPUTED_HATCH, linewidth=0))
+        
+        valid = ~np.isnan(data)
+        if data.size <= HEATMAP_ANNOTATE_MAX_CELLS:
+            rows, cols = np.nonzero(valid)
+            fontsize = min(20, 160 / n_rows, 400 / n_cols)
+        else:
+            has_data = valid.any(axis=1)
+            rows = np.flatnonzero(has_data)
+            cols = np.nanargmax(data[has_data], axis=1)
+            fontsize = 9
+        values = data[rows, cols]
+        # 深色格子用白字（按格子颜色的亮度判断，发散色图两端都是深色）
+        rgba = plt.get_cmap(cmap)(np.asarray(norm(values)))
+        dark = rgba[:, :3] @ np.array([0.299, 0.587, 0.114]) < 0.5
+        for i, j, value, is_dark in zip(rows, cols, values, dark):
+            ax.text(j, i, fmt.format(value), ha='center', va='center',
+                    color='white' if is_dark else 'black', fontsize=fontsize)
+        return im
+    
+    @staticmethod
+    def _mark_imputed(ax, x, values, imputed, color, markersize=8):
+        """在折线上把插补点画成空心标记"""
+        points = np.flatnonzero(np.asarray(imputed) & ~np.isnan(values))
+        if len(points):
+            ax.plot(np.asarray(x)[points], values[points], linestyle='none', marker='o', markersize=markersize,
+                    markerfacecolor='white', markeredgecolor=color, markeredgewidth=2, zorder=3)
+    
+    def plot_last_n_days_line_trend(self, n_days=7, forecast=None):
         """绘制最近n天站点客流强度变化趋势图
         站点客流强度 = 客流量 / 站点数量（取整）
+        forecast 为 SeasonalForecaster.predict() 的结果时，接着画出未来几天的预测（虚线）和预测区间（阴影带）
         """
         try:
             self._ensure_font()
             
-            df = self.data_collector.get_last_n_days_line_data(n_days)
+            from line_metrics import LineMetricsTable
             
-            if df.empty:
+            # 按完整日历取最近n天：漏掉的天和未解析到的线路已插补（见 completeness.py），插补点用空心标记
+            completed = self.data_collector.complete_last_n_days(n_days)
+            if not len(completed):
                 logger.warning(f"没有找到最近{n_days}天的数据")
                 return None
-            
-            # 获取各线路站点数量信息
-            line_info = self.data_collector.line_info
+            # 站点数按日期取当时的配置
+            metrics = LineMetricsTable(completed.frame(), self.data_collector.line_config)
+            intensity = metrics.metric('per_station')
+            dates = intensity.index.strftime('%m-%d')
+            station_counts = metrics.attribute('stations')
+            imputed = pd.DataFrame(completed.imputed, index=intensity.index, columns=completed.series)
+            # 预测必须紧接着图中最后一天（--to 截取的历史范围等情况下不画）
+            if forecast is not None and (forecast.empty or pd.Timestamp(forecast['date'].min())
+                                         != intensity.index[-1] + pd.Timedelta(days=1)):
+                forecast = None
             
             fig, ax = plt.subplots(figsize=(14, 8))
             
             # 绘制每条线路的站点客流强度趋势线
             for line in self.data_collector.all_lines:
-                if line in df.columns:
-                    # 只显示有数据的线路
-                    if df[line].notna().any():
-                        color = self.line_colors.get(line, '#CCCCCC')
-                        
-                        # 获取站点数量
-                        stations = line_info.get(line, {}).get('stations', 1)
-                        if stations == 0:
-                            stations = 1  # 避免除零错误
-                        
-                        # 计算站点客流强度 = 客流量 / 站点数量
-                        station_intensity = df[line] / stations
-                        
-                        # 在图例中显示线路名称和站点数
-                        ax.plot(df['date'], station_intensity, 
-                               label=f'{line} ({stations}站)', 
-                               color=color,
-                               marker='o',
-                               linewidth=2.5,
-                               markersize=8)
+                # 只显示有数据的线路
+                if line in intensity.columns and intensity[line].notna().any():
+                    color = self.line_colors.get(line, '#CCCCCC')
+                    stations = station_counts.get(line)
+                    stations = int(stations) if pd.notna(stations) else 'N/A'
+                    
+                    # 在图例中显示线路名称和站点数
+                    values = intensity[line].to_numpy()
+                    ax.plot(dates, values, 
+                           label=f'{line} ({stations}站)', 
+                           color=color,
+                           marker='o',
+                           linewidth=2.5,
+                           markersize=8)
+                    self._mark_imputed(ax, dates, values, imputed[line].to_numpy(), color)
+                    if forecast is not None and stations != 'N/A':
+                        self._draw_forecast_band(ax, dates, values, forecast[forecast['series'] == line],
+                                                 stations, color)
             
             # 设置中文标签和标题
             ax.set_xlabel('日期', fontsize=12, fontweight='bold')
@@ -412,7 +501,12 @@ class NanjingSubwayVisualizer:
             ax.set_ylim(bottom=0)
             
             # 添加站点客流强度计算公式说明
-            ax.text(0.02, 0.98, '计算公式：站点客流强度 = 客流量 ÷ 站点数量',
+            note = '计算公式：站点客流强度 = 客流量 ÷ 站点数量'
+            if imputed.to_numpy().any():
+                note += '\n空心点为插补值（当天未采集到或未解析到该线路）'
+            if forecast is not None:
+                note += f'\n虚线为未来{forecast["date"].nunique()}天预测，阴影为预测区间'
+            ax.text(0.02, 0.98, note,
                    transform=ax.transAxes,
                    fontsize=9,
                    verticalalignment='top',
@@ -439,6 +533,17 @@ class NanjingSubwayVisualizer:
             logger.error(f"生成站点客流强度趋势图时出错: {e}", exc_info=True)
             return None
     
+    def _draw_forecast_band(self, ax, dates, values, pred, stations, color):
+        """在站点客流强度趋势图上接着画一条线路的预测：预测值和区间按站点数换算为强度"""
+        pred = pred.dropna(subset=['yhat'])
+        if pred.empty:
+            return
+        pred_dates = list(pd.to_datetime(pred['date']).dt.strftime('%m-%d'))
+        # 预测线从最后一个实际值连出
+        ax.plot([dates[-1]] + pred_dates, [values[-1]] + list(pred['yhat'] / stations),
+                color=color, linewidth=1.5, linestyle='--')
+        ax.fill_between(pred_dates, pred['lower'] / stations, pred['upper'] / stations, color=color, alpha=0.15)
+    
     def plot_comprehensive_analysis(self, n_days=7):
         """绘制综合分析仪表板"""
         try:
@@ -447,7 +552,8 @@ class NanjingSubwayVisualizer:
             fig = plt.figure(figsize=(18, 12))
             gs = fig.add_gridspec(3, 3)
             
-            df = self.data_collector.get_last_n_days_line_data(n_days)
+            # 完整日历的最近n天（插补值在趋势图中为空心点、热力图中加斜线）
+            df, imputed = self.data_collector.get_last_n_days_completed(n_days)
             
             if not df.empty:
                 # 饼图
@@ -476,6 +582,7 @@ class NanjingSubwayVisualizer:
                 ax2 = fig.add_subplot(gs[0, 1:])
                 if 'total' in df.columns:
                     ax2.plot(df['date'], df['total'], 'b-o', linewidth=2, markersize=8)
+                    self._mark_imputed(ax2, df['date'], df['total'].to_numpy(), imputed['total'].to_numpy(), 'b')
                     ax2.fill_between(df['date'], df['total'], alpha=0.2)
                     ax2.set_xlabel('日期')
                     ax2.set_ylabel('总客流量（万）')
@@ -483,39 +590,16 @@ class NanjingSubwayVisualizer:
                     ax2.grid(True, alpha=0.3)
                     ax2.set_xticklabels(df['date'], rotation=45, ha='right')
                 
-                # 热力图
+                # 热力图（全部开通线路 × 天数，天数较多时只标注各线路峰值）
                 ax3 = fig.add_subplot(gs[1:, :])
-                main_lines = self.data_collector.all_lines[:8]
-                
-                heatmap_data = []
-                valid_lines = []
-                for line in main_lines:
-                    if line in df.columns and df[line].notna().any():
-                        heatmap_data.append(df[line].values)
-                        valid_lines.append(line)
+                valid_lines = [line for line in self.data_collector.get_active_lines()
+                               if line in df.columns and df[line].notna().any()]
                 
-                if heatmap_data:
-                    heatmap_data = np.array(heatmap_data)
-                    im = ax3.imshow(heatmap_data, aspect='auto', cmap='YlOrRd', interpolation='nearest')
-                    
-                    ax3.set_yticks(range(len(valid_lines)))
-                    ax3.set_yticklabels(valid_lines)
-                    ax3.set_xticks(range(len(df)))
-                    ax3.set_xticklabels(df['date'], rotation=45, ha='right')
-                    
-                    cbar = plt.colorbar(im, ax=ax3)
-                    cbar.set_label('客流量（万）')
-                    
-                    for i in range(len(valid_lines)):
-                        for j in range(len(df)):
-                            value = heatmap_data[i, j]
-                            if not np.isnan(value):
-                                ax3.text(j, i, f'{value:.0f}', 
-                                        ha='center', va='center', 
-                                        color='white' if value > heatmap_data.max()/2 else 'black',
-                                        fontsize=20)
-                    
-                    ax3.set_title(f'主要线路客流量热力图（最近{n_days}天）', fontsize=14, fontweight='bold')
+                if valid_lines:
+                    heatmap_data = df[valid_lines].to_numpy(dtype=float).T
+                    self._draw_heatmap(ax3, heatmap_data, valid_lines, list(df['date']),
+                                       hatched=imputed[valid_lines].to_numpy().T)
+                    ax3.set_title(f'各线路客流量热力图（最近{n_days}天）', fontsize=14, fontweight='bold')
                 
                 # 统计信息
                 ax4 = fig.add_subplot(gs[2, 0])
@@ -546,19 +630,711 @@ class NanjingSubwayVisualizer:
             logger.error(f"生成分析仪表板时出错: {e}")
             return None
 
+    @staticmethod
+    def calendar_grid(dates, values):
+        """
+        按日历排列每天的数值
+        
+        Args:
+            dates: 日期（字符串或日期类型）
+            values: 与日期一一对应的数值
+        
+        Returns:
+            tuple: (年份数组, 年份 × 星期(周一=0) × 年内第几周(0~53) 的数组，无数据为 NaN)
+        """
+        days = pd.DatetimeIndex(pd.to_datetime(dates))
+        years = np.unique(days.year)
+        year_pos = np.searchsorted(years, days.year)
+        # 1月1日所在的周为第0周，周一开始新的一周
+        jan1_weekday = pd.to_datetime([f'{year}-01-01' for year in years]).weekday.to_numpy()
+        week = (days.dayofyear.to_numpy() - 1 + jan1_weekday[year_pos]) // 7
+        grid = np.full((len(years), 7, 54), np.nan)
+        grid[year_pos, days.weekday.to_numpy(), week] = np.asarray(values, dtype=float)
+        return years, grid
+    
+    def plot_calendar_heatmap(self, history_df, column='total'):
+        """
+        绘制全部历史的日历热力图（每年 7 行 × 54 周，全部年份合成一个 imshow）
+        
+        颜色范围取 1%~99% 分位数只计算一次，只标注每年的最高和最低一天，
+        绘图开销不随历史天数增长
+        """
+        try:
+            self._ensure_font()
+            
+            data = history_df[['date', column]].dropna()
+            if data.empty:
+                logger.warning("没有历史数据，跳过日历热力图")
+                return None
+            
+            years, grid = self.calendar_grid(data['date'], data[column])
+            n_years = len(years)
+            # 年份之间空一行：(年, 8, 54) → (年 × 8 - 1, 54)
+            padded = np.full((n_years, 8, grid.shape[2]), np.nan)
+            padded[:, :7] = grid
+            image = padded.reshape(n_years * 8, -1)[:-1]
+            
+            values = data[column].to_numpy(dtype=float)
+            vmin, vmax = np.percentile(values, [1, 99])
+            norm = plt.Normalize(vmin, vmax)
+            
+            fig, ax = plt.subplots(figsize=(16, min(2 + 1.4 * n_years, 16)))
+            im = ax.imshow(np.ma.masked_invalid(image), aspect='auto', cmap=HEATMAP_CMAP, norm=norm,
+                           interpolation='nearest')
+            
+            weekday_rows = [0, 2, 4, 6]
+            ax.set_yticks([k * 8 + r for k in range(n_years) for r in weekday_rows])
+            ax.set_yticklabels(['周一', '周三', '周五', '周日'] * n_years, fontsize=8)
+            for k, year in enumerate(years):
+                ax.text(-0.045, k * 8 + 3, str(year), transform=ax.get_yaxis_transform(), rotation=90,
+                        ha='right', va='center', fontsize=12, fontweight='bold')
+            
+            # 每月1日大约所在的周（各年相差不超过一周）
+            month_starts = pd.date_range('2001-01-01', periods=12, freq='MS').dayofyear.to_numpy()
+            ax.set_xticks((month_starts - 1) // 7)
+            ax.set_xticklabels([f'{m}月' for m in range(1, 13)])
+            ax.tick_params(axis='x', top=True, labeltop=True, bottom=False, labelbottom=False)
+            
+            # 每年最高和最低的一天
+            flat = grid.reshape(n_years, -1)
+            for k in np.flatnonzero(~np.isnan(flat).all(axis=1)):
+                for pos in (np.nanargmax(flat[k]), np.nanargmin(flat[k])):
+                    row, col = divmod(pos, grid.shape[2])
+                    value = flat[k, pos]
+                    ax.text(col, k * 8 + row, f'{value:.0f}', ha='center', va='center', fontsize=7,
+                            color='white' if norm(value) > 0.5 else 'black', fontweight='bold')
+            
+            cbar = plt.colorbar(im, ax=ax, extend='both')
+            cbar.set_label('客流量（万）')
+            name = '总客流' if column == 'total' else column
+            ax.set_title(f'{name}日历热力图（{data["date"].iloc[0]} ~ {data["date"].iloc[-1]}，'
+                         f'标注为每年最高/最低）', fontsize=14, fontweight='bold', pad=30)
+            plt.tight_layout()
+            
+            # 保存图片
+            os.makedirs('docs/images', exist_ok=True)
+            fig.savefig('docs/images/客流日历热力图.png', dpi=300, bbox_inches='tight')
+            plt.close(fig)
+            
+            logger.info("客流日历热力图已生成")
+            return fig
+            
+        except Exception as e:
+            logger.error(f"生成日历热力图时出错: {e}", exc_info=True)
+            return None
+
+    def plot_line_correlation(self, correlation):
+        """
+        绘制线路相关性图：左为按层次聚类排序的相关矩阵，右为各线路在不同窗口下与总客流的相关系数
+        
+        Args:
+            correlation: 已 fit 的 LineCorrelation
+        """
+        try:
+            self._ensure_font()
+            
+            window = correlation.heatmap_window
+            corr = correlation.clustered(window)
+            if len(corr) < 2:
+                logger.warning(f"历史数据不足{window}天，跳过线路相关性图")
+                return None
+            
+            labels = ['总客流' if s == 'total' else s for s in corr.index]
+            vs_total = pd.DataFrame({f'{w}天': correlation.latest(w)['total'] for w in correlation.windows})
+            vs_total = vs_total.drop(index='total').reindex([s for s in corr.index if s != 'total'])
+            # 历史短于窗口时该窗口没有数据
+            vs_total = vs_total.dropna(axis=1, how='all')
+            
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(18, 9), gridspec_kw={'width_ratios': [3, 1.2]})
+            norm = plt.Normalize(-1, 1)
+            self._draw_heatmap(ax1, corr.to_numpy(), labels, labels, '相关系数',
+                               cmap='RdBu_r', norm=norm, fmt='{:.2f}')
+            ax1.set_title(f'线路客流相关矩阵（最近{window}天，按层次聚类排序）', fontsize=14, fontweight='bold')
+            
+            self._draw_heatmap(ax2, vs_total.to_numpy(), list(vs_total.index), list(vs_total.columns),
+                               '相关系数', cmap='RdBu_r', norm=norm, fmt='{:.2f}')
+            ax2.tick_params(axis='x', rotation=0)
+            ax2.set_title('与总客流的相关系数', fontsize=14, fontweight='bold')
+            
+            date = str(correlation.dates[-1])
+            transform = '日环比' if correlation.transform == 'log_diff' else '客流量'
+            fig.suptitle(f'南京地铁线路客流联动分析（截至{date}，基于{transform}）', fontsize=16, fontweight='bold')
+            plt.tight_layout()
+            
+            # 保存图片
+            os.makedirs('docs/images', exist_ok=True)
+            fig.savefig('docs/images/线路相关性热力图.png', dpi=300, bbox_inches='tight')
+            plt.close(fig)
+            
+            logger.info("线路相关性热力图已生成")
+            return fig
+            
+        except Exception as e:
+            logger.error(f"生成线路相关性热力图时出错: {e}", exc_info=True)
+            return None
+
+    def plot_period_comparison(self, comparison):
+        """
+        绘制两个时段的对比图：左为各线路两个时段的日均客流（并排条形，标注变化百分比），
+        右为各线路占比的变化（百分点）
+        
+        Args:
+            comparison: PeriodComparison.to_json 的结果
+        """
+        try:
+            self._ensure_font()
+            
+            series = comparison['series']
+            lines = [line for line in self.data_collector.all_lines
+                     if line in series and (series[line]['base_mean'] is not None
+                                            or series[line]['current_mean'] is not None)]
+            if not lines:
+                logger.warning("对比时段内没有数据，跳过时段对比图")
+                return None
+            
+            base, current = comparison['base'], comparison['current']
+            base_label = f"{base['label']}（{base['from']}~{base['to']}）"
+            current_label = f"{current['label']}（{current['from']}~{current['to']}）"
+            
+            def values(key):
+                return np.array([np.nan if series[line][key] is None else series[line][key] for line in lines])
+            
+            base_mean, current_mean = values('base_mean'), values('current_mean')
+            delta_pct, share_shift = values('delta_pct'), values('share_shift_pp')
+            colors = [self.line_colors.get(line, '#CCCCCC') for line in lines]
+            y = np.arange(len(lines))
+            
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(18, max(6, 0.6 * len(lines) + 2)),
+                                           gridspec_kw={'width_ratios': [2, 1]}, sharey=True)
+            
+            # 1. 两个时段的日均客流（基期浅色、本期实色）
+            height = 0.38
+            ax1.barh(y - height / 2, np.nan_to_num(base_mean), height, color=colors, alpha=0.35,
+                     edgecolor='gray', label=base_label)
+            ax1.barh(y + height / 2, np.nan_to_num(current_mean), height, color=colors,
+                     edgecolor='black', linewidth=0.5, label=current_label)
+            right = np.nanmax(np.concatenate([base_mean, current_mean]))
+            for i, (value, pct) in enumerate(zip(current_mean, delta_pct)):
+                if np.isnan(value):
+                    continue
+                text = '新增' if np.isnan(pct) else f'{pct:+.1f}%'
+                color = 'gray' if np.isnan(pct) else ('#2ca02c' if pct >= 0 else '#d62728')
+                ax1.text(value + right * 0.01, i + height / 2, text, va='center', fontsize=9,
+                         color=color, fontweight='bold')
+            ax1.set_yticks(y)
+            ax1.set_yticklabels(lines)
+            ax1.invert_yaxis()
+            ax1.set_xlim(0, right * 1.15)
+            ax1.set_xlabel('日均客流量（万）')
+            ax1.legend(loc='lower right', fontsize=9)
+            ax1.grid(True, axis='x', alpha=0.3)
+            ax1.set_title('各线路日均客流', fontsize=14, fontweight='bold')
+            
+            # 2. 占比变化（百分点）
+            shift = np.nan_to_num(share_shift)
+            ax2.barh(y, shift, color=np.where(shift >= 0, '#2ca02c', '#d62728'), alpha=0.8)
+            ax2.axvline(0, color='black', linewidth=0.8)
+            for i, value in enumerate(share_shift):
+                if not np.isnan(value):
+                    ax2.text(value, i, f' {value:+.2f} ', va='center', fontsize=9,
+                             ha='left' if value >= 0 else 'right')
+            limit = max(np.nanmax(np.abs(share_shift)) if not np.isnan(share_shift).all() else 0, 0.1) * 1.4
+            ax2.set_xlim(-limit, limit)
+            ax2.set_xlabel('占比变化（百分点）')
+            ax2.grid(True, axis='x', alpha=0.3)
+            ax2.set_title('线路占比变化', fontsize=14, fontweight='bold')
+            
+            total = series.get('total', {})
+            summary = ''
+            if total.get('base_mean') is not None and total.get('current_mean') is not None:
+                summary = f"：日均总客流 {total['base_mean']:.1f}万 → {total['current_mean']:.1f}万"
+                if total.get('delta_pct') is not None:
+                    summary += f"（{total['delta_pct']:+.1f}%）"
+            fig.suptitle(f"{current['label']} vs {base['label']}{summary}", fontsize=16, fontweight='bold')
+            plt.tight_layout()
+            
+            # 保存图片
+            os.makedirs('docs/images', exist_ok=True)
+            fig.savefig('docs/images/时段对比图.png', dpi=300, bbox_inches='tight')
+            plt.close(fig)
+            
+            logger.info("时段对比图已生成")
+            return fig
+            
+        except Exception as e:
+            logger.error(f"生成时段对比图时出错: {e}", exc_info=True)
+            return None
+
+    def plot_anomalies(self, history_df, detector, alerts, n_days=90):
+        """绘制异常检测图：总客流及同星期几基线区间，标注各线路异常"""
+        try:
+            self._ensure_font()
+            
+            if history_df.empty:
+                logger.warning("没有历史数据，跳过异常检测图")
+                return None
+            
+            all_lines = self.data_collector.all_lines
+            full_matrix = detector.to_matrix(history_df, all_lines + ['total'])
+            mean, std, _ = detector.baseline(full_matrix.to_numpy())
+            matrix = full_matrix.iloc[-n_days:]
+            mean, std = mean[-len(matrix):, -1], std[-len(matrix):, -1]
+            dates = matrix.index
+            
+            start = dates[0].strftime('%Y-%m-%d')
+            recent = alerts[alerts['date'] >= start]
+            
+            fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(16, 10), sharex=True,
+                                           gridspec_kw={'height_ratios': [2, 1]})
+            
+            # 1. 总客流与基线区间
+            ax1.plot(dates, matrix['total'], 'b-', linewidth=1.8, label='总客流')
+            ax1.plot(dates, mean, color='gray', linestyle='--', linewidth=1, label='同星期几基线')
+            ax1.fill_between(dates, mean - detector.z_threshold * std, mean + detector.z_threshold * std,
+                             color='gray', alpha=0.2, label=f'±{detector.z_threshold:g}σ')
+            
+            total_alerts = recent[recent['line'] == 'total']
+            if not total_alerts.empty:
+                alert_dates = pd.to_datetime(total_alerts['date'])
+                ax1.scatter(alert_dates, total_alerts['value'], color='red', s=60, zorder=5, label='异常')
+            
+            ax1.set_ylabel('总客流量（万）')
+            ax1.set_title(f'最近{n_days}天总客流异常检测', fontsize=14, fontweight='bold')
+            ax1.legend(loc='upper left', fontsize=9)
+            ax1.grid(True, alpha=0.3)
+            
+            # 2. 各线路异常分布
+            markers = {'zscore': ('o', '偏离基线'), 'sudden_zero': ('x', '客流为0'),
+                       'missing_line': ('s', '数据缺失')}
+            line_alerts = recent[recent['line'] != 'total']
+            y_index = {line: i for i, line in enumerate(all_lines)}
+            for kind, (marker, label) in markers.items():
+                subset = line_alerts[line_alerts['type'] == kind]
+                if subset.empty:
+                    continue
+                ax2.scatter(pd.to_datetime(subset['date']), subset['line'].map(y_index),
+                            marker=marker, s=50, label=label,
+                            c=[self.line_colors.get(line, '#CCCCCC') for line in subset['line']],
+                            edgecolors='black', linewidths=0.5)
+            
+            ax2.set_yticks(range(len(all_lines)))
+            ax2.set_yticklabels(all_lines, fontsize=8)
+            ax2.set_ylim(-0.5, len(all_lines) - 0.5)
+            ax2.set_title(f'各线路异常（共{len(line_alerts)}条）', fontsize=12, fontweight='bold')
+            ax2.grid(True, alpha=0.3, axis='x')
+            if not line_alerts.empty:
+                ax2.legend(loc='upper left', fontsize=9)
+            
+            fig.autofmt_xdate()
+            plt.tight_layout()
+            
+            # 保存图片
+            os.makedirs('docs/images', exist_ok=True)
+            fig.savefig('docs/images/客流异常检测图.png', dpi=300, bbox_inches='tight')
+            plt.close(fig)
+            
+            logger.info("客流异常检测图已生成")
+            return fig
+            
+        except Exception as e:
+            logger.error(f"生成异常检测图时出错: {e}", exc_info=True)
+            return None
+
+    def plot_forecast(self, history_df, forecast, n_days=28):
+        """绘制总客流及各线路的未来几天预测（预测区间以阴影带表示）"""
+        try:
+            self._ensure_font()
+            
+            if history_df.empty or forecast.empty:
+                logger.warning("没有预测数据，跳过预测图")
+                return None
+            
+            recent = history_df.tail(n_days)
+            recent_dates = pd.to_datetime(recent['date'])
+            
+            fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(16, 12),
+                                           gridspec_kw={'height_ratios': [1, 1.4]})
+            
+            def draw(ax, column, color, label=None):
+                """历史实线 + 预测虚线 + 区间阴影"""
+                pred = forecast[forecast['series'] == column].dropna(subset=['yhat'])
+                if pred.empty:
+                    return
+                pred_dates = pd.to_datetime(pred['date'])
+                ax.plot(recent_dates, recent[column], color=color, linewidth=2, label=label)
+                # 预测线从最后一个实际值连出
+                ax.plot([recent_dates.iloc[-1]] + list(pred_dates),
+                        [recent[column].iloc[-1]] + list(pred['yhat']),
+                        color=color, linewidth=2, linestyle='--')
+                ax.fill_between(pred_dates, pred['lower'], pred['upper'], color=color, alpha=0.2)
+            
+            # 1. 总客流
+            draw(ax1, 'total', '#1f77b4', '总客流')
+            ax1.axvline(recent_dates.iloc[-1], color='gray', linestyle=':', linewidth=1)
+            ax1.set_ylabel('总客流量（万）')
+            horizon = forecast['date'].nunique()
+            ax1.set_title(f'南京地铁总客流趋势及未来{horizon}天预测', fontsize=14, fontweight='bold')
+            ax1.grid(True, alpha=0.3)
+            
+            # 2. 各线路
+            for line in self.data_collector.all_lines:
+                if line in recent.columns and recent[line].notna().any():
+                    draw(ax2, line, self.line_colors.get(line, '#CCCCCC'), line)
+            ax2.axvline(recent_dates.iloc[-1], color='gray', linestyle=':', linewidth=1)
+            ax2.set_ylabel('客流量（万）')
+            ax2.set_title(f'各线路客流趋势及未来{horizon}天预测（虚线为预测，阴影为预测区间）',
+                          fontsize=12, fontweight='bold')
+            ax2.legend(bbox_to_anchor=(1.02, 1), loc='upper left', fontsize=9)
+            ax2.grid(True, alpha=0.3)
+            
+            fig.autofmt_xdate()
+            plt.tight_layout()
+            
+            # 保存图片
+            os.makedirs('docs/images', exist_ok=True)
+            fig.savefig('docs/images/客流预测图.png', dpi=300, bbox_inches='tight')
+            plt.close(fig)
+            
+            logger.info("客流预测图已生成")
+            return fig
+            
+        except Exception as e:
+            logger.error(f"生成客流预测图时出错: {e}", exc_info=True)
+            return None
+
+def write_parse_quality(collector, writer: AtomicExportWriter) -> dict:
+    """导出解析质量统计（没有收集到数据时同样导出，便于发现数据源格式变化）"""
+    quality = collector.validator.metrics(collector.validation, collector.collect_stats)
+    writer.write_json(PARSE_QUALITY_FILE, quality, volatile_keys=('generated',), indent=2)
+    logger.info(f"解析质量: {quality['records_ok']}/{quality['records']} 条记录通过校验，"
+                f"线路覆盖率 {quality['line_coverage_pct']}%")
+    for problem in quality['problems'][:10]:
+        logger.warning(f"  {problem['date']}: {', '.join(problem['issues'])}"
+                       f"{'（缺失 ' + '、'.join(problem['missing']) + '）' if problem['missing'] else ''}")
+    if collector.collect_stats.get('page_errors'):
+        logger.warning(f"  {collector.collect_stats['page_errors']} 页数据获取失败")
+    return quality
+
+
+def save_archive(collector, writer: AtomicExportWriter) -> int:
+    """保存本次获取到的原始帖子（只追加新帖子和内容变化的帖子）"""
+    if collector.archive is None:
+        return 0
+    saved = collector.archive.save(writer)
+    logger.info(f"原始帖子归档: 新增 {saved} 条，共 {len(collector.archive)} 条")
+    return saved
+
+
+def open_history(collector, writer: AtomicExportWriter = None, load_records: bool = True):
+    """
+    加载全部历史数据：快照与 history.csv 一致时从快照热启动，否则解析CSV并重建快照
+    
+    Args:
+        collector: 采集器
+        writer: 导出写入器（重建快照时使用）
+        load_records: 是否用历史数据填充采集器的记录（已采集到新记录时为 False）
+    
+    Returns:
+        MetroHistoryStore: 历史数据
+    """
+    from history_store import HISTORY_FILE, MetroHistoryStore
+    
+    snapshot = collector.load_snapshot(HISTORY_FILE, records=load_records)
+    if snapshot is not None:
+        logger.info(f"从采集器快照热启动: {len(snapshot.full_dates)} 天")
+        return MetroHistoryStore.from_frame(snapshot.frame(), HISTORY_FILE, collector.all_lines)
+    store = MetroHistoryStore(HISTORY_FILE, collector.all_lines)
+    if load_records:
+        collector.load_history(store.df)
+    if not store.df.empty:
+        collector.save_snapshot(store.df, HISTORY_FILE, writer=writer)
+    return store
+
+
+def update_history(collector, writer: AtomicExportWriter, store=None):
+    """
+    合并到历史数据（报告分页、分析指标均基于历史数据），并重算线路运营强度指标
+    
+    Returns:
+        MetroHistoryStore: 合并后的历史数据
+    """
+    from history_matrix import HistoryMatrix
+    from line_metrics import LINE_METRICS_FILE, LineMetricsTable
+    
+    store = store or open_history(collector, writer, load_records=False)
+    new_days = store.merge_records(collector.passenger_records)
+    store.save(writer)
+    logger.info(f"历史数据新增 {new_days} 天，共 {len(store.df)} 天")
+    
+    # 同步二进制历史数据（只追加新增的天），之后按天数取数据直接从内存映射切片
+    mode = HistoryMatrix().sync(store.df, store.lines, writer)
+    collector.open_history_matrix()
+    logger.info(f"二进制历史数据: {mode}")
+    # 采集器快照与刚写入的历史数据对应，之后只读历史数据的进程（导出、绘图、查询API）直接热启动
+    collector.save_snapshot(store.df, store.path, writer=writer)
+    
+    # 线路运营强度指标（全部历史一次计算，导出和报告共用；趋势图按插补后的最近n天单独计算）
+    line_metrics = LineMetricsTable(store.df, collector.line_config)
+    writer.write_json(LINE_METRICS_FILE, line_metrics.to_json(), indent=2)
+    return store
+
+
+def chart_tasks(visualizer: 'NanjingSubwayVisualizer', n_days: int = 7, store=None, fitted=None) -> list:
+    """
+    全部图表任务：(名称, 开始提示, 绘图函数, 参数, 完成提示)
+    
+    Args:
+        n_days: 趋势图和仪表板的天数
+        store: 历史数据，为 None 时不包含基于全部历史的异常检测图和预测图，趋势图也不画预测
+        fitted: fit_forecast 的结果（与导出共用），为 None 时在第一次需要时拟合一次
+    """
+    config = visualizer.data_collector.config
+    shared = {'forecast': fitted}
+    
+    def prediction():
+        """趋势图和预测图共用同一次拟合"""
+        if shared['forecast'] is None and store is not None:
+            shared['forecast'] = fit_forecast(config, store)
+        return shared['forecast'][1] if shared['forecast'] else None
+    
+    def trend():
+        return visualizer.plot_last_n_days_line_trend(n_days, prediction())
+    
+    tasks = [
+        ("proportion", "1. 正在绘制改进的昨日客流线路占比图...",
+         visualizer.plot_latest_line_proportion_improved, (), "  改进的饼图已保存"),
+        ("compact_pie", "2. 正在绘制紧凑型饼图...", visualizer.plot_compact_pie_chart, (), "  紧凑型饼图已保存"),
+        ("trend", f"3. 正在绘制最近{n_days}天站点客流强度变化趋势图...",
+         trend, (), "  站点客流强度趋势图已保存"),
+        ("dashboard", "4. 正在绘制综合分析仪表板...",
+         visualizer.plot_comprehensive_analysis, (n_days,), "  综合分析仪表板已保存"),
+    ]
+    if store is None:
+        return tasks
+    
+    def anomalies():
+        from anomaly_detection import RidershipAnomalyDetector
+        detector = RidershipAnomalyDetector.from_config(config)
+        return visualizer.plot_anomalies(store.df, detector, detector.detect(store.df, store.lines))
+    
+    def forecast():
+        if prediction() is None:
+            logger.info("  历史数据不足14天，跳过预测图")
+            return None
+        return visualizer.plot_forecast(store.df, prediction())
+    
+    def correlation():
+        from aggregation import HOLIDAY_FILE, HolidayCalendar
+        from correlation import LineCorrelation
+        calendar = HolidayCalendar.load(config.get('analytics', {}).get('holidays_file', HOLIDAY_FILE))
+        fitted = LineCorrelation.from_config(config).fit(store.df, ['total'] + store.lines, calendar)
+        return visualizer.plot_line_correlation(fitted)
+    
+    def comparison():
+        from period_comparison import PeriodComparison, PeriodIndex
+        comparer = PeriodComparison.from_config(config)
+        index = PeriodIndex.from_history(store.df, ['total'] + store.lines)
+        if index.end is None:
+            return None
+        base, current = comparer.default_periods(index)
+        return visualizer.plot_period_comparison(comparer.to_json(base, current, comparer.compare(index, base, current)))
+    
+    tasks += [
+        ("anomalies", "5. 正在绘制客流异常检测图...", anomalies, (), "  异常检测图已保存"),
+        ("forecast", "6. 正在绘制客流预测图...", forecast, (), "  客流预测图已保存"),
+        ("calendar", "7. 正在绘制客流日历热力图...",
+         visualizer.plot_calendar_heatmap, (store.df,), "  日历热力图已保存"),
+        ("correlation", "8. 正在绘制线路相关性热力图...", correlation, (), "  线路相关性热力图已保存"),
+        ("comparison", "9. 正在绘制时段对比图...", comparison, (), "  时段对比图已保存"),
+    ]
+    return tasks
+
+
+CHART_NAMES = ('proportion', 'compact_pie', 'trend', 'dashboard', 'anomalies', 'forecast', 'calendar',
+               'correlation', 'comparison')
+
+
+def render_charts(visualizer: 'NanjingSubwayVisualizer', n_days: int = 7, store=None, names=None,
+                  fitted=None) -> int:
+    """
+    绘制图表，返回成功生成的数量
+    
+    Args:
+        n_days: 趋势图和仪表板的天数
+        store: 历史数据，提供时同时绘制异常检测图和预测图
+        names: 只绘制指定名称的图表（见 CHART_NAMES），默认全部
+        fitted: fit_forecast 的结果（与 run_analytics 共用），为 None 时按需拟合
+    """
+    charts = [task[1:] for task in chart_tasks(visualizer, n_days, store, fitted)
+              if names is None or task[0] in names]
+    rendered = 0
+    for start_msg, plot, args, done_msg in charts:
+        logger.info(start_msg)
+        if plot(*args):
+            logger.info(done_msg)
+            rendered += 1
+    return rendered
+
+
+def export_latest(collector, store, writer: AtomicExportWriter, n_days: int = 7):
+    """导出最近 n_days 天CSV/JSON和列式历史数据"""
+    from columnar_export import export_history_columnar
+    
+    latest_date = collector.get_latest_date()
+    total = collector.get_latest_data()['passenger_data'].get('总客流量', 0)
+    
+    # 保存数据到文件
+    df = collector.get_last_n_days_line_data(n_days)
+    if not df.empty:
+        # 保存为CSV
+        writer.write_csv('docs/data/最近7天客流数据.csv', df, encoding='utf-8-sig')
+        
+        # 保存为JSON（便于网页直接读取）
+        json_data = {
+            'latest_date': latest_date,
+            'latest_total': float(total),
+            'data': df.to_dict('records'),
+            'update_time': datetime.now().isoformat(),
+            'line_info': {}
+        }
+        
+        # 添加线路站点信息
+        for line in collector.all_lines:
+            info = collector.get_line_info(line)
+            json_data['line_info'][line] = {
+                'stations': info.get('stations', 0),
+                'color': info.get('color', '#CCCCCC'),
+                'description': info.get('description', '')
+            }
+        
+        writer.write_json('docs/data/latest_data.json', json_data,
+                          volatile_keys=('update_time',), indent=2)
+        
+        logger.info("数据已保存为CSV和JSON格式")
+    
+    # 导出列式历史数据（按年分区，便于下游直接读取）
+    parquet_files = export_history_columnar(store.df, store.lines, fmt='parquet', writer=writer)
+    if parquet_files:
+        logger.info(f"Parquet历史数据已导出: {len(parquet_files)} 个年份分区")
+
+
+def fit_forecast(config: Dict, store) -> Optional[tuple]:
+    """
+    拟合未来几天的客流预测（趋势 + 星期几季节项，全部线路一次求解），绘图和导出共用一次拟合
+
+    Returns:
+        tuple: (forecaster, prediction)，历史数据不足14天时返回 None
+    """
+    from forecast import SeasonalForecaster
+    if len(store.df) < 14:
+        return None
+    forecaster = SeasonalForecaster.from_config(config).fit(store.df, ['total'] + store.lines)
+    return forecaster, forecaster.predict()
+
+
+def run_analytics(collector, store, writer: AtomicExportWriter, fitted=None):
+    """
+    基于全部历史的分析结果导出：异常检测、聚合、滚动统计、预测、线路相关性、时段对比、数据完整性（图表见 chart_tasks）
+
+    Args:
+        fitted: fit_forecast 的结果（与绘图共用），为 None 时在这里拟合
+    """
+    from anomaly_detection import ANOMALY_FILE, RidershipAnomalyDetector
+    from aggregation import AGGREGATES_FILE, RidershipAggregator
+    from rolling_stats import ROLLING_STATS_FILE, IncrementalRollingStats, verify
+    from forecast import FORECAST_FILE
+    from correlation import CORRELATION_FILE, LineCorrelation
+    from period_comparison import COMPARISON_FILE, PeriodComparison, PeriodIndex
+    from completeness import COMPLETENESS_FILE, GapFiller
+    
+    # 5. 异常检测（同星期几基线）
+    logger.info("5. 正在进行客流异常检测...")
+    detector = RidershipAnomalyDetector.from_config(collector.config)
+    alerts = detector.detect(store.df, store.lines)
+    writer.write_json(ANOMALY_FILE, detector.to_json(alerts), indent=2)
+    logger.info(f"  检测到 {len(alerts)} 条异常（历史全部），已导出最近{detector.export_days}天")
+    
+    # 6. 星期几/节假日聚合及周、年同比
+    aggregator = RidershipAggregator.from_config(store.df, store.lines, collector.config)
+    writer.write_json(AGGREGATES_FILE, aggregator.summary(), indent=2)
+    latest_cmp = aggregator.same_weekday_comparison()
+    if latest_cmp:
+        total_cmp = latest_cmp['series']['total']
+        logger.info(f"6. {latest_cmp['date']}（{latest_cmp['weekday']}，{latest_cmp['day_type']}）"
+                    f"较上周同日: {total_cmp['last_week_pct']}%")
+    
+    # 7. 7/30/90天滚动统计（增量更新，状态在运行间保存）
+    rolling = IncrementalRollingStats.load_or_build(store.df, ['total'] + store.lines)
+    error = verify(rolling, store.df)
+    if error > 1e-6:
+        logger.warning(f"  滚动统计增量结果与全量计算不一致（最大误差 {error:.4g}），已全量重建")
+        rolling = IncrementalRollingStats.from_history(store.df, ['total'] + store.lines)
+    rolling.save(writer=writer)
+    writer.write_json(ROLLING_STATS_FILE, rolling.to_json(), indent=2)
+    logger.info(f"7. 滚动统计已更新至 {rolling.last_date.date() if rolling.last_date is not None else 'N/A'}")
+    
+    # 8. 未来7天客流预测（趋势 + 星期几季节项，全部线路一次求解）
+    logger.info("8. 正在预测未来客流...")
+    fitted = fitted or fit_forecast(collector.config, store)
+    if fitted:
+        forecaster, forecast = fitted
+        writer.write_json(FORECAST_FILE, forecaster.to_json(forecast), indent=2)
+    else:
+        logger.info("  历史数据不足14天，跳过预测")
+    
+    # 9. 线路间及线路与总客流的滚动相关性（各窗口一次向量化计算，绘图时复用缓存）
+    correlation = LineCorrelation.from_config(collector.config).fit(
+        store.df, ['total'] + store.lines, aggregator.calendar)
+    result = correlation.to_json()
+    writer.write_json(CORRELATION_FILE, result, indent=2)
+    strongest = result['windows'][str(correlation.heatmap_window)]['strongest']
+    if strongest:
+        pair = strongest[0]
+        logger.info(f"9. 最近{correlation.heatmap_window}天联动最强: {pair['a']} 与 {pair['b']}（r={pair['r']}）")
+    
+    # 10. 默认时段对比：最近几天 vs 去年同期（前缀和索引，任意范围两次相减）
+    comparer = PeriodComparison.from_config(collector.config)
+    index = PeriodIndex.from_history(store.df, ['total'] + store.lines)
+    base, current = comparer.default_periods(index)
+    comparison = comparer.to_json(base, current, comparer.compare(index, base, current))
+    writer.write_json(COMPARISON_FILE, comparison, indent=2)
+    total_cmp = comparison['series']['total']
+    logger.info(f"10. {current[0]}~{current[1]} 较 {base[0]}~{base[1]} 日均总客流: {total_cmp['delta_pct']}%")
+    
+    # 11. 数据完整性：按完整日历标记漏掉的天和未解析到的线路，并按配置的方式插补（一次向量化计算）
+    filler = GapFiller.from_config(collector.config)
+    completeness = filler.fill(store.df, store.lines, collector.line_config).to_json(filler.export_days)
+    writer.write_json(COMPLETENESS_FILE, completeness, indent=2)
+    if completeness:
+        methods = completeness['methods']
+        logger.info(f"11. {completeness['calendar_days']} 天中整天缺失 {completeness['gap_days']} 天，"
+                    f"缺失 {completeness['missing_cells']} 格（占比 {methods['share']}，同星期几 {methods['weekday_median']}，"
+                    f"插值 {methods['interpolate']}，未补 {methods['unfilled']}）")
+
+
 def main():
     """主函数"""
     logger.info("开始收集南京地铁客流数据...")
     
+    lock = None
     try:
         # 初始化数据收集器
         collector = NanjingSubwayDataCollector("config.json")
         
+        # 写入锁：定时任务、手动运行和 daemon 可能重叠，同一时间只有一个进程采集并写入 docs/data
+        lock = WriterLock.from_config(collector.config)
+        lock.acquire()
+        
         # 收集数据
         passenger_records = collector.collect_data()
         
         logger.info(f"共收集到 {len(passenger_records)} 条客流记录")
         
+        # 导出写入器（临时文件+原子重命名，内容未变化时跳过）
+        writer = AtomicExportWriter()
+        save_archive(collector, writer)
+        write_parse_quality(collector, writer)
+        
         if passenger_records:
             latest_date = collector.get_latest_date()
             latest_data = collector.get_latest_data()
@@ -569,67 +1345,23 @@ def main():
             
             # 显示线路信息
             logger.info("=== 线路配置信息 ===")
-            for line in collector.all_lines:
-                info = collector.get_line_info(line)
+            latest_full_date = latest_data.get('full_date')
+            for line in collector.get_active_lines():
+                info = collector.get_line_info(line, latest_full_date)
                 stations = info.get('stations', 'N/A')
                 logger.info(f"{line}: {stations}站 - {info.get('description', '')}")
             
+            store = update_history(collector, writer)
+            
             # 初始化可视化器
             visualizer = NanjingSubwayVisualizer(collector)
+            # 预测只拟合一次，趋势图、预测图和 forecast.json 共用
+            fitted = fit_forecast(collector.config, store)
+            chart_count = render_charts(visualizer, store=store, fitted=fitted)
+            export_latest(collector, store, writer)
+            run_analytics(collector, store, writer, fitted)
             
-            # 1. 绘制改进的昨日客流线路占比图
-            logger.info("1. 正在绘制改进的昨日客流线路占比图...")
-            fig1 = visualizer.plot_latest_line_proportion_improved()
-            if fig1:
-                logger.info("  改进的饼图已保存")
-            
-            # 2. 绘制紧凑型饼图（适合小屏幕）
-            logger.info("2. 正在绘制紧凑型饼图...")
-            fig2 = visualizer.plot_compact_pie_chart()
-            if fig2:
-                logger.info("  紧凑型饼图已保存")
-            
-            # 3. 绘制最近7天站点客流强度变化趋势图
-            logger.info("3. 正在绘制最近7天站点客流强度变化趋势图...")
-            fig3 = visualizer.plot_last_n_days_line_trend(7)
-            if fig3:
-                logger.info("  站点客流强度趋势图已保存")
-            
-            # 4. 绘制综合分析仪表板
-            logger.info("4. 正在绘制综合分析仪表板...")
-            fig4 = visualizer.plot_comprehensive_analysis(7)
-            if fig4:
-                logger.info("  综合分析仪表板已保存")
-            
-            # 保存数据到文件
-            os.makedirs('docs/data', exist_ok=True)
-            df = collector.get_last_n_days_line_data(7)
-            if not df.empty:
-                # 保存为CSV
-                df.to_csv('docs/data/最近7天客流数据.csv', index=False, encoding='utf-8-sig')
-                
-                # 保存为JSON（便于网页直接读取）
-                json_data = {
-                    'latest_date': latest_date,
-                    'latest_total': float(total),
-                    'data': df.to_dict('records'),
-                    'update_time': datetime.now().isoformat(),
-                    'line_info': {}
-                }
-                
-                # 添加线路站点信息
-                for line in collector.all_lines:
-                    info = collector.get_line_info(line)
-                    json_data['line_info'][line] = {
-                        'stations': info.get('stations', 0),
-                        'color': info.get('color', '#CCCCCC'),
-                        'description': info.get('description', '')
-                    }
-                
-                with open('docs/data/latest_data.json', 'w', encoding='utf-8') as f:
-                    json.dump(json_data, f, ensure_ascii=False, indent=2)
-                
-                logger.info("数据已保存为CSV和JSON格式")
+            writer.log_summary()
             
             logger.info("分析完成！")
             
@@ -639,8 +1371,8 @@ def main():
             print("="*60)
             print(f"📅 最新数据日期: {latest_date}")
             print(f"👥 总客流量: {total:.1f}万")
-            print(f"📊 生成图表数: 4张")
-            print(f"📈 图表类型: 饼图、紧凑型饼图、站点客流强度趋势图、综合分析仪表板")
+            print(f"📊 生成图表数: {chart_count}张（共{len(CHART_NAMES)}种）")
+            print(f"📈 图表类型: 饼图、紧凑型饼图、站点客流强度趋势图、综合分析仪表板、异常检测图、客流预测图、日历热力图、线路相关性热力图、时段对比图")
             print(f"💾 数据文件: 最近7天客流数据.csv")
             print(f"💾 JSON文件: latest_data.json")
             print("="*60)
@@ -655,6 +1387,9 @@ def main():
         logger.error(f"运行过程中发生错误: {e}", exc_info=True)
         print(f"❌ 运行出错: {e}")
         raise
+    finally:
+        if lock is not None:
+            lock.release()
 
 if __name__ == "__main__":
     main()
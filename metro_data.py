@@ -1,20 +1,54 @@
-import requests
 import re
 import json
-from typing import Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
-import pandas as pd
+from line_config import VersionedLineConfig
+from parse_validation import ParseValidator
+from data_sources import DataSource, create_source
+
+# pandas 只在需要 DataFrame 的方法中导入，纯采集不加载
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# 解析阶段的计数
+PARSE_COUNTERS = ("posts", "relevant_posts", "no_date", "no_data")
+# 微博发布时间中的月份缩写
+MONTH_ABBRS = {name: i for i, name in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
 
 
 class NanjingSubwayDataCollector:
     """南京地铁数据收集器"""
     
-    def __init__(self, config_file: str = "config.json"):
+    def __init__(self, config_file: str = "config.json", source: Optional[DataSource] = None,
+                 config: Optional[Dict] = None):
         self.passenger_records = []
-        self.line_data = {}
-        self.config = self.load_config(config_file)
+        self._line_data = {}
+        # 多线网采集时直接传入各线网的配置
+        self.config = config if config is not None else self.load_config(config_file)
         self.all_lines = [line["name"] for line in self.config["lines"]]
         self.line_info = {line["name"]: line for line in self.config["lines"]}
+        # 解析规则（帖子筛选关键词、线路/总数/日期正则），默认为南京地铁的格式
+        parser = self.config.get("parser", {})
+        self.relevance_keywords = parser.get("relevance_keywords", ["客流", "南京地铁"])
+        line_template = parser.get("line_pattern", r"{line}\s*(\d+(?:\.\d+)?)")
+        self.line_patterns = {line: re.compile(line_template.replace("{line}", re.escape(line)))
+                              for line in self.all_lines}
+        self.total_pattern = re.compile(parser.get("total_pattern", r"客运量\s*(\d+(?:\.\d+)?)"))
+        self.date_pattern = re.compile(parser.get("date_pattern", r"(\d{1,2})月(\d{1,2})日"))
+        # 按日期分版本的线路配置（开通日期、站点数变化等）
+        self.line_config = VersionedLineConfig(self.config["lines"])
+        # 解析结果校验及本次运行的采集计数
+        self.validator = ParseValidator.from_config(self.config, self.line_config)
+        self.collect_stats = {}
+        self.validation = None
+        # 数据源（微博 / 本地文件 / 内存），由 config.json 的 data_source.type 选择
+        self.source = source or create_source(self.config)
+        # 二进制历史数据（np.memmap），打开后最近n天数据直接从矩阵切片
+        self.history_matrix = None
+        # 原始帖子归档（collect_data 时按 config.json 的 archive 段打开）
+        self.archive = None
     
     def load_config(self, config_file: str) -> Dict:
         """加载配置文件"""
@@ -47,6 +81,7 @@ class NanjingSubwayDataCollector:
                 {"name": "S9号线", "color": "#00BFFF"}
             ],
             "data_source": {
+                "type": "weibo",
                 "weibo_user_id": "2638276292",
                 "search_keyword": "昨日客流",
                 "max_pages": 10
@@ -57,42 +92,6 @@ class NanjingSubwayDataCollector:
             }
         }
     
-    def search_weibo(self, page: int) -> dict:
-        """
-        搜索微博数据
-        
-        Args:
-            page: 页码
-            
-        Returns:
-            dict: 返回的JSON数据
-        """
-        headers = {
-            "Accept": "application/json, text/plain, */*",
-            "Accept-Encoding": "gzip, deflate, br, zstd",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
-            "Client-Version": "v2.47.142",
-            "Cookie": "XSRF-TOKEN=dPJyf43qgrCE7oU0r4KZK2Ya; ariaDefaultTheme=default; ariaFixed=true; ariaReadtype=1; ariaMouseten=null; ariaStatus=false; SCF=Aq-c9YP3yXfiDqh9zXt5_kpDe7HMxnxDWXB_OEknXWQPyc-YXQfU4gzOdOjDf6gqI-S_qQUh20JmwSpVLcsXcT4.; SUB=_2A25ES4Z-DeRhGe5M4lIR8ijMyTqIHXVnKIe2rDV8PUNbmtAYLXfEkW9NdKSSYXrL569k38XkwoWjJk2-fG2pmuSJ; SUBP=0033WrSXqPxfM725Ws9jqgMF55529P9D9W5kZs3mN9X52i3GwiBiSw_G5NHD95QReo.7ehzcehzcWs4DqcjMi--NiK.Xi-2Ri--ciKnRi-zN1hz4eh5ESo5ESntt; ALF=02_1769440046; WBPSESS=krzeCBEgQh8TvPwaITf8yZ3XMZnkBuzLNUry0NLOIzWJSMDmQhlriF2HX6nC_FqvcPUpEdYaGj8QtopYstgpSUUgiqFEDtDoQ0suh3Lp0dIBrdF10iLSQyFOsGz_PuYyzzeT3ZkIpkzRcnKPbArOWA==; _s_tentry=passport.weibo.com; Apache=5652403287654.71.1766848028206; SINAGLOBAL=5652403287654.71.1766848028206; ULV=1766848028209:1:1:1:5652403287654.71.1766848028206;",
-            "Referer": "https://weibo.com/u/2638276292?tabtype=feed",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-origin",
-            "Server-Version": "v2025.12.26.3",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36 Edg/143.0.0.0",
-            "X-Requested-With": "XMLHttpRequest",
-            "x-xsrf-token": "dPJyf43qgrCE7oU0r4KZK2Ya"
-        }
-        
-        params = {
-            "uid": self.config["data_source"]["weibo_user_id"],
-            "page": page,
-            "q": self.config["data_source"]["search_keyword"]
-        }
-        
-        url = "https://weibo.com/ajax/statuses/searchProfile?"
-        
-        return requests.get(url, headers=headers, params=params).json()
-    
     def extract_passenger_data(self, text: str) -> Optional[Dict[str, float]]:
         """
         从文本中提取客流数据
@@ -103,18 +102,10 @@ class NanjingSubwayDataCollector:
         Returns:
             Optional[Dict[str, float]]: 线路到客流量的字典，如果提取失败返回None
         """
-        # 动态生成线路正则表达式模式
-        line_patterns = {}
-        for line in self.all_lines:
-            # 处理线路名称中的数字和字母
-            line_name_clean = line.replace("号线", "")
-            pattern = rf'{line.replace("号线", "号线")}\s*(\d+(?:\.\d+)?)'
-            line_patterns[line] = pattern
-        
         passenger_data = {}
         
-        for line_name, pattern in line_patterns.items():
-            match = re.search(pattern, text)
+        for line_name, pattern in self.line_patterns.items():
+            match = pattern.search(text)
             if match:
                 try:
                     passenger_data[line_name] = float(match.group(1))
@@ -132,8 +123,7 @@ class NanjingSubwayDataCollector:
                     passenger_data[line_name] = None
         
         # 提取总客流量（如果有）
-        total_pattern = r'客运量\s*(\d+(?:\.\d+)?)'
-        total_match = re.search(total_pattern, text)
+        total_match = self.total_pattern.search(text)
         if total_match:
             try:
                 passenger_data["总客流量"] = float(total_match.group(1))
@@ -153,8 +143,7 @@ class NanjingSubwayDataCollector:
             Optional[str]: 格式为"MM-DD"的日期字符串，如果提取失败返回None
         """
         # 匹配"X月X日"的格式
-        date_pattern = r'(\d{1,2})月(\d{1,2})日'
-        match = re.search(date_pattern, text)
+        match = self.date_pattern.search(text)
         
         if match:
             month = match.group(1).zfill(2)
@@ -163,63 +152,378 @@ class NanjingSubwayDataCollector:
         
         return None
     
-    def collect_data(self) -> List[Dict]:
+    def extract_full_date(self, date_str: str, created_at: str = "") -> Optional[str]:
         """
-        收集南京地铁客流数据
+        根据微博发布时间补全年份
+        
+        Args:
+            date_str: "MM-DD"格式的日期
+            created_at: 微博发布时间，如"Sat Dec 27 08:00:02 +0800 2025"
+            
+        Returns:
+            Optional[str]: 格式为"YYYY-MM-DD"的日期字符串，如果补全失败返回None
+        """
+        posted_year, posted_month, posted_day = self.posted_date(created_at)
+        
+        try:
+            month, day = (int(part) for part in date_str.split('-'))
+            year = posted_year
+            # 1月初发布的是上一年12月的数据
+            if (month, day) > (posted_month, posted_day):
+                year -= 1
+            datetime(year, month, day)  # 校验日期是否存在
+            return f"{year:04d}-{month:02d}-{day:02d}"
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def posted_date(created_at: str) -> Tuple[int, int, int]:
+        """
+        微博发布时间的 (年, 月, 日)，无法解析时为今天
         
+        标准格式直接按空格拆分（strptime 约占整条帖子解析耗时的一半），其他格式再用 strptime
+        """
+        parts = created_at.split()
+        if len(parts) == 6 and parts[1] in MONTH_ABBRS and parts[2].isdigit() and parts[5].isdigit():
+            return int(parts[5]), MONTH_ABBRS[parts[1]], int(parts[2])
+        try:
+            posted = datetime.strptime(created_at, "%a %b %d %H:%M:%S %z %Y") if created_at else datetime.now()
+        except ValueError:
+            posted = datetime.now()
+        return posted.year, posted.month, posted.day
+    
+    def parse_post(self, item: Dict) -> Optional[Dict]:
+        """
+        解析单条帖子
+        
+        Args:
+            item: 微博格式的帖子（text_raw、created_at）
+            
         Returns:
-            List[Dict]: 包含日期和客流数据的字典列表
+            Optional[Dict]: 客流记录；非客流帖子或解析失败时返回None
+        """
+        text = item.get('text_raw', '')
+        date_str = self.extract_date(text)
+        passenger_data = self.extract_passenger_data(text)
+        if not (date_str and passenger_data):
+            return None
+        return {
+            "date": date_str,
+            "full_date": self.extract_full_date(date_str, item.get('created_at', '')),
+            "passenger_data": passenger_data,
+            "raw_text": text[:100]
+        }
+    
+    def iter_pages(self, stats: Dict) -> Iterator[List[Dict]]:
+        """
+        逐页从数据源获取帖子（出错的页记录到 stats 后跳过）
+        
+        Args:
+            stats: 采集计数，就地累加
         """
-        passenger_records = []
-        max_pages = self.config["data_source"].get("max_pages", 10)
+        for key in PARSE_COUNTERS + ("pages", "page_errors"):
+            stats.setdefault(key, 0)
+        stats.setdefault("errors", [])
+        stats["source"] = self.source.name
         
-        for page in range(1, max_pages):
+        for page in self.source.page_numbers():
+            stats["pages"] += 1
             try:
-                response = self.search_weibo(page)
-                
-                if 'data' in response and 'list' in response['data']:
-                    for item in response['data']['list']:
-                        text = item.get('text_raw', '')
-                        
-                        # 跳过非客流相关的内容
-                        if '客流' not in text or '南京地铁' not in text:
-                            continue
-                        
-                        # 提取日期
-                        date_str = self.extract_date(text)
-                        
-                        # 提取客流数据
-                        passenger_data = self.extract_passenger_data(text)
-                        
-                        if date_str and passenger_data:
-                            record = {
-                                "date": date_str,
-                                "passenger_data": passenger_data,
-                                "raw_text": text[:100]
-                            }
-                            passenger_records.append(record)
-                            
-                print(f"已处理第 {page} 页数据")
-                
+                posts = self.source.fetch_page(page)
             except Exception as e:
                 print(f"处理第 {page} 页数据时出错: {e}")
+                stats["page_errors"] += 1
+                stats["errors"].append(f"第 {page} 页: {type(e).__name__}: {e}")
                 continue
+            if posts is None:
+                break
+            if self.archive is not None:
+                self.archive.add(posts)
+            yield posts
+            print(f"已处理第 {page} 页数据")
+    
+    def parse_batch(self, posts: List[Dict], counts: Optional[Dict] = None) -> List[Dict]:
+        """
+        解析一批帖子，跳过非客流相关的内容
+        
+        Args:
+            posts: 微博格式的帖子
+            counts: 解析计数（posts、relevant_posts、no_date、no_data），就地累加
+            
+        Returns:
+            List[Dict]: 解析成功的记录，顺序与帖子相同
+        """
+        if counts is None:
+            counts = {}
+        for key in PARSE_COUNTERS:
+            counts.setdefault(key, 0)
+        
+        records = []
+        for item in posts:
+            counts["posts"] += 1
+            text = item.get('text_raw', '')
+            
+            # 跳过非客流相关的内容
+            if not all(keyword in text for keyword in self.relevance_keywords):
+                continue
+            counts["relevant_posts"] += 1
+            
+            record = self.parse_post(item)
+            if record:
+                records.append(record)
+            elif not self.extract_date(text):
+                counts["no_date"] += 1
+            else:
+                counts["no_data"] += 1
+        return records
+    
+    def iter_records(self, stats: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        逐页从数据源获取帖子并逐条产出客流记录（流式处理入口）
+        
+        Args:
+            stats: 采集计数，就地累加（页数、帖子数、解析失败数、错误信息）
+        """
+        if stats is None:
+            stats = {}
+        for posts in self.iter_pages(stats):
+            yield from self.parse_batch(posts, stats)
+    
+    def parse_posts(self, posts: List[Dict], jobs: int = 1, chunk_size: int = 20000,
+                    counts: Optional[Dict] = None) -> List[Dict]:
+        """
+        批量解析帖子（大批量回填时用进程池并行）
+        
+        帖子按 chunk_size 分块交给子进程解析，各块的结果按块的顺序拼接，再按日期从新到旧
+        稳定排序，结果与 jobs 无关
+        
+        Args:
+            posts: 微博格式的帖子
+            jobs: 进程数，1 表示在当前进程中解析
+            chunk_size: 每块的帖子数
+            counts: 解析计数，就地累加
+            
+        Returns:
+            List[Dict]: 客流记录（最新日期在前，日期相同时保持帖子顺序）
+        """
+        if counts is None:
+            counts = {}
+        bounds = [(i, min(i + chunk_size, len(posts))) for i in range(0, len(posts), chunk_size)]
+        if jobs > 1 and len(bounds) > 1:
+            results = self._parse_in_pool(posts, bounds, jobs)
+        else:
+            results = [(self.parse_batch(posts[lo:hi], counts), {}) for lo, hi in bounds]
+        
+        records = []
+        for chunk_records, chunk_counts in results:
+            records.extend(chunk_records)
+            for key, value in chunk_counts.items():
+                counts[key] = counts.get(key, 0) + value
+        return self._newest_first(records)
+    
+    @staticmethod
+    def _newest_first(records: List[Dict]) -> List[Dict]:
+        """按日期从新到旧稳定排序（日期相同时保持帖子顺序），串行和并行解析的记录顺序一致"""
+        records.sort(key=lambda record: record.get('full_date') or '', reverse=True)
+        return records
+    
+    def _parse_in_pool(self, posts: List[Dict], bounds: List[Tuple[int, int]], jobs: int) -> List[Tuple[List[Dict], Dict]]:
+        """
+        在进程池中解析各块帖子，结果按块的顺序返回
+        
+        支持 fork 时子进程直接继承父进程中的帖子列表，只传递各块的起止位置；
+        否则只传帖子的文本和发布时间，减少序列化的数据量
+        """
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        
+        global _parse_posts
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context, _parse_posts = multiprocessing.get_context('fork'), posts
+            tasks = bounds
+        else:
+            context = multiprocessing.get_context()
+            tasks = [[(post.get('text_raw', ''), post.get('created_at', '')) for post in posts[lo:hi]]
+                     for lo, hi in bounds]
+        try:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)), mp_context=context,
+                                     initializer=_init_parse_worker, initargs=(self.config,)) as executor:
+                return list(executor.map(_parse_chunk, tasks))
+        finally:
+            _parse_posts = None
+    
+    def collect_data(self, parse_jobs: int = 1) -> List[Dict]:
+        """
+        收集南京地铁客流数据
+        
+        Args:
+            parse_jobs: 解析进程数；大于1时先获取全部帖子，再用 parse_posts 并行解析（用于大批量回填）
+        
+        Returns:
+            List[Dict]: 包含日期和客流数据的字典列表（最新日期在前，与 parse_jobs 无关）
+        """
+        stats = {}
+        self.open_archive()
+        if parse_jobs > 1:
+            posts = [post for page in self.iter_pages(stats) for post in page]
+            passenger_records = self.parse_posts(posts, parse_jobs, counts=stats)
+        else:
+            passenger_records = self._newest_first(list(self.iter_records(stats)))
+        return self._set_records(passenger_records, stats)
+    
+    def open_archive(self):
+        """按 config.json 的 archive 段打开原始帖子归档（enabled 为 false 时不归档）"""
+        params = self.config.get("archive", {})
+        if self.archive is None and params.get("enabled", False):
+            from post_archive import PostArchive
+            self.archive = PostArchive.from_config(self.config)
+        return self.archive
+    
+    def reparse_archive(self, parse_jobs: int = 1, start: str = None, end: str = None) -> List[Dict]:
+        """
+        用当前的解析规则重新解析归档中的全部帖子（不访问数据源）
+        
+        Args:
+            parse_jobs: 解析进程数
+            start: 起始发布日期（含），默认不限
+            end: 结束发布日期（含），默认不限
+        
+        Returns:
+            List[Dict]: 与 collect_data 相同格式的记录
+        """
+        from post_archive import PostArchive
+        
+        archive = self.archive or PostArchive.from_config(self.config)
+        posts = archive.posts(start, end)
+        stats = {"source": "archive", "archived_posts": len(archive)}
+        # 归档通常远少于百万条，按进程数分块，每个进程至少分到一块
+        chunk_size = max(1000, -(-len(posts) // (2 * parse_jobs)))
+        passenger_records = self.parse_posts(posts, parse_jobs, chunk_size, counts=stats)
+        return self._set_records(passenger_records, stats)
+    
+    def _set_records(self, passenger_records: List[Dict], stats: Dict) -> List[Dict]:
+        """校验解析结果并设为当前记录"""
+        # 整批向量化校验：总数与线路之和、应有线路、数值范围
+        self.validation = self.validator.validate(passenger_records)
+        for record, issues in zip(passenger_records, self.validation['issues']):
+            record["issues"] = issues
+        stats["records"] = len(passenger_records)
+        self.collect_stats = stats
         
         self.passenger_records = passenger_records
         self._organize_by_line()
         return passenger_records
     
+    def load_history(self, df: 'pd.DataFrame', start: str = None, end: str = None) -> List[Dict]:
+        """
+        用历史数据（date, total, 各线路）填充记录，代替网络采集，供只渲染/导出时使用
+        
+        Args:
+            df: 历史数据（date 为 YYYY-MM-DD）
+            start: 起始日期（含），默认不限
+            end: 结束日期（含），默认不限
+            
+        Returns:
+            List[Dict]: 与 collect_data 相同格式的记录（最新日期在前）
+        """
+        if start:
+            df = df[df['date'] >= start]
+        if end:
+            df = df[df['date'] <= end]
+        
+        frame = df.iloc[::-1]
+        values = frame.reindex(columns=['total'] + self.all_lines).to_numpy(dtype=float)
+        return self._set_history(frame['date'].astype(str).tolist(), values)
+    
+    def _set_history(self, full_dates: List[str], values: 'np.ndarray') -> List[Dict]:
+        """
+        由按列保存的历史数据（最新日期在前）一次性建立记录，线路索引在首次访问 line_data 时建立
+        
+        Args:
+            full_dates: 日期 YYYY-MM-DD
+            values: 天数 × (total + 各线路) 矩阵，缺失值为 NaN
+        """
+        import gc
+        import numpy as np
+        
+        cells = values.astype(object)
+        cells[np.isnan(values)] = None
+        # passenger_data 的键顺序与解析结果相同：各线路在前，总客流量在后
+        keys = self.all_lines + ["总客流量"]
+        rows = np.roll(cells, -1, axis=1).tolist()
+        # 一次创建上万个字典，暂停循环垃圾回收（其间反复触发的全量回收约占一半耗时）
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.passenger_records = [
+                {"date": full_date[5:], "full_date": full_date, "passenger_data": dict(zip(keys, row)), "raw_text": ""}
+                for full_date, row in zip(full_dates, rows)
+            ]
+        finally:
+            if enabled:
+                gc.enable()
+        self._line_data = None
+        return self.passenger_records
+    
+    def load_snapshot(self, source_path: str = None, path: str = None, records: bool = True):
+        """
+        热启动：快照与历史数据文件一致时直接恢复记录和线路索引（见 collector_snapshot.py）
+        
+        Args:
+            source_path: 历史数据文件，默认 docs/data/history.csv
+            path: 快照文件
+            records: 为 False 时只返回历史数据，不改变当前记录
+        
+        Returns:
+            Optional[CollectorSnapshot]: 快照（frame() 为其中的历史数据）；快照缺失或失效时为 None，由调用方读取CSV
+        """
+        from collector_snapshot import SNAPSHOT_FILE, SOURCE_FILE, CollectorSnapshot
+        
+        source = CollectorSnapshot.source_key(source_path or SOURCE_FILE)
+        snapshot = CollectorSnapshot.load(['total'] + self.all_lines, source, path or SNAPSHOT_FILE)
+        if snapshot is None:
+            return None
+        if records:
+            self._set_history(snapshot.full_dates.tolist(), snapshot.values)
+            self.collect_stats = snapshot.collect_stats
+        return snapshot
+    
+    def save_snapshot(self, df: 'pd.DataFrame', source_path: str = None, path: str = None, writer=None):
+        """
+        保存历史数据对应的快照（在历史数据文件写入之后调用，快照记录其内容摘要）
+        
+        Args:
+            df: MetroHistoryStore 格式的历史数据
+            source_path: 历史数据文件，默认 docs/data/history.csv
+            path: 快照文件
+            writer: 导出写入器
+        """
+        from collector_snapshot import SNAPSHOT_FILE, SOURCE_FILE, CollectorSnapshot
+        
+        source = CollectorSnapshot.source_key(source_path or SOURCE_FILE)
+        snapshot = CollectorSnapshot.from_history(df, self.all_lines, source, self.collect_stats)
+        return snapshot.save(path or SNAPSHOT_FILE, writer)
+    
+    @property
+    def line_data(self) -> Dict[str, List[Dict]]:
+        """按线路整理的数据（由历史数据加载时推迟到首次访问再建立）"""
+        if self._line_data is None:
+            self._organize_by_line()
+        return self._line_data
+    
     def _organize_by_line(self):
         """按线路整理数据"""
+        line_data = {}
         for line in self.all_lines:
-            self.line_data[line] = []
+            line_data[line] = []
             for record in self.passenger_records:
                 value = record['passenger_data'].get(line)
-                self.line_data[line].append({
+                line_data[line].append({
                     "date": record['date'],
                     "passenger_count": value,
                     "total": record['passenger_data'].get('总客流量')
                 })
+        self._line_data = line_data
     
     def get_line_colors(self) -> Dict[str, str]:
         """获取所有线路的颜色配置"""
@@ -228,9 +532,19 @@ class NanjingSubwayDataCollector:
             colors[line["name"]] = line.get("color", "#CCCCCC")
         return colors
     
-    def get_line_info(self, line_name: str) -> Dict:
-        """获取指定线路的详细信息"""
-        return self.line_info.get(line_name, {})
+    def get_line_info(self, line_name: str, date: str = None) -> Dict:
+        """获取指定线路的详细信息，指定日期时返回当天生效的配置"""
+        if date is None:
+            return self.line_info.get(line_name, {})
+        return self.line_config.line_info(line_name, date)
+    
+    def get_active_lines(self, date: str = None) -> List[str]:
+        """获取指定日期（默认最新数据日期）已开通的线路"""
+        if date is None:
+            date = self.get_latest_data().get('full_date')
+        if not date:
+            return list(self.all_lines)
+        return self.line_config.open_lines(date)
     
     def get_latest_date(self) -> str:
         """获取最新日期"""
@@ -272,17 +586,38 @@ class NanjingSubwayDataCollector:
             return {}
         
         proportions = {}
-        for line in self.all_lines:
+        # 尚未开通的线路不参与计算
+        for line in self.get_active_lines(latest_data.get('full_date')):
             count = passenger_data.get(line)
             if count is not None:
                 proportions[line] = (count / total) * 100
         
         return proportions
     
-    def get_last_n_days_line_data(self, n: int = None) -> pd.DataFrame:
-        """获取最近n天各线路数据（DataFrame格式）"""
+    def open_history_matrix(self, path: str = None) -> bool:
+        """
+        映射二进制历史数据（见 history_matrix.py），之后 get_last_n_days_line_data 从矩阵切片
+        
+        Returns:
+            bool: 文件是否存在
+        """
+        from history_matrix import HISTORY_MATRIX_FILE, HistoryMatrix
+        
+        matrix = HistoryMatrix(path or HISTORY_MATRIX_FILE)
+        self.history_matrix = matrix if matrix.rows else None
+        return self.history_matrix is not None
+    
+    def get_last_n_days_line_data(self, n: int = None) -> 'pd.DataFrame':
+        """获取最近n天各线路数据（DataFrame格式，最新日期在前）"""
+        import pandas as pd
+        
         if n is None:
             n = self.config["visualization"].get("default_days", 7)
+        if self.history_matrix is not None:
+            rows = self.history_matrix.last_rows(n)[::-1]
+            df = self.history_matrix.to_frame(rows).reindex(columns=['date', 'total'] + self.all_lines)
+            df['date'] = df['date'].str[5:]
+            return df
         last_n_days = self.get_last_n_days(n)
         
         data = []
@@ -295,7 +630,53 @@ class NanjingSubwayDataCollector:
         df = pd.DataFrame(data)
         return df
     
-    def get_last_n_days_proportions(self, n: int = None) -> pd.DataFrame:
+    def complete_last_n_days(self, n: int = None, filler=None):
+        """
+        最近n个自然日的完整日历数据，漏掉的天和未解析到的线路按 analytics.completeness 插补
+
+        Args:
+            n: 天数（截至最新一天的自然日，不是有数据的天数）
+            filler: GapFiller，默认按配置创建
+
+        Returns:
+            CompletedHistory: 日期升序，codes 标记每个格子是观测值还是插补值（见 completeness.py）
+        """
+        import numpy as np
+        import pandas as pd
+        from completeness import GapFiller
+
+        if n is None:
+            n = self.config["visualization"].get("default_days", 7)
+        filler = filler or GapFiller.from_config(self.config)
+        # 多读取之前一段时间，作为插值端点、同星期几样本和占比窗口
+        if self.history_matrix is not None:
+            rows = self.history_matrix.rows
+            history = self.history_matrix.to_frame(np.arange(max(0, rows - n - filler.context_days), rows))
+        else:
+            records = self.get_last_n_days(n + filler.context_days)[::-1]
+            history = pd.DataFrame(
+                [{'date': record.get('full_date') or record['date'], 'total': record['passenger_data'].get('总客流量'),
+                  **{line: record['passenger_data'].get(line) for line in self.all_lines}} for record in records],
+                columns=['date', 'total'] + self.all_lines)
+        return filler.fill(history, self.all_lines, self.line_config).tail(n)
+
+    def get_last_n_days_completed(self, n: int = None, filler=None) -> Tuple['pd.DataFrame', 'pd.DataFrame']:
+        """
+        最近n个自然日各线路数据（插补后）及插补掩码
+
+        Returns:
+            tuple: (数据, 插补掩码)，格式与 get_last_n_days_line_data 相同（最新日期在前），
+                   掩码除 date 列外为布尔值
+        """
+        completed = self.complete_last_n_days(n, filler)
+        frames = []
+        for df in (completed.frame(), completed.mask()):
+            df = df.iloc[::-1].reset_index(drop=True)
+            df['date'] = df['date'].str[5:]
+            frames.append(df)
+        return frames[0], frames[1]
+
+    def get_last_n_days_proportions(self, n: int = None) -> 'pd.DataFrame':
         """获取最近n天各线路占比（DataFrame格式）"""
         if n is None:
             n = self.config["visualization"].get("default_days", 7)
@@ -307,3 +688,29 @@ class NanjingSubwayDataCollector:
                 df[f'{line}_占比'] = df[line] / df['total'] * 100
         
         return df
+
+
+# 解析子进程中的采集器（每个进程按配置创建一次，不创建数据源），
+# 以及 fork 前设置、由子进程继承的待解析帖子
+_parse_worker = None
+_parse_posts = None
+
+
+def _init_parse_worker(config: Dict):
+    global _parse_worker
+    _parse_worker = NanjingSubwayDataCollector(config=config, source=DataSource())
+
+
+def _parse_chunk(task) -> Tuple[List[Dict], Dict]:
+    """
+    在子进程中解析一块帖子，返回 (记录, 计数)
+    
+    Args:
+        task: 继承的帖子列表中的 (起, 止) 位置，或 (文本, 发布时间) 列表
+    """
+    if isinstance(task, tuple):
+        posts = _parse_posts[task[0]:task[1]]
+    else:
+        posts = [{'text_raw': text, 'created_at': created_at} for text, created_at in task]
+    counts = {}
+    return _parse_worker.parse_batch(posts, counts), counts
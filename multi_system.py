@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多线网、多账号采集
+
+每个线网有自己的线路表、解析规则和一个或多个账号（数据源）；全部 (线网, 账号) 在线程池中
+并发采集（耗时主要是网络等待），结果按线网合并后写入按线网分区的历史数据:
+
+    docs/data/systems/<线网id>/history.csv          与 MetroHistoryStore 相同的格式
+    docs/data/systems/<线网id>/parse_quality.json   该线网本次的解析质量
+    docs/data/systems/systems.json                  各线网的天数、日期范围和本次采集计数
+
+config.json 的 systems 段:
+
+    "systems": {
+        "max_workers": 8,
+        "list": [
+            {"id": "nanjing", "name": "南京地铁"},
+            {"id": "suzhou", "name": "苏州轨道交通", "config": "systems/suzhou.json",
+             "accounts": [{"type": "weibo", "weibo_user_id": "...", "search_keyword": "客流"}]}
+        ]
+    }
+
+未指定 config 的线网使用 config.json 本身的 lines / parser / data_source；
+accounts 省略时使用该线网配置中的 data_source
+
+用法:
+    python multi_system.py
+    python multi_system.py --systems nanjing suzhou --workers 4
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from data_sources import create_source
+from export_writer import AtomicExportWriter, WriterLock
+from metro_data import NanjingSubwayDataCollector
+
+SYSTEMS_DIR = 'docs/data/systems'
+
+
+class MetroSystem:
+    """一个线网：配置（lines、parser 等）及其账号列表"""
+
+    def __init__(self, system_id: str, config: Dict, name: Optional[str] = None,
+                 accounts: Optional[List[Dict]] = None):
+        self.id = system_id
+        self.config = config
+        self.name = name or system_id
+        self.lines = [line['name'] for line in config['lines']]
+        self.accounts = accounts or [config.get('data_source', {})]
+
+    @classmethod
+    def from_entry(cls, entry: Dict, base_config: Dict, base_dir: str = '.') -> 'MetroSystem':
+        """
+        由 systems.list 中的一项创建
+
+        Args:
+            entry: 线网配置项（id、name、config、accounts）
+            base_config: config.json 的内容，entry 未指定 config 时使用
+            base_dir: config 相对路径的基准目录
+        """
+        config = base_config
+        if entry.get('config'):
+            with open(os.path.join(base_dir, entry['config']), 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        return cls(entry['id'], config, entry.get('name'), entry.get('accounts'))
+
+    def account_config(self, account: Dict) -> Dict:
+        """某个账号使用的采集器配置（线网配置 + 该账号的 data_source）"""
+        return {**self.config, 'data_source': account}
+
+
+class PartitionedHistoryStore:
+    """按线网分区的历史数据，每个分区是一个 MetroHistoryStore"""
+
+    def __init__(self, root: str = SYSTEMS_DIR):
+        self.root = root
+        self.partitions = {}
+
+    def path(self, system_id: str) -> str:
+        return os.path.join(self.root, system_id, 'history.csv')
+
+    def system_ids(self) -> List[str]:
+        """磁盘上已有的分区"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.exists(self.path(name)))
+
+    def partition(self, system_id: str, lines: Optional[List[str]] = None):
+        """
+        获取线网的历史数据（首次访问时从磁盘加载）
+
+        Returns:
+            MetroHistoryStore: 该线网的历史数据
+        """
+        if system_id not in self.partitions:
+            from history_store import MetroHistoryStore
+            self.partitions[system_id] = MetroHistoryStore(self.path(system_id), lines)
+        return self.partitions[system_id]
+
+    def save(self, writer: Optional[AtomicExportWriter] = None) -> AtomicExportWriter:
+        """保存已加载的分区（未变化的分区由写入器跳过）"""
+        writer = writer or AtomicExportWriter()
+        for store in self.partitions.values():
+            store.save(writer)
+        return writer
+
+    def to_long(self, system_ids: Optional[List[str]] = None):
+        """
+        全部分区合并为长表，便于跨线网比较
+
+        Returns:
+            pd.DataFrame: 列为 system, date, line, value（line 为 total 表示总客流）
+        """
+        import pandas as pd
+
+        frames = []
+        for system_id in system_ids or self.system_ids():
+            long = self.partition(system_id).df.melt(id_vars='date', var_name='line', value_name='value')
+            frames.append(long.assign(system=system_id))
+        if not frames:
+            return pd.DataFrame(columns=['system', 'date', 'line', 'value'])
+        return pd.concat(frames, ignore_index=True)[['system', 'date', 'line', 'value']]
+
+
+def merge_stats(stats_list: List[Dict]) -> Dict:
+    """合并同一线网多个账号的采集计数"""
+    merged = {'accounts': len(stats_list), 'source': [stats.get('source') for stats in stats_list],
+              'errors': []}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if key == 'errors':
+                merged['errors'].extend(value)
+            elif isinstance(value, int):
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+class MultiSystemCollector:
+    """
+    并发采集多个线网、多个账号
+
+    每个 (线网, 账号) 使用独立的采集器和数据源（各自的 requests.Session），在线程池中并发运行，
+    总耗时约为最慢的一个账号而不是全部账号之和；同一线网同一天的数据以 accounts 中靠前的账号为准
+    """
+
+    def __init__(self, systems: List[MetroSystem], store: Optional[PartitionedHistoryStore] = None,
+                 max_workers: int = 8):
+        self.systems = systems
+        self.store = store or PartitionedHistoryStore()
+        self.max_workers = max_workers
+        self.results: Dict[str, Dict] = {}
+
+    @classmethod
+    def from_config(cls, config_file: str = 'config.json', system_ids: Optional[List[str]] = None,
+                    max_workers: Optional[int] = None, **kwargs) -> 'MultiSystemCollector':
+        """
+        从 config.json 的 systems 段创建（没有 systems 段时只采集 config.json 本身的线网）
+
+        Args:
+            system_ids: 只采集指定的线网，默认全部
+            max_workers: 并发数，默认读取 systems.max_workers
+        """
+        with open(config_file, 'r', encoding='utf-8') as f:
+            base_config = json.load(f)
+        section = base_config.get('systems', {})
+        entries = section.get('list') or [{'id': 'default'}]
+        base_dir = os.path.dirname(os.path.abspath(config_file))
+        systems = [MetroSystem.from_entry(entry, base_config, base_dir) for entry in entries
+                   if system_ids is None or entry['id'] in system_ids]
+        unknown = set(system_ids or ()) - {system.id for system in systems}
+        if unknown:
+            raise ValueError(f"未知的线网: {', '.join(sorted(unknown))}")
+        return cls(systems, max_workers=max_workers or section.get('max_workers', 8), **kwargs)
+
+    def _collect_account(self, system: MetroSystem, account: Dict) -> Tuple[List[Dict], Dict, float]:
+        """采集一个账号，返回 (记录, 采集计数, 耗时)"""
+        start = time.perf_counter()
+        config = system.account_config(account)
+        collector = NanjingSubwayDataCollector(config=config, source=create_source(config))
+        stats = {}
+        records = list(collector.iter_records(stats))
+        return records, stats, time.perf_counter() - start
+
+    def collect(self) -> Dict[str, Dict]:
+        """
+        并发采集全部线网和账号，按线网合并、校验并写入对应分区（不保存）
+
+        Returns:
+            Dict[str, Dict]: 线网id → {records, stats, quality, new_days, seconds}
+        """
+        tasks = [(system, account) for system in self.systems for account in system.accounts]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(tasks)))) as executor:
+            futures = [executor.submit(self._collect_account, system, account) for system, account in tasks]
+
+            outcomes: Dict[str, List] = {system.id: [] for system in self.systems}
+            for (system, account), future in zip(tasks, futures):
+                try:
+                    outcomes[system.id].append(future.result())
+                except Exception as e:
+                    # 账号配置错误（如缺少 weibo_user_id）不影响其他账号
+                    print(f"❌ {system.name} 账号 {account.get('type', 'weibo')} 采集失败: {e}")
+                    outcomes[system.id].append(([], {'errors': [f"{type(e).__name__}: {e}"]}, 0.0))
+
+        for system in self.systems:
+            self.results[system.id] = self._merge_system(system, outcomes[system.id])
+        return self.results
+
+    def _merge_system(self, system: MetroSystem, outcomes: List[Tuple[List[Dict], Dict, float]]) -> Dict:
+        """合并一个线网各账号的记录（同一天以靠前的账号为准），校验并合并到分区"""
+        records, seen = [], set()
+        for account_records, _, _ in outcomes:
+            for record in account_records:
+                key = record.get('full_date') or record['date']
+                if key not in seen:
+                    seen.add(key)
+                    records.append(record)
+
+        from parse_validation import ParseValidator
+        validator = ParseValidator.from_config(system.config)
+        checks = validator.validate(records)
+        for record, issues in zip(records, checks['issues']):
+            record['issues'] = issues
+        stats = merge_stats([stats for _, stats, _ in outcomes])
+        stats['records'] = len(records)
+
+        store = self.store.partition(system.id, system.lines)
+        new_days = store.merge_records(records)
+        return {
+            'records': records,
+            'stats': stats,
+            'quality': validator.metrics(checks, stats),
+            'new_days': new_days,
+            'seconds': round(max((seconds for _, _, seconds in outcomes), default=0.0), 3),
+        }
+
+    def save(self, writer: Optional[AtomicExportWriter] = None) -> AtomicExportWriter:
+        """保存各分区、各线网的解析质量以及线网索引"""
+        writer = writer or AtomicExportWriter()
+        self.store.save(writer)
+        index_file = os.path.join(self.store.root, 'systems.json')
+        collected = {system.id for system in self.systems}
+        # 只采集部分线网时保留其他线网在索引中的条目
+        index = []
+        if os.path.exists(index_file):
+            with open(index_file, 'r', encoding='utf-8') as f:
+                index = [entry for entry in json.load(f).get('systems', []) if entry['id'] not in collected]
+        for system in self.systems:
+            result = self.results.get(system.id, {})
+            store = self.store.partition(system.id, system.lines)
+            if 'quality' in result:
+                writer.write_json(os.path.join(self.store.root, system.id, 'parse_quality.json'),
+                                  result['quality'], volatile_keys=('generated',), indent=2)
+            start, end = store.date_range()
+            index.append({
+                'id': system.id,
+                'name': system.name,
+                'lines': system.lines,
+                'accounts': len(system.accounts),
+                'days': len(store.df),
+                'start': start,
+                'end': end,
+                'records': len(result.get('records', [])),
+                'new_days': result.get('new_days', 0),
+                'collect_seconds': result.get('seconds'),
+            })
+        index.sort(key=lambda entry: entry['id'])
+        writer.write_json(index_file, {'systems': index}, indent=2)
+        return writer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多线网、多账号并发采集')
+    parser.add_argument('--config', default='config.json', help='配置文件')
+    parser.add_argument('--systems', nargs='+', help='只采集指定的线网id')
+    parser.add_argument('--workers', type=int, help='并发数（默认读取 systems.max_workers）')
+    args = parser.parse_args()
+
+    collector = MultiSystemCollector.from_config(args.config, args.systems, args.workers)
+    with open(args.config, 'r', encoding='utf-8') as f:
+        lock = WriterLock.from_config(json.load(f))
+    # 分区历史数据在采集过程中加载，采集和保存都在写入锁内，避免覆盖其他进程同时写入的数据
+    with lock:
+        start = time.perf_counter()
+        results = collector.collect()
+        elapsed = time.perf_counter() - start
+        writer = collector.save()
+
+    print("\n" + "=" * 60)
+    for system in collector.systems:
+        result = results[system.id]
+        print(f"📊 {system.name}: {len(result['records'])} 条记录，新增 {result['new_days']} 天，"
+              f"{len(system.accounts)} 个账号，耗时 {result['seconds']:.2f}s")
+    print(f"✅ 共 {len(collector.systems)} 个线网，总耗时 {elapsed:.2f}s")
+    print("=" * 60)
+    writer.log_summary()
+
+
+if __name__ == '__main__':
+    main()
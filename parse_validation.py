@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from line_config import VersionedLineConfig
+
+PARSE_QUALITY_FILE = 'docs/data/parse_quality.json'
+
+# 单条记录的问题类型
+ISSUE_TYPES = ('no_full_date', 'no_total', 'sum_mismatch', 'missing_line', 'out_of_range')
+CHECK_COLUMNS = ('date', 'total', 'line_sum', 'sum_diff_pct', 'parsed', 'expected',
+                 'missing', 'out_of_range', 'issues', 'ok')
+
+
+class ParseValidator:
+    """
+    解析结果校验（对一批记录向量化计算）
+
+        sum_mismatch   各线路之和与客运量总数的相对偏差超过 sum_tolerance_pct
+        missing_line   当天已开通的线路没有解析到数值
+        out_of_range   线路数值不在 line_range 内，或总客运量不在 total_range 内
+
+    校验只标记问题，不丢弃记录；每次运行的覆盖率统计写入 PARSE_QUALITY_FILE。
+    只依赖 numpy（在 validate 中导入），采集阶段不需要加载 pandas
+    """
+
+    def __init__(self, line_config: VersionedLineConfig, sum_tolerance_pct: float = 5.0,
+                 line_range=(0.0, 300.0), total_range=(10.0, 1000.0)):
+        self.line_config = line_config
+        self.lines = line_config.lines
+        self.sum_tolerance_pct = sum_tolerance_pct
+        self.line_range = tuple(line_range)
+        self.total_range = tuple(total_range)
+
+    @classmethod
+    def from_config(cls, config: Dict, line_config: Optional[VersionedLineConfig] = None) -> 'ParseValidator':
+        """从 config.json 的 analytics.validation 段创建"""
+        params = config.get('analytics', {}).get('validation', {})
+        line_config = line_config or VersionedLineConfig(config['lines'])
+        return cls(line_config, **{k: v for k, v in params.items()
+                                   if k in ('sum_tolerance_pct', 'line_range', 'total_range')})
+
+    def validate(self, records: List[Dict]) -> Dict[str, list]:
+        """
+        校验一批解析结果
+
+        Args:
+            records: collect_data 产生的记录（含 full_date、passenger_data）
+
+        Returns:
+            Dict[str, list]: 按列组织的校验结果（每条记录一个元素），列为 date, total, line_sum,
+                             sum_diff_pct, parsed, expected, missing, out_of_range, issues, ok
+        """
+        checks = {column: [] for column in CHECK_COLUMNS}
+        if not records:
+            return checks
+
+        import numpy as np
+
+        # 一次构造 记录×(线路+总数) 矩阵，之后全部是数组运算（None 转为 NaN）
+        keys = self.lines + ['总客流量']
+        matrix = np.array([[r['passenger_data'].get(key) for key in keys] for r in records], dtype=float)
+        values, total = matrix[:, :-1], matrix[:, -1]
+        full_dates = np.array([r.get('full_date') for r in records], dtype='datetime64[D]')
+        no_date = np.isnat(full_dates)
+        # 没有完整日期的记录按今天的线路配置校验
+        full_dates[no_date] = np.datetime64(datetime.now().date(), 'D')
+
+        expected = self.line_config.matrices['open'][self.line_config.intervals(full_dates)]
+        parsed = ~np.isnan(values)
+        missing = expected & ~parsed
+        line_lo, line_hi = self.line_range
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out_of_range = parsed & ((values < line_lo) | (values > line_hi))
+            total_bad = ~np.isnan(total) & ((total < self.total_range[0]) | (total > self.total_range[1]))
+            line_sum = np.where(parsed.any(axis=1), np.nansum(values, axis=1), np.nan)
+            sum_diff_pct = np.round((line_sum - total) / total * 100, 2)
+            # 有线路缺失时总和必然偏小，不重复计为 sum_mismatch
+            sum_mismatch = (np.abs(sum_diff_pct) > self.sum_tolerance_pct) & ~missing.any(axis=1)
+
+        flags = np.column_stack([
+            no_date,
+            np.isnan(total),
+            sum_mismatch,
+            missing.any(axis=1),
+            out_of_range.any(axis=1) | total_bad,
+        ])
+        issue_names = np.array(ISSUE_TYPES, dtype=object)
+        lines = np.array(self.lines, dtype=object)
+
+        def floats(array):
+            return [None if v != v else float(v) for v in array.tolist()]
+
+        checks.update({
+            'date': [r.get('full_date') or r.get('date') for r in records],
+            'total': floats(total),
+            'line_sum': floats(np.round(line_sum, 2)),
+            'sum_diff_pct': floats(sum_diff_pct),
+            'parsed': parsed.sum(axis=1).tolist(),
+            'expected': expected.sum(axis=1).tolist(),
+            'missing': [lines[row].tolist() for row in missing],
+            'out_of_range': [lines[row].tolist() for row in out_of_range],
+            'issues': [issue_names[row].tolist() for row in flags],
+            'ok': (~flags.any(axis=1)).tolist(),
+        })
+        return checks
+
+    def metrics(self, checks: Dict[str, list], collect_stats: Optional[Dict] = None) -> Dict:
+        """
+        每次运行的解析覆盖率统计
+
+        Args:
+            checks: validate() 的结果
+            collect_stats: 采集阶段的计数（页数、帖子数、错误等）
+
+        Returns:
+            Dict: 覆盖率、各类问题数量及有问题的记录
+        """
+        n = len(checks['ok'])
+        expected = sum(checks['expected'])
+        parsed_expected = expected - sum(len(missing) for missing in checks['missing'])
+        counts = Counter(name for issues in checks['issues'] for name in issues)
+        problems = [
+            {column: checks[column][i] for column in CHECK_COLUMNS if column != 'ok'}
+            for i in range(n) if not checks['ok'][i]
+        ]
+        return {
+            'generated': datetime.now().isoformat(),
+            'collect': collect_stats or {},
+            'records': n,
+            'records_ok': sum(checks['ok']),
+            'line_coverage_pct': round(parsed_expected / expected * 100, 2) if expected else None,
+            'total_coverage_pct': round(sum(t is not None for t in checks['total']) / n * 100, 2) if n else None,
+            'issue_counts': {name: counts.get(name, 0) for name in ISSUE_TYPES},
+            'thresholds': {
+                'sum_tolerance_pct': self.sum_tolerance_pct,
+                'line_range': list(self.line_range),
+                'total_range': list(self.total_range),
+            },
+            'problems': problems,
+        }
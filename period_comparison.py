@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+任意时段对比：两个日期范围的日均客流、变化量和线路占比变化
+
+用法:
+    python period_comparison.py                                         最近7天 vs 去年同期（按星期对齐）
+    python period_comparison.py --base 2024-10-01:2024-10-07 --current 2025-10-01:2025-10-07
+    python period_comparison.py --current 2025-06-01:2025-06-30 --mode previous   与前一个等长时段对比
+    python period_comparison.py --opening S6号线 --days 28                       线路开通前后各28天
+"""
+
+import argparse
+import json
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from history_matrix import HistoryMatrix
+
+COMPARISON_FILE = 'docs/data/period_comparison.json'
+# 去年同期按星期对齐：52周前
+YOY_SHIFT_DAYS = 364
+
+Period = Tuple[str, str]
+
+
+def parse_period(value: str) -> Period:
+    """'YYYY-MM-DD:YYYY-MM-DD'（或单个日期）→ (起, 止)"""
+    start, _, end = value.partition(':')
+    try:
+        start, end = pd.Timestamp(start), pd.Timestamp(end or start)
+    except ValueError:
+        raise ValueError(f"无效的时段: {value}，格式为 YYYY-MM-DD:YYYY-MM-DD")
+    if end < start:
+        raise ValueError(f"时段结束日期早于开始日期: {value}")
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+
+def shift_period(period: Period, days: int) -> Period:
+    """整体平移 days 天（负数为向前）"""
+    offset = pd.Timedelta(days=days)
+    return tuple((pd.Timestamp(day) + offset).strftime('%Y-%m-%d') for day in period)
+
+
+class PeriodIndex:
+    """
+    历史数据的前缀和索引
+
+    按日期连续的 (天数 × 序列) 矩阵只做一次累计求和（缺失值计为0并单独累计有效天数），
+    之后任意日期范围的合计和有效天数都是两行相减，与范围长度无关
+    """
+
+    def __init__(self, start: Optional[np.datetime64], values: np.ndarray, series: List[str]):
+        self.start = start
+        self.series = list(series)
+        valid = ~np.isnan(values)
+        self.sums = np.zeros((len(values) + 1, len(self.series)))
+        np.cumsum(np.where(valid, values, 0.0), axis=0, out=self.sums[1:])
+        self.counts = np.zeros((len(values) + 1, len(self.series)), dtype=np.int64)
+        np.cumsum(valid, axis=0, out=self.counts[1:])
+
+    @classmethod
+    def from_history(cls, df: pd.DataFrame, series: List[str]) -> 'PeriodIndex':
+        """由历史数据（date, total, 各线路）创建"""
+        start, matrix = HistoryMatrix.dense(df, series)
+        return cls(start, matrix, series)
+
+    @classmethod
+    def from_matrix(cls, matrix: HistoryMatrix) -> 'PeriodIndex':
+        """由二进制历史数据创建（不需要 pandas 加载 CSV）"""
+        return cls(matrix.start, matrix.values, matrix.columns)
+
+    @property
+    def rows(self) -> int:
+        return len(self.sums) - 1
+
+    @property
+    def end(self) -> Optional[np.datetime64]:
+        return None if self.start is None or not self.rows else self.start + (self.rows - 1)
+
+    def _bounds(self, period: Period) -> Tuple[int, int]:
+        if self.start is None:
+            return 0, 0
+        lo = int((np.datetime64(period[0], 'D') - self.start).astype(int))
+        hi = int((np.datetime64(period[1], 'D') - self.start).astype(int)) + 1
+        lo, hi = min(max(lo, 0), self.rows), min(max(hi, 0), self.rows)
+        return lo, max(lo, hi)
+
+    def aggregate(self, period: Period) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        日期范围（含两端）内各序列的合计和有效天数
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (合计, 有效天数)，长度均为序列数
+        """
+        lo, hi = self._bounds(period)
+        return self.sums[hi] - self.sums[lo], self.counts[hi] - self.counts[lo]
+
+
+class PeriodComparison:
+    """
+    两个时段的对比：基期（base）与本期（current）
+
+    各序列按时段内有数据的天求日均，时段长度不同或有缺失天也可比较；线路占比为线路日均 / 总客流日均
+    """
+
+    MODES = ('yoy', 'previous')
+
+    def __init__(self, days: int = 7, mode: str = 'yoy'):
+        if mode not in self.MODES:
+            raise ValueError(f"未知的对比方式: {mode}，可选: {', '.join(self.MODES)}")
+        self.days = days
+        self.mode = mode
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'PeriodComparison':
+        """从 config.json 的 analytics.comparison 段创建"""
+        params = config.get('analytics', {}).get('comparison', {})
+        return cls(**{k: v for k, v in params.items() if k in ('days', 'mode')})
+
+    def baseline(self, current: Period, mode: Optional[str] = None) -> Period:
+        """本期对应的基期：yoy 为52周前的同一星期，previous 为紧邻的前一个等长时段"""
+        if (mode or self.mode) == 'yoy':
+            return shift_period(current, -YOY_SHIFT_DAYS)
+        length = (pd.Timestamp(current[1]) - pd.Timestamp(current[0])).days + 1
+        return shift_period(current, -length)
+
+    def default_periods(self, index: PeriodIndex) -> Tuple[Period, Period]:
+        """
+        默认对比：最近 days 天 vs 基期；历史不足一年（去年同期没有数据）时改为与前一个时段对比
+
+        Returns:
+            Tuple[Period, Period]: (基期, 本期)
+        """
+        end = pd.Timestamp(str(index.end))
+        current = ((end - pd.Timedelta(days=self.days - 1)).strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+        base = self.baseline(current)
+        if self.mode == 'yoy' and not index.aggregate(base)[1].any():
+            base = self.baseline(current, 'previous')
+        return base, current
+
+    @staticmethod
+    def around(day: str, days: int) -> Tuple[Period, Period]:
+        """某一天（如线路开通）之前和之后（含当天）各 days 天"""
+        ts = pd.Timestamp(day)
+        before = ((ts - pd.Timedelta(days=days)).strftime('%Y-%m-%d'), (ts - pd.Timedelta(days=1)).strftime('%Y-%m-%d'))
+        after = (ts.strftime('%Y-%m-%d'), (ts + pd.Timedelta(days=days - 1)).strftime('%Y-%m-%d'))
+        return before, after
+
+    def compare(self, index: PeriodIndex, base: Period, current: Period) -> pd.DataFrame:
+        """
+        对比两个时段
+
+        Returns:
+            pd.DataFrame: 行为序列（total 与各线路），列为两个时段的日均、有效天数、占比，
+                          以及变化量、变化百分比和占比变化（百分点）
+        """
+        base_sum, base_days = index.aggregate(base)
+        current_sum, current_days = index.aggregate(current)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            base_mean = np.where(base_days > 0, base_sum / base_days, np.nan)
+            current_mean = np.where(current_days > 0, current_sum / current_days, np.nan)
+            table = pd.DataFrame({
+                'base_mean': base_mean,
+                'current_mean': current_mean,
+                'delta': current_mean - base_mean,
+                'delta_pct': np.where(base_mean != 0, (current_mean / base_mean - 1) * 100, np.nan),
+                'base_days': base_days,
+                'current_days': current_days,
+            }, index=index.series)
+            if 'total' in index.series:
+                k = index.series.index('total')
+                table['base_share'] = base_mean / base_mean[k] * 100
+                table['current_share'] = current_mean / current_mean[k] * 100
+                table['share_shift_pp'] = table['current_share'] - table['base_share']
+        return table
+
+    @staticmethod
+    def to_json(base: Period, current: Period, table: pd.DataFrame, labels: Tuple[str, str] = ('基期', '本期')) -> Dict:
+        """导出用的JSON结构"""
+        rounded = table.round(2)
+        return {
+            'base': {'label': labels[0], 'from': base[0], 'to': base[1]},
+            'current': {'label': labels[1], 'from': current[0], 'to': current[1]},
+            'series': rounded.astype(object).where(rounded.notna(), None).to_dict('index'),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='任意时段客流对比')
+    parser.add_argument('--config', default='config.json', help='配置文件')
+    parser.add_argument('--base', help='基期 YYYY-MM-DD:YYYY-MM-DD（默认按 --mode 由本期推算）')
+    parser.add_argument('--current', help='本期 YYYY-MM-DD:YYYY-MM-DD（默认最近 --days 天）')
+    parser.add_argument('--mode', choices=PeriodComparison.MODES, help='未指定基期时的推算方式: 去年同期 / 前一时段')
+    parser.add_argument('--days', type=int, help='默认本期的天数；与 --opening 一起使用时为前后各多少天')
+    parser.add_argument('--opening', metavar='LINE', help='对比该线路开通前后')
+    parser.add_argument('--output', default=COMPARISON_FILE, help='输出的JSON文件')
+    parser.add_argument('--no-chart', dest='chart', action='store_false', help='不绘制对比图')
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    comparison = PeriodComparison.from_config(config)
+    comparison.days = args.days or comparison.days
+    comparison.mode = args.mode or comparison.mode
+
+    # 二进制历史数据存在时直接内存映射，不解析CSV
+    lines = [line['name'] for line in config['lines']]
+    matrix = HistoryMatrix()
+    if matrix.rows and matrix.columns == ['total'] + lines:
+        index = PeriodIndex.from_matrix(matrix)
+    else:
+        from history_store import MetroHistoryStore
+        index = PeriodIndex.from_history(MetroHistoryStore(lines=lines).df, ['total'] + lines)
+    if index.end is None:
+        print("❌ 没有历史数据")
+        return
+
+    labels = ('基期', '本期')
+    if args.opening:
+        info = next((line for line in config['lines'] if line['name'] == args.opening), None)
+        if info is None or not info.get('opening_date'):
+            raise SystemExit(f"❌ 线路 {args.opening} 没有开通日期")
+        base, current = comparison.around(info['opening_date'], comparison.days)
+        labels = (f'{args.opening}开通前', f'{args.opening}开通后')
+    else:
+        current = parse_period(args.current) if args.current else None
+        if current is None:
+            base, current = comparison.default_periods(index)
+        else:
+            base = comparison.baseline(current)
+        if args.base:
+            base = parse_period(args.base)
+
+    table = comparison.compare(index, base, current)
+    from export_writer import AtomicExportWriter, WriterLock
+    # 写入 docs/data 和 docs/images，与采集、导出进程共用写入锁
+    with WriterLock.from_config(config):
+        writer = AtomicExportWriter()
+        result = comparison.to_json(base, current, table, labels)
+        writer.write_json(args.output, result, indent=2)
+
+        total = result['series'].get('total', {})
+        print(f"📊 {labels[0]} {base[0]}~{base[1]}（{total.get('base_days')} 天） vs "
+              f"{labels[1]} {current[0]}~{current[1]}（{total.get('current_days')} 天）")
+        if not total.get('base_days') or not total.get('current_days'):
+            print(f"⚠️ 有时段不在历史数据范围内（{index.start} ~ {index.end}）")
+        else:
+            print(f"👥 日均总客流: {total['base_mean']}万 → {total['current_mean']}万（{total['delta_pct']}%）")
+
+        if args.chart:
+            import main as pipeline
+            from metro_data import NanjingSubwayDataCollector
+            from data_sources import DataSource
+            collector = NanjingSubwayDataCollector(config=config, source=DataSource())
+            visualizer = pipeline.NanjingSubwayVisualizer(collector)
+            if visualizer.plot_period_comparison(result):
+                print("🖼️ 对比图已保存: docs/images/时段对比图.png")
+        writer.log_summary()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from export_writer import AtomicExportWriter
+
+ARCHIVE_DIR = 'docs/data/archive'
+ARCHIVE_FORMAT = 1
+INDEX_FIELDS = ('id', 'date', 'segment', 'sha1')
+
+
+class PostArchive:
+    """
+    原始帖子归档：完整保存每条获取到的帖子，解析规则改进后可以从归档重新解析全部历史
+
+        archive/posts-YYYY.jsonl.gz   按发布年份分段，每次保存追加一个 gzip 成员（gzip 允许多成员拼接）
+        archive/index.csv             帖子id、发布日期、所在分段、内容摘要，每次保存只追加新行
+        archive/manifest.json         格式版本及各文件的有效字节数
+
+    按帖子id去重，同一id内容变化（帖子被编辑）时追加新版本，读取时以最后一个版本为准。
+    数据和索引先追加、清单最后原子写入；追加中途中断时多出的部分不在清单记录的长度内，
+    读取时忽略，下次追加时截断
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR, compresslevel: int = 6):
+        self.root = root
+        self.compresslevel = compresslevel
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.index_path = os.path.join(root, 'index.csv')
+        # 帖子id → (发布日期, 分段, 内容摘要)，只保留最新版本
+        self.index: Dict[str, Tuple[str, str, str]] = {}
+        self.manifest = {'format': ARCHIVE_FORMAT, 'index_bytes': 0, 'segments': {}}
+        self._pending: Dict[str, List[str]] = {}
+        self._pending_index: List[Tuple[str, str, str, str]] = []
+        self.load_index()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'PostArchive':
+        """从 config.json 的 archive 段创建"""
+        params = config.get('archive', {})
+        return cls(params.get('root', ARCHIVE_DIR), params.get('compresslevel', 6))
+
+    def segment_path(self, segment: str) -> str:
+        return os.path.join(self.root, f'posts-{segment}.jsonl.gz')
+
+    def _read_valid(self, path: str, size: int) -> bytes:
+        """读取文件中清单记录的有效部分"""
+        with open(path, 'rb') as f:
+            return f.read(size)
+
+    def load_index(self):
+        """加载清单和索引（不读取帖子内容）"""
+        self.index = {}
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != ARCHIVE_FORMAT:
+            raise ValueError(f"{self.manifest_path} 的格式版本 {manifest.get('format')} 不受支持")
+        self.manifest = manifest
+        text = self._read_valid(self.index_path, manifest['index_bytes']).decode('utf-8')
+        for row in csv.DictReader(io.StringIO(text)):
+            self.index[row['id']] = (row['date'], row['segment'], row['sha1'])
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @staticmethod
+    def post_id(post: Dict) -> str:
+        """帖子id；没有id的帖子（如本地CSV）用发布时间和正文的摘要代替"""
+        if post.get('id') not in (None, ''):
+            return str(post['id'])
+        return 'sha1:' + PostArchive.content_hash(post)
+
+    @staticmethod
+    def content_hash(post: Dict) -> str:
+        text = f"{post.get('created_at', '')}\x00{post.get('text_raw', '')}"
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+    def add(self, posts: Iterable[Dict]) -> int:
+        """
+        加入一批帖子（保存前只在内存中），已归档且内容未变化的帖子跳过
+
+        Returns:
+            int: 新增或内容变化的帖子数
+        """
+        from metro_data import NanjingSubwayDataCollector
+
+        added = 0
+        for post in posts:
+            post_id, digest = self.post_id(post), self.content_hash(post)
+            known = self.index.get(post_id)
+            if known is not None and known[2] == digest:
+                continue
+            year, month, day = NanjingSubwayDataCollector.posted_date(post.get('created_at', ''))
+            date, segment = f'{year:04d}-{month:02d}-{day:02d}', f'{year:04d}'
+            self.index[post_id] = (date, segment, digest)
+            self._pending.setdefault(segment, []).append(json.dumps(post, ensure_ascii=False, separators=(',', ':')))
+            self._pending_index.append((post_id, date, segment, digest))
+            added += 1
+        return added
+
+    def _append(self, writer: AtomicExportWriter, path: str, data: bytes, offset: int) -> int:
+        """在有效内容之后追加（文件不存在时新建），返回新的有效字节数"""
+        if offset == 0 or not os.path.exists(path):
+            writer.write_bytes(path, data)
+        else:
+            writer.append_bytes(path, data, offset)
+        return offset + len(data)
+
+    def save(self, writer: Optional[AtomicExportWriter] = None) -> int:
+        """
+        追加新帖子和索引行，最后更新清单
+
+        Returns:
+            int: 本次写入的帖子数
+        """
+        if not self._pending_index:
+            return 0
+        writer = writer or AtomicExportWriter()
+        os.makedirs(self.root, exist_ok=True)
+        segments = self.manifest['segments']
+        for segment, lines in sorted(self._pending.items()):
+            # mtime=0 使相同内容压缩结果相同
+            data = gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'), self.compresslevel, mtime=0)
+            entry = segments.setdefault(segment, {'bytes': 0, 'posts': 0})
+            entry['bytes'] = self._append(writer, self.segment_path(segment), data, entry['bytes'])
+            entry['posts'] += len(lines)
+
+        buffer = io.StringIO()
+        rows = csv.writer(buffer, lineterminator='\n')
+        if self.manifest['index_bytes'] == 0:
+            rows.writerow(INDEX_FIELDS)
+        rows.writerows(self._pending_index)
+        self.manifest['index_bytes'] = self._append(writer, self.index_path, buffer.getvalue().encode('utf-8'),
+                                                    self.manifest['index_bytes'])
+        self.manifest['posts'] = len(self.index)
+        writer.write_json(self.manifest_path, self.manifest, indent=2)
+
+        saved = len(self._pending_index)
+        self._pending, self._pending_index = {}, []
+        return saved
+
+    def posts(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        """
+        读取归档的帖子（每个id取最新版本），只解压日期范围涉及的年份
+
+        Args:
+            start: 起始发布日期 YYYY-MM-DD（含）
+            end: 结束发布日期（含）
+
+        Returns:
+            List[Dict]: 帖子，按发布日期从新到旧（与微博接口的顺序一致）
+        """
+        segments = sorted(seg for seg in self.manifest['segments']
+                          if (start is None or seg >= start[:4]) and (end is None or seg <= end[:4]))
+        latest: Dict[str, Tuple[str, Dict]] = {}
+        for segment in segments:
+            size = self.manifest['segments'][segment]['bytes']
+            for line in gzip.decompress(self._read_valid(self.segment_path(segment), size)).splitlines():
+                post = json.loads(line)
+                post_id = self.post_id(post)
+                known = self.index.get(post_id)
+                # 只保留索引中的最新版本（旧版本及未写入索引的帖子跳过）
+                if known is None or known[1] != segment or known[2] != self.content_hash(post):
+                    continue
+                if (start is None or known[0] >= start) and (end is None or known[0] <= end):
+                    latest[post_id] = (known[0], post)
+        ordered = sorted(latest.values(), key=lambda item: item[0], reverse=True)
+        return [post for _, post in ordered]
+
+    def stats(self) -> Dict:
+        """归档规模：帖子数、各年份的压缩字节数"""
+        segments = self.manifest['segments']
+        return {
+            'posts': len(self.index),
+            'segments': {seg: dict(entry) for seg, entry in sorted(segments.items())},
+            'bytes': sum(entry['bytes'] for entry in segments.values()) + self.manifest['index_bytes'],
+        }
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+客流查询 HTTP API（只依赖标准库 + pandas/numpy）
+
+用法:
+    python query_api.py --port 8766
+
+接口:
+    GET /lines                                  线路列表及当前配置
+    GET /ridership?line=1号线&from=2025-01-01&to=2025-01-31
+                                                日期范围内的客流（line 省略时返回全部线路，可为 total）
+    GET /proportions?date=2025-01-31            某天各线路客流占比（默认最新一天）
+    GET /stats?window=30&line=1号线             最近 window 天的均值/中位数/最值/标准差
+    GET /compare?current=2025-10-01:2025-10-07&base=2024-10-02:2024-10-08
+                                                两个时段的日均客流、变化和占比变化
+                                                （current 默认最近7天，base 默认按 mode=yoy/previous 推算）
+
+响应带强 ETag，请求头 If-None-Match 匹配时返回 304；历史数据文件更新后自动重新加载
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from collector_snapshot import SNAPSHOT_FILE, CollectorSnapshot
+from history_store import HISTORY_FILE, MetroHistoryStore
+from line_config import VersionedLineConfig
+from period_comparison import PeriodComparison, PeriodIndex, parse_period
+
+MAX_STATS_WINDOW = 3660
+
+
+class QueryError(Exception):
+    """请求参数错误，status 为返回的HTTP状态码"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class LRUCache:
+    """线程安全的 LRU 缓存"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RidershipQueryService:
+    """
+    基于历史数据的查询服务
+
+    历史数据按日期升序保存为 日期索引 + (天数 × 序列) 矩阵，日期范围查询用二分定位后直接切片；
+    每个响应（JSON 字节 + ETag）按 (数据版本, 路径, 规范化参数) 缓存在 LRU 中
+    """
+
+    def __init__(self, store_path: str = HISTORY_FILE, config_file: str = 'config.json',
+                 cache_size: int = 1024, snapshot_path: str = SNAPSHOT_FILE):
+        self.store_path = store_path
+        self.snapshot_path = snapshot_path
+        with open(config_file, 'r', encoding='utf-8') as f:
+            self.line_config = VersionedLineConfig(json.load(f)['lines'])
+        self.lines = self.line_config.lines
+        self.series = ['total'] + self.lines
+        self.cache = LRUCache(cache_size)
+        # 重新加载与未命中缓存的查询互斥，查询不会看到新旧数据混合的状态
+        self._lock = threading.RLock()
+        self._mtime = None
+        self.version = ''
+        self.dates = np.array([], dtype='datetime64[D]')
+        self.values = np.empty((0, len(self.series)))
+        self.periods = PeriodIndex(None, self.values, self.series)
+        self.refresh()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, config_file: str = 'config.json', **kwargs) -> 'RidershipQueryService':
+        """直接用内存中的历史数据创建（不监视文件），用于测试和基准测试"""
+        service = cls(store_path='', config_file=config_file, **kwargs)
+        service._set_frame(df)
+        return service
+
+    def _set_frame(self, df: pd.DataFrame):
+        frame = df.reindex(columns=['date'] + self.series)
+        dates = pd.to_datetime(frame['date']).to_numpy().astype('datetime64[D]')
+        values = frame[self.series].to_numpy(dtype=float)
+        digest = hashlib.sha256(dates.tobytes() + values.tobytes()).hexdigest()[:16]
+        # 时段对比用的前缀和索引，任意时段的合计只需两行相减
+        periods = PeriodIndex.from_history(frame, self.series)
+        with self._lock:
+            self.dates, self.values, self.version, self.periods = dates, values, digest, periods
+        self.cache.clear()
+
+    def refresh(self) -> bool:
+        """历史数据文件修改后重新加载，返回是否重新加载"""
+        if not self.store_path or not os.path.exists(self.store_path):
+            return False
+        mtime = os.path.getmtime(self.store_path)
+        if mtime == self._mtime:
+            return False
+        # 采集器快照与文件内容一致时直接使用，不解析CSV
+        snapshot = CollectorSnapshot.load(self.series, CollectorSnapshot.source_key(self.store_path), self.snapshot_path)
+        self._set_frame(snapshot.frame() if snapshot is not None else MetroHistoryStore(self.store_path, self.lines).df)
+        self._mtime = mtime
+        return True
+
+    @staticmethod
+    def _parse_date(value: Optional[str], name: str) -> Optional[np.datetime64]:
+        if not value:
+            return None
+        try:
+            return np.datetime64(pd.Timestamp(value).date(), 'D')
+        except ValueError:
+            raise QueryError(f"参数 {name} 不是有效日期: {value}")
+
+    def _column(self, line: str) -> int:
+        if line not in self.series:
+            raise QueryError(f"未知线路: {line}", 404)
+        return self.series.index(line)
+
+    def _range(self, start: Optional[np.datetime64], end: Optional[np.datetime64]) -> slice:
+        """日期范围对应的行切片（二分查找）"""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, start, side='left'))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, end, side='right'))
+        return slice(lo, max(lo, hi))
+
+    @staticmethod
+    def _clean(values: np.ndarray) -> list:
+        return [None if np.isnan(v) else round(float(v), 2) for v in values]
+
+    def lines_info(self, params: Dict) -> Dict:
+        current = self.line_config.as_of(self.dates[-1].item()) if len(self.dates) else {}
+        return {'lines': [
+            {
+                'name': line,
+                'open': line in current,
+                **{k: (None if isinstance(v, float) and np.isnan(v) else v)
+                   for k, v in self.line_config.line_info(line).items()},
+            }
+            for line in self.lines
+        ]}
+
+    def ridership(self, params: Dict) -> Dict:
+        start = self._parse_date(params.get('from'), 'from')
+        end = self._parse_date(params.get('to'), 'to')
+        window = self._range(start, end)
+        dates = [str(d) for d in self.dates[window]]
+        line = params.get('line')
+        if line:
+            column = self._column(line)
+            return {'line': line, 'dates': dates, 'values': self._clean(self.values[window, column])}
+        block = self.values[window]
+        return {'dates': dates, 'series': {name: self._clean(block[:, j]) for j, name in enumerate(self.series)}}
+
+    def proportions(self, params: Dict) -> Dict:
+        if not len(self.dates):
+            raise QueryError("没有历史数据", 404)
+        day = self._parse_date(params.get('date'), 'date')
+        pos = len(self.dates) - 1 if day is None else int(np.searchsorted(self.dates, day))
+        if pos >= len(self.dates) or (day is not None and self.dates[pos] != day):
+            raise QueryError(f"没有 {params.get('date')} 的数据", 404)
+
+        row = self.values[pos]
+        open_lines = self.line_config.open_lines(self.dates[pos].item())
+        counts = {line: row[self._column(line)] for line in open_lines}
+        total = row[0] if not np.isnan(row[0]) else np.nansum(list(counts.values()))
+        return {
+            'date': str(self.dates[pos]),
+            'total': None if np.isnan(total) else round(float(total), 2),
+            'proportions': {line: None if np.isnan(v) or not total else round(float(v / total * 100), 2)
+                            for line, v in counts.items()},
+        }
+
+    def stats(self, params: Dict) -> Dict:
+        try:
+            window = int(params.get('window', 7))
+        except ValueError:
+            raise QueryError(f"参数 window 不是整数: {params.get('window')}")
+        if not 1 <= window <= MAX_STATS_WINDOW:
+            raise QueryError(f"window 需在 1~{MAX_STATS_WINDOW} 之间")
+        if not len(self.dates):
+            raise QueryError("没有历史数据", 404)
+
+        end = self.dates[-1]
+        rows = self._range(end - np.timedelta64(window - 1, 'D'), end)
+        names = [params['line']] if params.get('line') else self.series
+        block = self.values[rows][:, [self._column(name) for name in names]]
+        valid = ~np.isnan(block)
+        result = {}
+        for j, name in enumerate(names):
+            column = block[valid[:, j], j]
+            result[name] = {
+                'count': int(len(column)),
+                'mean': round(float(column.mean()), 2) if len(column) else None,
+                'median': round(float(np.median(column)), 2) if len(column) else None,
+                'min': round(float(column.min()), 2) if len(column) else None,
+                'max': round(float(column.max()), 2) if len(column) else None,
+                'std': round(float(column.std(ddof=1)), 2) if len(column) > 1 else None,
+            }
+        return {'window': window, 'from': str(end - np.timedelta64(window - 1, 'D')), 'to': str(end),
+                'stats': result}
+
+    def compare(self, params: Dict) -> Dict:
+        if self.periods.end is None:
+            raise QueryError("没有历史数据", 404)
+        try:
+            comparer = PeriodComparison(days=int(params.get('days', 7)), mode=params.get('mode', 'yoy'))
+            if params.get('current'):
+                current = parse_period(params['current'])
+                base = comparer.baseline(current)
+            else:
+                base, current = comparer.default_periods(self.periods)
+            if params.get('base'):
+                base = parse_period(params['base'])
+        except ValueError as e:
+            raise QueryError(str(e))
+        return comparer.to_json(base, current, comparer.compare(self.periods, base, current))
+
+    ROUTES = {
+        '/lines': lines_info,
+        '/ridership': ridership,
+        '/proportions': proportions,
+        '/stats': stats,
+        '/compare': compare,
+    }
+
+    def handle(self, path: str, params: Dict) -> Tuple[int, bytes, str]:
+        """
+        处理一个查询
+
+        Returns:
+            Tuple[int, bytes, str]: (状态码, JSON 字节, ETag)
+        """
+        self.refresh()
+        if path not in self.ROUTES:
+            raise QueryError(f"未知接口: {path}", 404)
+        key = (self.version, path, tuple(sorted(params.items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            if key[0] != self.version:
+                return self.handle(path, params)
+            body = json.dumps(self.ROUTES[path](self, params), ensure_ascii=False).encode('utf-8')
+        response = (200, body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        self.cache.put(key, response)
+        return response
+
+
+def make_handler(service: RidershipQueryService):
+    """创建绑定到查询服务的请求处理类"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 支持 keep-alive
+        # 响应头和正文分两次写出，关闭 Nagle 算法避免与延迟确认叠加出约40ms的等待
+        disable_nagle_algorithm = True
+
+        def _send(self, status: int, body: bytes = b'', etag: Optional[str] = None):
+            self.send_response(status)
+            if etag:
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'public, max-age=60')
+            if body:
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            try:
+                status, body, etag = service.handle(url.path.rstrip('/') or '/', dict(parse_qsl(url.query)))
+            except QueryError as e:
+                body = json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8')
+                self._send(e.status, body)
+                return
+            if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+                self._send(304, etag=etag)
+            else:
+                self._send(status, body, etag)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(service: RidershipQueryService, host: str = '127.0.0.1', port: int = 8766) -> ThreadingHTTPServer:
+    """创建HTTP服务（调用方负责 serve_forever / shutdown）"""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='南京地铁客流查询API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--store', default=HISTORY_FILE, help='历史数据文件')
+    parser.add_argument('--config', default='config.json', help='配置文件')
+    args = parser.parse_args()
+
+    service = RidershipQueryService(args.store, args.config)
+    server = serve(service, args.host, args.port)
+    print(f"🌐 查询API已启动: http://{args.host}:{server.server_port}/lines（{len(service.dates)} 天历史数据）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
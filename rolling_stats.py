@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+import io
+import math
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from export_writer import AtomicExportWriter
+
+ROLLING_STATE_FILE = 'docs/data/rolling_state.npz'
+ROLLING_STATS_FILE = 'docs/data/rolling_stats.json'
+STATE_VERSION = 1
+
+
+class IncrementalRollingStats:
+    """
+    增量滚动统计（按自然日窗口，缺失日按空值处理）
+
+    每来一天数据：
+        均值/求和  各窗口维护滑动和与有效计数，O(1) 更新
+        中位数/分位数  各窗口维护有序窗口（长度不超过窗口天数），二分插入/删除
+    环形缓冲区每绕一圈用缓冲区数据重算一次滑动和，消除浮点累计误差（均摊 O(1)）
+    """
+
+    def __init__(self, series: Sequence[str], windows: Sequence[int] = (7, 30, 90),
+                 quantiles: Sequence[float] = (0.1, 0.5, 0.9)):
+        self.series = list(series)
+        self.windows = sorted(int(w) for w in windows)
+        self.quantiles = list(quantiles)
+        self.capacity = self.windows[-1]
+        n = len(self.series)
+
+        self.buffer = np.full((self.capacity, n), np.nan)
+        self.head = 0  # 下一天写入的位置
+        self.days = 0  # 已写入的总天数
+        self.last_date: Optional[pd.Timestamp] = None
+        self.sums = {w: np.zeros(n) for w in self.windows}
+        self.counts = {w: np.zeros(n, dtype=np.int64) for w in self.windows}
+        self.sorted = {w: [[] for _ in range(n)] for w in self.windows}
+
+    def _row(self, days_ago: int) -> np.ndarray:
+        """days_ago 天前写入的那一行（0 表示最新一天）"""
+        return self.buffer[(self.head - 1 - days_ago) % self.capacity]
+
+    def _push(self, values: np.ndarray):
+        """写入一天数据并更新所有窗口"""
+        for w in self.windows:
+            # 离开窗口的是 w 天前的数据（写入前的视角为 w-1 天前）
+            leaving = self._row(w - 1) if self.days >= w else None
+            sums, counts, windows = self.sums[w], self.counts[w], self.sorted[w]
+            for j, value in enumerate(values):
+                if leaving is not None and not math.isnan(leaving[j]):
+                    sums[j] -= leaving[j]
+                    counts[j] -= 1
+                    window = windows[j]
+                    del window[bisect.bisect_left(window, leaving[j])]
+                if not math.isnan(value):
+                    sums[j] += value
+                    counts[j] += 1
+                    bisect.insort(windows[j], value)
+
+        self.buffer[self.head] = values
+        self.head = (self.head + 1) % self.capacity
+        self.days += 1
+        if self.head == 0:
+            self._resync_sums()
+
+    def _resync_sums(self):
+        """用缓冲区数据重算滑动和"""
+        for w in self.windows:
+            rows = np.array([self._row(k) for k in range(min(w, self.days))])
+            self.sums[w] = np.nansum(rows, axis=0)
+
+    def update(self, date, values: Dict[str, Optional[float]]) -> bool:
+        """
+        追加一天的数据
+
+        Args:
+            date: 日期，必须晚于已有的最后一天；中间缺失的日期按空值补齐
+            values: 序列名到数值的字典
+
+        Returns:
+            bool: 是否追加成功（日期不晚于最后一天时返回 False，需要全量重建）
+        """
+        ts = pd.Timestamp(date)
+        if self.last_date is not None:
+            gap = (ts - self.last_date).days
+            if gap <= 0:
+                return False
+            empty = np.full(len(self.series), np.nan)
+            for _ in range(min(gap - 1, self.capacity)):
+                self._push(empty)
+            # 缺口超过最大窗口时，中间的空白天数只需计入天数
+            self.days += max(0, gap - 1 - self.capacity)
+
+        row = np.array([np.nan if values.get(s) is None else float(values[s]) for s in self.series])
+        self._push(row)
+        self.last_date = ts
+        return True
+
+    def _quantile(self, window: List[float], q: float) -> float:
+        """有序窗口的线性插值分位数（与 pandas/numpy 默认一致）"""
+        if not window:
+            return np.nan
+        pos = (len(window) - 1) * q
+        lo = int(pos)
+        hi = min(lo + 1, len(window) - 1)
+        return window[lo] + (window[hi] - window[lo]) * (pos - lo)
+
+    def stats(self) -> pd.DataFrame:
+        """当前各序列的滚动统计（行：序列，列：mean_7, p50_7, ...）"""
+        data = {}
+        for w in self.windows:
+            counts = self.counts[w]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                data[f'mean_{w}'] = np.where(counts > 0, self.sums[w] / counts, np.nan)
+            data[f'count_{w}'] = counts.copy()
+            for q in self.quantiles:
+                data[f'p{round(q * 100)}_{w}'] = [self._quantile(win, q) for win in self.sorted[w]]
+        return pd.DataFrame(data, index=self.series)
+
+    @classmethod
+    def from_history(cls, df: pd.DataFrame, series: Sequence[str], **kwargs) -> 'IncrementalRollingStats':
+        """从历史数据（date 升序）构建，只需回放最后一个最大窗口内的数据"""
+        stats = cls(series, **kwargs)
+        if df.empty:
+            return stats
+        dates = pd.to_datetime(df['date'])
+        recent = df[dates > dates.max() - pd.Timedelta(days=stats.capacity)]
+        for record in recent.to_dict('records'):
+            stats.update(record['date'], record)
+        return stats
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """
+        缓冲区中的整个窗口是否与历史数据的对应日期一致
+
+        只比较 last_date 那一行发现不了窗口内回填的日期，这里把缓冲区按日期展开后
+        与历史数据同一区间逐行比较（最多 capacity 行，开销可忽略）
+
+        Returns:
+            bool: 一致返回 True；last_date 不在历史中或任一天数值不同返回 False
+        """
+        if self.last_date is None:
+            return True
+        frame = df.assign(date=pd.to_datetime(df['date'])).drop_duplicates('date', keep='last').set_index('date')
+        if self.last_date not in frame.index:
+            return False
+        n = min(self.days, self.capacity)
+        dates = pd.date_range(end=self.last_date, periods=n, freq='D')
+        current = frame[self.series].reindex(dates).to_numpy(dtype=float)
+        stored = np.roll(self.buffer, -self.head, axis=0)[self.capacity - n:]
+        return bool(np.allclose(stored, current, equal_nan=True))
+
+    def sync(self, df: pd.DataFrame) -> int:
+        """
+        追加历史数据中晚于 last_date 的新日期
+
+        Returns:
+            int: 追加的天数
+        """
+        if df.empty:
+            return 0
+        dates = pd.to_datetime(df['date'])
+        new_rows = df[dates > self.last_date] if self.last_date is not None else df
+        for record in new_rows.to_dict('records'):
+            self.update(record['date'], record)
+        return len(new_rows)
+
+    def to_bytes(self) -> bytes:
+        """序列化状态（有序窗口可由缓冲区重建，不需要保存）"""
+        arrays = {f'sums_{w}': self.sums[w] for w in self.windows}
+        arrays.update({f'counts_{w}': self.counts[w] for w in self.windows})
+        buffer = io.BytesIO()
+        np.savez(buffer, version=STATE_VERSION, buffer=self.buffer,
+                 series=np.array(self.series), windows=np.array(self.windows),
+                 quantiles=np.array(self.quantiles), head=self.head, days=self.days,
+                 last_date=str(self.last_date.date()) if self.last_date is not None else '', **arrays)
+        return buffer.getvalue()
+
+    def save(self, path: str = ROLLING_STATE_FILE, writer: Optional[AtomicExportWriter] = None) -> AtomicExportWriter:
+        """原子写入状态（内容未变化时跳过）"""
+        writer = writer or AtomicExportWriter()
+        writer.write_bytes(path, self.to_bytes())
+        return writer
+
+    @classmethod
+    def load(cls, path: str = ROLLING_STATE_FILE) -> Optional['IncrementalRollingStats']:
+        """加载状态，文件不存在或版本不一致时返回 None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['version']) != STATE_VERSION:
+                    return None
+                stats = cls(data['series'].tolist(), data['windows'].tolist(), data['quantiles'].tolist())
+                stats.buffer = data['buffer']
+                stats.head = int(data['head'])
+                stats.days = int(data['days'])
+                last_date = str(data['last_date'])
+                stats.last_date = pd.Timestamp(last_date) if last_date else None
+                for w in stats.windows:
+                    stats.sums[w] = data[f'sums_{w}']
+                    stats.counts[w] = data[f'counts_{w}']
+        except (OSError, KeyError, ValueError) as e:
+            print(f"⚠️ 读取滚动统计状态 {path} 时出错: {e}")
+            return None
+
+        for w in stats.windows:
+            rows = np.array([stats._row(k) for k in range(min(w, stats.days))]).reshape(-1, len(stats.series))
+            for j in range(len(stats.series)):
+                column = rows[:, j]
+                stats.sorted[w][j] = sorted(column[~np.isnan(column)].tolist())
+        return stats
+
+    @classmethod
+    def load_or_build(cls, df: pd.DataFrame, series: Sequence[str], path: str = ROLLING_STATE_FILE,
+                      **kwargs) -> 'IncrementalRollingStats':
+        """
+        加载已保存的状态并追加新日期；状态缺失、序列/窗口变化或历史被改写时全量重建
+
+        Args:
+            df: 历史数据（date 升序）
+            series: 统计的序列（如 ['total'] + 线路）
+            path: 状态文件
+        """
+        stats = cls.load(path)
+        expected = cls(series, **kwargs)
+        if stats is None or stats.series != expected.series or stats.windows != expected.windows \
+                or stats.quantiles != expected.quantiles:
+            return cls.from_history(df, series, **kwargs)
+
+        # 缓冲窗口内任一天与历史不一致（修订或窗口内回填），需要重建
+        if not stats.matches(df):
+            return cls.from_history(df, series, **kwargs)
+
+        stats.sync(df)
+        return stats
+
+    def to_json(self) -> Dict:
+        """导出用的JSON结构"""
+        table = self.stats().round(2)
+        return {
+            'date': str(self.last_date.date()) if self.last_date is not None else None,
+            'windows': self.windows,
+            'stats': table.astype(object).where(table.notna(), None).to_dict('index')
+        }
+
+
+def full_recompute(df: pd.DataFrame, series: Sequence[str], windows: Sequence[int] = (7, 30, 90),
+                   quantiles: Sequence[float] = (0.1, 0.5, 0.9)) -> pd.DataFrame:
+    """用 pandas rolling 全量计算最后一天的滚动统计，用于校验增量结果"""
+    frame = df.assign(date=pd.to_datetime(df['date'])).set_index('date')[list(series)].astype(float)
+    frame = frame.reindex(pd.date_range(frame.index.min(), frame.index.max(), freq='D'))
+    data = {}
+    for w in sorted(windows):
+        rolling = frame.rolling(w, min_periods=1)
+        data[f'mean_{w}'] = rolling.mean().iloc[-1]
+        data[f'count_{w}'] = rolling.count().iloc[-1].astype(np.int64)
+        for q in quantiles:
+            data[f'p{round(q * 100)}_{w}'] = rolling.quantile(q).iloc[-1]
+    return pd.DataFrame(data, index=list(series))
+
+
+def verify(stats: IncrementalRollingStats, df: pd.DataFrame) -> float:
+    """增量结果与全量计算的最大绝对误差（只取最后一个最大窗口计算，可在每次运行时调用）；空值位置不一致时为 inf"""
+    if df.empty:
+        return 0.0
+    dates = pd.to_datetime(df['date'])
+    df = df[dates > dates.max() - pd.Timedelta(days=stats.capacity)]
+    expected = full_recompute(df, stats.series, stats.windows, stats.quantiles)
+    actual = stats.stats()[expected.columns].astype(float).to_numpy()
+    expected = expected.astype(float).to_numpy()
+    # 一方为空值、另一方有值也是不一致（nanmax 会忽略这种情况）
+    if not np.array_equal(np.isnan(actual), np.isnan(expected)):
+        return float('inf')
+    diff = np.abs(actual - expected)
+    return float(np.nanmax(diff)) if np.isfinite(diff).any() else 0.0